@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+
+# START ### IMPORTS ###
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import requests
+from rich.console import Console
+from rich.table import Table
+# FINISH ### IMPORTS ###
+
+# START ### CONSOLE SETUP ###
+console = Console()
+# FINISH ### CONSOLE SETUP ###
+
+# START ### CONFIGURATION ###
+ENDPOINT = "http://127.0.0.1:8081" # Through llm_proxy.py so admission control keeps bolt.diy ahead of us
+CONCURRENCY = 2                    # Matches the proxy's MAX_CONCURRENT; more just queues there
+WINDOW_PER_WORKER = 4              # Lines read ahead per worker (bounds memory and the checkpoint)
+MAX_ATTEMPTS = 5
+REQUEST_TIMEOUT = 600.0
+PROGRESS_INTERVAL = 10.0
+SOURCE = "batch"                   # X-LLM-Source: lowest admission priority
+# Keys that aren't part of the request (and so don't make two prompts different)
+RECORD_KEYS = ("id", "custom_id")
+# FINISH ### CONFIGURATION ###
+
+# START ### INPUT ###
+def read_lines(path, offset=0, line_number=0):
+    """(line number, end offset, record or error) for each non-blank JSONL line from offset on. Lazy: one line in memory."""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        while True:
+            raw = f.readline()
+            if not raw:
+                return
+            end = f.tell()
+            if raw.strip():
+                try:
+                    record = json.loads(raw)
+                    if not isinstance(record, dict) or not (record.get("messages") or record.get("prompt")):
+                        raise ValueError("needs 'messages' or 'prompt'")
+                    yield line_number, end, record
+                except ValueError as e:
+                    yield line_number, end, ValueError(f"Bad input line: {e}")
+            else:
+                yield line_number, end, None
+            line_number += 1
+
+
+def build_request(record, defaults):
+    """(path, body) for one input record: chat if it has messages, plain completion if it has a prompt"""
+    body = {**defaults, **{k: v for k, v in record.items() if k not in RECORD_KEYS}}
+    body["stream"] = False
+    return ("/v1/chat/completions" if "messages" in body else "/v1/completions"), body
+
+
+def request_key(path, body):
+    """Identical requests (same path, prompt and sampling params) hash the same"""
+    return hashlib.sha256(f"{path}\n{json.dumps(body, sort_keys=True, ensure_ascii=False)}".encode()).hexdigest()
+# FINISH ### INPUT ###
+
+# START ### RESULT STORE ###
+class ResultStore:
+    """
+    Finished responses by request hash, in SQLite next to the output file.
+    Dedupe works across the whole input and across resumes without keeping
+    anything in RAM.
+    """
+
+    def __init__(self, path):
+        self.db = sqlite3.connect(str(path), check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, response TEXT)")
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            row = self.db.execute("SELECT response FROM results WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key, response):
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO results VALUES (?, ?)", (key, json.dumps(response)))
+            self.db.commit()
+
+    def close(self):
+        self.db.close()
+# FINISH ### RESULT STORE ###
+
+# START ### CHECKPOINT ###
+def load_checkpoint(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_checkpoint(path, checkpoint):
+    tmp_path = Path(f"{path}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+# FINISH ### CHECKPOINT ###
+
+# START ### CLIENT ###
+_local = threading.local()
+
+
+def post(endpoint, path, body, timeout=REQUEST_TIMEOUT, attempts=MAX_ATTEMPTS):
+    """One request with retries: 429 waits out Retry-After, 5xx/connection errors back off. Returns the JSON response."""
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = _local.session = requests.Session() # Keep-alive per worker thread
+    delay = 1.0
+    for attempt in range(attempts):
+        try:
+            response = session.post(endpoint + path, json=body, timeout=timeout, headers={"X-LLM-Source": SOURCE})
+            if response.status_code == 429:
+                time.sleep(float(response.headers.get("Retry-After") or delay))
+            elif response.status_code >= 500:
+                time.sleep(delay)
+            else:
+                response.raise_for_status() # 4xx other than 429 won't get better on retry
+                return response.json()
+        except requests.HTTPError:
+            raise
+        except (requests.ConnectionError, requests.Timeout):
+            time.sleep(delay)
+        delay = min(delay * 2, 30.0)
+    raise RuntimeError(f"Gave up after {attempts} attempts")
+# FINISH ### CLIENT ###
+
+# START ### RUNNER ###
+class BatchRunner:
+    """
+    Streams the input, keeps up to `concurrency` requests in flight and
+    appends one output line per input line as each finishes (completion
+    order; "line" and "id" say which input it answers). Reading stops while
+    the read-ahead window is full, so memory doesn't grow with the input.
+
+    The checkpoint holds the input offset below which every line is written,
+    the few lines past it already done, and the output size at that moment.
+    Resume truncates the output to that size and carries on, so every input
+    line ends up in the output exactly once. An output smaller than that
+    (moved or deleted since) means starting over instead.
+    """
+
+    def __init__(self, input_path, output_path, endpoint=ENDPOINT, concurrency=CONCURRENCY, defaults=None,
+                 dedupe=True, poster=post):
+        self.input_path = Path(input_path)
+        self.output_path = Path(output_path)
+        self.checkpoint_path = Path(f"{output_path}.ckpt")
+        self.endpoint = endpoint.rstrip("/")
+        self.concurrency = concurrency
+        self.window = concurrency * WINDOW_PER_WORKER
+        self.defaults = defaults or {}
+        self.poster = poster
+        self.store = ResultStore(f"{output_path}.cache.sqlite") if dedupe else None
+        self.stats = {"lines": 0, "requests": 0, "deduped": 0, "errors": 0, "prompt_tokens": 0, "completion_tokens": 0}
+
+    def _resume(self):
+        checkpoint = load_checkpoint(self.checkpoint_path)
+        if not checkpoint or checkpoint.get("input") != str(self.input_path.resolve()):
+            self.output_path.write_bytes(b"")
+            return 0, 0, set()
+        try:
+            written = self.output_path.stat().st_size
+        except OSError:
+            written = -1
+        if written < checkpoint["output_bytes"]:
+            # Output moved, deleted or cut short: truncating "up" would pad it with NULs. Start
+            # over; the result cache still answers every prompt that finished before.
+            console.print(f"[yellow][Batch] {self.output_path} is missing or shorter than the checkpoint says, "
+                          f"starting over.[/yellow]")
+            self.output_path.write_bytes(b"")
+            return 0, 0, set()
+        with open(self.output_path, "ab") as f:
+            f.truncate(checkpoint["output_bytes"]) # Drop lines written after the last checkpoint
+        self.stats.update(checkpoint.get("stats", {}))
+        console.print(f"[cyan][Batch] Resuming at line {checkpoint['line']} "
+                      f"({self.stats['lines']} done, {len(checkpoint['done_ahead'])} ahead).[/cyan]")
+        return checkpoint["offset"], checkpoint["line"], set(checkpoint["done_ahead"])
+
+    def run(self):
+        offset, line_number, done_ahead = self._resume()
+        outstanding = OrderedDict() # line -> [end offset, done], in input order
+        watermark = [offset, line_number]
+        inflight = {}   # request key -> future
+        waiters = {}    # future -> [(line, record)] sharing that request
+        started = time.monotonic()
+        counted_at = self.stats["lines"]
+        last_progress = started
+        output = open(self.output_path, "ab")
+
+        def finish(line, record, response=None, error=None):
+            result = {"line": line, "id": record.get("id", record.get("custom_id")) if isinstance(record, dict) else None}
+            if error is not None:
+                result["error"] = str(error)
+                self.stats["errors"] += 1
+            else:
+                result["response"] = response
+                usage = response.get("usage") or {}
+                self.stats["prompt_tokens"] += usage.get("prompt_tokens", 0)
+                self.stats["completion_tokens"] += usage.get("completion_tokens", 0)
+            output.write(json.dumps(result, ensure_ascii=False).encode() + b"\n")
+            self.stats["lines"] += 1
+            outstanding[line][1] = True
+
+        def checkpoint():
+            # Everything written goes to disk before the checkpoint that counts it
+            output.flush()
+            os.fsync(output.fileno())
+            while outstanding and next(iter(outstanding.values()))[1]:
+                line, (end, _) = outstanding.popitem(last=False)
+                watermark[:] = [end, line + 1]
+            save_checkpoint(self.checkpoint_path, {
+                "input": str(self.input_path.resolve()), "offset": watermark[0], "line": watermark[1],
+                "done_ahead": [line for line, (_, done) in outstanding.items() if done],
+                "output_bytes": output.tell(), "stats": self.stats,
+            })
+
+        def collect(futures):
+            for future in futures:
+                key = next(k for k, f in inflight.items() if f is future)
+                del inflight[key]
+                try:
+                    response, error = future.result(), None
+                    if self.store:
+                        self.store.put(key, response)
+                except Exception as e:
+                    response, error = None, e
+                for line, record in waiters.pop(future):
+                    finish(line, record, response, error)
+            checkpoint()
+
+        lines = read_lines(self.input_path, offset, line_number)
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            exhausted = False
+            while not exhausted or inflight:
+                # Fill the window
+                while not exhausted and len(outstanding) < self.window and len(inflight) < self.concurrency:
+                    try:
+                        line, end, record = next(lines)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    outstanding[line] = [end, False]
+                    if line in done_ahead: # Written before the crash, past the old watermark
+                        outstanding[line][1] = True
+                        continue
+                    if record is None: # Blank line
+                        outstanding[line][1] = True
+                        continue
+                    if isinstance(record, Exception):
+                        finish(line, {}, error=record)
+                        continue
+                    path, body = build_request(record, self.defaults)
+                    key = request_key(path, body)
+                    if key in inflight: # Same prompt already on its way: share the answer
+                        waiters[inflight[key]].append((line, record))
+                        self.stats["deduped"] += 1
+                        continue
+                    cached = self.store.get(key) if self.store else None
+                    if cached is not None:
+                        finish(line, record, cached)
+                        self.stats["deduped"] += 1
+                        continue
+                    future = pool.submit(self.poster, self.endpoint, path, body)
+                    inflight[key] = future
+                    waiters[future] = [(line, record)]
+                    self.stats["requests"] += 1
+                if inflight:
+                    finished, _ = wait(list(inflight.values()), timeout=PROGRESS_INTERVAL, return_when=FIRST_COMPLETED)
+                    collect(finished)
+                elif outstanding:
+                    checkpoint() # Window full of cache hits/blank lines: flush so it can slide
+
+                now = time.monotonic()
+                if now - last_progress >= PROGRESS_INTERVAL:
+                    last_progress = now
+                    rate = (self.stats["lines"] - counted_at) / (now - started)
+                    console.print(f"[dim][Batch] {self.stats['lines']} lines, {rate:.2f} lines/s, "
+                                  f"{self.stats['completion_tokens']} completion tokens, {len(inflight)} in flight[/dim]")
+        checkpoint()
+        output.close()
+        if self.store:
+            self.store.close()
+        elapsed = time.monotonic() - started
+        return {**self.stats, "seconds": round(elapsed, 1),
+                "lines_per_second": round((self.stats["lines"] - counted_at) / elapsed, 2) if elapsed else None,
+                "completion_tokens_per_second": round(self.stats["completion_tokens"] / elapsed, 1) if elapsed else None}
+# FINISH ### RUNNER ###
+
+# START ### MAIN FUNCTION ###
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a JSONL file of prompts through the local model")
+    parser.add_argument("input", help="JSONL: one {\"messages\": [...]} or {\"prompt\": \"...\"} per line, plus any request params")
+    parser.add_argument("output", help="JSONL results, appended as they finish (resumes if a checkpoint exists)")
+    parser.add_argument("--endpoint", default=ENDPOINT)
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--max-tokens", type=int, help="Default max_tokens for lines that don't set one")
+    parser.add_argument("--temperature", type=float, help="Default temperature for lines that don't set one")
+    parser.add_argument("--model", default="mixtral")
+    parser.add_argument("--no-dedupe", action="store_true", help="Send identical prompts every time")
+    parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint and start over")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args(argv)
+
+    defaults = {"model": args.model}
+    if args.max_tokens is not None:
+        defaults["max_tokens"] = args.max_tokens
+    if args.temperature is not None:
+        defaults["temperature"] = args.temperature
+    if args.restart:
+        for suffix in (".ckpt", ".cache.sqlite"):
+            Path(f"{args.output}{suffix}").unlink(missing_ok=True)
+
+    runner = BatchRunner(args.input, args.output, args.endpoint, args.concurrency, defaults, not args.no_dedupe)
+    report = runner.run()
+    if args.json:
+        print(json.dumps(report))
+        return 0 if not report["errors"] else 1
+    table = Table(title=f"Batch complete: {args.output}", border_style="green")
+    table.add_column("Metric")
+    table.add_column("Value")
+    table.add_row("Lines written", str(report["lines"]))
+    table.add_row("Requests sent", str(report["requests"]))
+    table.add_row("Deduplicated", str(report["deduped"]))
+    table.add_row("Errors", str(report["errors"]))
+    table.add_row("Elapsed", f"{report['seconds']}s")
+    table.add_row("Throughput", f"{report['lines_per_second']} lines/s, {report['completion_tokens_per_second']} completion tokens/s")
+    console.print(table)
+    return 0 if not report["errors"] else 1
+# FINISH ### MAIN FUNCTION ###
+
+# START ### SCRIPT RUNNER ###
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        console.print("[yellow][Batch] Interrupted; rerun the same command to resume.[/yellow]")
+        sys.exit(130)
+    except Exception as e:
+        console.print(f"[red][Batch] Error: {str(e)}[/red]")
+        sys.exit(1)
+# FINISH ### SCRIPT RUNNER ###
@@ -1,7 +1,14 @@
 import pyperclip
+import io
 import time
+import heapq
+import shutil
+import hashlib
+import subprocess
+import asyncio
 import threading
-from collections import deque
+from collections import deque, namedtuple
+from collections.abc import Sequence
 import logging
 
 # START ### LOGGING SETUP ###
@@ -9,12 +16,316 @@ import logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 # FINISH ### LOGGING SETUP ###
 
+# START ### EVENTS AND VIEWS ###
+# kind is one of: 'add', 'evict', 'pin', 'unpin', 'clear'. hotkey is only set for pin events.
+ClipboardEvent = namedtuple('ClipboardEvent', ['kind', 'timestamp', 'content', 'hotkey'])
+
+
+class HistoryView(Sequence):
+    """
+    Read-only view of one history version. It wraps the immutable snapshot tuple
+    ClipHistory published, so no copy gets made and the monitor thread can keep
+    writing while you iterate. #0 is the latest clip.
+    """
+    def __init__(self, version, entries):
+        self.version = version
+        self._entries = entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __getitem__(self, index):
+        return self._entries[index]
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def __repr__(self):
+        return f"HistoryView(v{self.version}, {len(self)} clips)"
+# FINISH ### EVENTS AND VIEWS ###
+
+# START ### NON-TEXT PAYLOADS ###
+class ClipPayload:
+    """
+    A non-text clip (image, HTML, file list) held as the raw bytes the clipboard
+    owner handed over. Nothing gets re-encoded: view() gives a memoryview over
+    the same buffer, and thumbnails only get built the first time somebody asks.
+    Two payloads are equal when their mime type and sha256 match.
+    """
+    def __init__(self, mime, data, digest, alt_text=None):
+        self.mime = mime
+        self.data = data # bytes, shared by every reference to this clip
+        self.digest = digest
+        self.alt_text = alt_text # Plain-text flavour the owner offered alongside (HTML copies)
+        self._thumbnails = {}
+
+    @property
+    def size(self):
+        return len(self.data)
+
+    def view(self):
+        """ Zero-copy memoryview over the payload bytes. """
+        return memoryview(self.data)
+
+    def file_paths(self):
+        """ For file-list clips: the local paths, parsed on demand. Empty list otherwise. """
+        if self.mime not in ClipboardManager.FILE_LIST_TARGETS:
+            return []
+        paths = []
+        for line in self.data.decode('utf-8', errors='replace').splitlines():
+            line = line.strip()
+            if line.startswith('file://'):
+                from urllib.parse import unquote
+                paths.append(unquote(line[len('file://'):]))
+        return paths
+
+    def thumbnail(self, max_size=(256, 256)):
+        """
+        PNG thumbnail bytes for image clips, built lazily and cached per size.
+        Returns None for non-images or if Pillow isn't installed.
+        """
+        if not self.mime.startswith('image/'):
+            return None
+        if max_size in self._thumbnails:
+            return self._thumbnails[max_size]
+        try:
+            from PIL import Image # Optional dep, only needed when a UI asks for previews
+        except ImportError:
+            logging.warning("Pillow not installed, can't build clip thumbnails.")
+            return None
+        try:
+            with Image.open(io.BytesIO(self.view())) as img:
+                img.thumbnail(max_size)
+                out = io.BytesIO()
+                img.save(out, format='PNG')
+            self._thumbnails[max_size] = out.getvalue()
+        except Exception as e:
+            logging.error(f"Couldn't build thumbnail for {self}: {e}")
+            self._thumbnails[max_size] = None
+        return self._thumbnails[max_size]
+
+    def __bool__(self):
+        return bool(self.data)
+
+    def __eq__(self, other):
+        return isinstance(other, ClipPayload) and (self.mime, self.digest) == (other.mime, other.digest)
+
+    def __hash__(self):
+        return hash((self.mime, self.digest))
+
+    def __str__(self):
+        if self.alt_text:
+            return self.alt_text
+        if self.mime in ClipboardManager.FILE_LIST_TARGETS:
+            return f"[files] {', '.join(self.file_paths())}"
+        return f"[{self.mime} {self.size / 1024:.1f} KB]"
+
+    def __repr__(self):
+        return f"ClipPayload({self.mime!r}, {self.size} bytes, sha256={self.digest[:12]})"
+
+
+class PayloadStore:
+    """
+    Dedupes payloads by sha256. Copy the same screenshot five times and history
+    holds five references to one buffer. History entries and pins each hold a
+    reference, so a payload goes once nothing points at it any more.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (digest, mime) -> [payload, refcount]. Keyed like ClipPayload equality: the same
+        # bytes offered as two types are two clips, each with its own references.
+        self._payloads = {}
+
+    def intern(self, mime, data, alt_text=None):
+        """ Returns the stored payload for these bytes, creating it if it's new. """
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            slot = self._payloads.get((digest, mime))
+            if slot is None:
+                slot = [ClipPayload(mime, data, digest, alt_text), 0]
+                self._payloads[(digest, mime)] = slot
+            return slot[0]
+
+    def retain(self, payload):
+        """ Takes a reference. A payload whose last reference already went gets its slot back. """
+        with self._lock:
+            slot = self._payloads.setdefault((payload.digest, payload.mime), [payload, 0])
+            slot[1] += 1
+
+    def release(self, payload):
+        with self._lock:
+            key = (payload.digest, payload.mime)
+            slot = self._payloads.get(key)
+            if slot is not None:
+                slot[1] -= 1
+                if slot[1] <= 0:
+                    del self._payloads[key]
+
+    def stats(self):
+        """ Returns (unique payloads, total bytes held). """
+        with self._lock:
+            return len(self._payloads), sum(slot[0].size for slot in self._payloads.values())
+
+
+def describe_clip(content, width=30):
+    """ Short one-line label for logs and listings, text or payload. """
+    return str(content)[:width]
+# FINISH ### NON-TEXT PAYLOADS ###
+
+# START ### HISTORY CONTAINER ###
+class ClipHistory:
+    """
+    Bounded, latest-first clip history built for one writer and many readers.
+
+    Every write builds a new tuple and publishes it with its version number as a
+    single attribute swap, which is atomic under the GIL. Readers grab that pair
+    and never lock, so UI reads can't stall the monitor thread. Writers serialize
+    on a private lock that's basically never contended (the monitor is the only
+    regular writer; clear() comes from the UI once in a blue moon).
+    Rebuilding the tuple is O(maxlen), which is pocket change at 25 clips.
+    """
+    def __init__(self, maxlen):
+        self.maxlen = maxlen
+        self._write_lock = threading.Lock()
+        self._state = (0, ()) # (version, entries) - always replaced, never mutated
+
+    def snapshot(self):
+        """ Returns (version, entries) for the current history. Lock-free. """
+        return self._state
+
+    def latest(self):
+        """ Returns the newest (timestamp, content) entry, or None. Lock-free. """
+        entries = self._state[1]
+        return entries[0] if entries else None
+
+    def append(self, entry):
+        """
+        Prepends an entry as the new #1 and trims to maxlen.
+
+        Returns:
+            The entry that fell off the end, or None.
+        """
+        with self._write_lock:
+            version, entries = self._state
+            evicted = None
+            if self.maxlen is not None and len(entries) >= self.maxlen:
+                evicted = entries[self.maxlen - 1]
+                entries = entries[:self.maxlen - 1]
+            self._state = (version + 1, (entry,) + entries)
+            return evicted
+
+    def clear(self):
+        """ Drops everything. Returns the entries that got removed. """
+        with self._write_lock:
+            version, entries = self._state
+            self._state = (version + 1, ())
+            return entries
+
+    def __len__(self):
+        return len(self._state[1])
+
+    def __bool__(self):
+        return bool(self._state[1])
+
+    def __iter__(self):
+        return iter(self._state[1])
+
+    def __getitem__(self, index):
+        return self._state[1][index]
+# FINISH ### HISTORY CONTAINER ###
+
+# START ### POLL SCHEDULER ###
+class PollScheduler:
+    """
+    Decides how long the monitor sleeps between clipboard reads.
+
+    Fast right after a capture (people copy in bursts), stretching out toward
+    max_interval while things stay quiet. Failed reads back off exponentially
+    from error_base up to error_cap. The scheduler only hands out delays, the
+    monitor does the actual waiting on an Event so stop() always cuts it short.
+
+    Every poll forks at least one process: xclip for the selection TIMESTAMP, or
+    pyperclip's xclip/xsel for owners that don't answer it (a few ms of CPU each).
+    At min_interval that's 10 forks/s for the burst after a copy, which is why
+    the interval stretches out while things are quiet.
+    """
+    def __init__(self, min_interval=0.1, max_interval=2.0, idle_growth=1.5,
+                 error_base=0.5, error_cap=60.0):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.idle_growth = idle_growth
+        self.error_base = error_base
+        self.error_cap = error_cap
+        self.interval = min_interval
+        self.consecutive_errors = 0
+        self._lock = threading.Lock() # stats() gets called from other threads
+        self._last_poll = None
+        self._capture_latencies = deque(maxlen=256) # Recent worst-case copy->capture gaps
+        self._counters = {'polls': 0, 'wakeups': 0, 'pokes': 0, 'captures': 0, 'errors': 0}
+
+    def record_wakeup(self, poked=False):
+        """ Counts a return from the wait, whether it timed out or got poked. """
+        with self._lock:
+            self._counters['wakeups'] += 1
+            if poked:
+                self._counters['pokes'] += 1
+
+    def record_poll(self, captured=False, error=False):
+        """ Feeds one poll outcome back in and adjusts the interval. """
+        now = time.monotonic()
+        with self._lock:
+            self._counters['polls'] += 1
+            if error:
+                self._counters['errors'] += 1
+                self.consecutive_errors += 1
+            else:
+                self.consecutive_errors = 0
+                if captured:
+                    self._counters['captures'] += 1
+                    # The copy happened somewhere since the last poll, so that gap is
+                    # the worst-case latency-to-capture for this clip
+                    if self._last_poll is not None:
+                        self._capture_latencies.append(now - self._last_poll)
+                    self.interval = self.min_interval
+                else:
+                    self.interval = min(self.max_interval, self.interval * self.idle_growth)
+            self._last_poll = now
+
+    def next_delay(self):
+        """ Seconds to wait before the next poll. """
+        with self._lock:
+            if self.consecutive_errors:
+                return min(self.error_cap, self.error_base * (2 ** (self.consecutive_errors - 1)))
+            return self.interval
+
+    def stats(self):
+        """ Snapshot of counters and capture latency numbers for tuning. """
+        with self._lock:
+            stats = dict(self._counters)
+            stats['interval'] = self.interval
+            stats['consecutive_errors'] = self.consecutive_errors
+            latencies = sorted(self._capture_latencies)
+        if latencies:
+            stats['capture_latency_avg'] = sum(latencies) / len(latencies)
+            stats['capture_latency_p95'] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            stats['capture_latency_max'] = latencies[-1]
+        return stats
+# FINISH ### POLL SCHEDULER ###
+
 # START ### CLIPBOARD MANAGER CLASS ###
 class ClipboardManager:
     """
     Manages clipboard monitoring, history storage, and related operations.
     The engine room for the multiclip hustle.
     """
+    PIN_SLOTS = 9 # Default hotkey slots 1-9, like speed dial
+    FILE_LIST_TARGETS = ('x-special/gnome-copied-files', 'text/uri-list')
+    # Checked in this order. Plain text is the fallback and still goes through pyperclip.
+    RICH_TARGETS = ('image/png',) + FILE_LIST_TARGETS + ('text/html',)
+    # Owners that don't answer TIMESTAMP get text-only polls until their text changes, and
+    # at least this often a full rich read (catches image -> image copies with no text)
+    STAMP_RETRY_INTERVAL = 30.0
+
     # START ### CLASS INITIALIZATION ###
     def __init__(self, max_history=25):
         """
@@ -25,19 +336,48 @@ class ClipboardManager:
                                Like settin' a limit on how much inventory you hold.
         """
         logging.info(f"Initializing ClipboardManager with max history: {max_history}")
-        # Using deque for efficient additions and automatic trimming
-        self.history = deque(maxlen=max_history)
-        self.pinned_clips = {} # We'll use this later for pinned items {hotkey: content}
+        # Versioned copy-on-write history: lock-free reads, cheap bounded writes
+        self.history = ClipHistory(maxlen=max_history)
+        self.pinned_clips = {} # Pinned items {hotkey: (timestamp, content)}, kept outside the deque
+        self._pinned_by_content = {} # Reverse lookup {content: hotkey} so unpin-by-content is O(1)
+        self._free_pin_slots = list(range(1, self.PIN_SLOTS + 1)) # Min-heap of open default slots
+        self.sequential_mode_active = False
+        self._sequential_snapshot = () # Frozen history version (latest first) for batch pasting
+        self._sequential_index = 0
+        # Guards pins, sequential state and the event queue. History has its own
+        # writer lock inside ClipHistory, so the monitor's add path never takes this
+        # unless somebody's subscribed.
+        self._lock = threading.RLock()
+        # Rich clipboard reads go through xclip when it's around. We remember the
+        # selection TIMESTAMP so an unchanged clipboard costs one tiny read, not a
+        # multi-MB image pull every poll.
+        self.payloads = PayloadStore()
+        self._xclip = shutil.which('xclip')
+        self._selection_stamp = None
+        self._stampless_text = None # Text offered by an owner that doesn't answer TIMESTAMP
+        self._rich_retry_at = 0.0 # Monotonic time; text-only reads of that owner until then
+        # Owned by the monitor thread once it starts: set here before the thread
+        # exists, and only ever written by _monitor_clipboard after that.
         self.last_copied_content = self._get_current_clipboard() # Get initial state
         self._monitoring_active = False
         self._monitor_thread = None
         self._stop_event = threading.Event() # Use an Event for cleaner thread stopping
+        self._wake_event = threading.Event() # Set by stop_monitoring() and poke() to cut a wait short
+        self.scheduler = PollScheduler()
+
+        # Listener plumbing: events pile up in _pending_events and a dispatcher thread
+        # hands them out in batches, so a burst of copies means one UI refresh.
+        self.coalesce_window = 0.15 # Seconds to let a burst settle before notifying
+        self._listeners = []
+        self._pending_events = []
+        self._events_ready = threading.Event()
+        self._dispatch_thread = None
 
         # Initialize with current clipboard content if it's not empty
         if self.last_copied_content:
             logging.info("Adding initial clipboard content to history.")
             # Avoid adding initial content if it's just whitespace
-            if self.last_copied_content.strip():
+            if not isinstance(self.last_copied_content, str) or self.last_copied_content.strip():
                 self._add_to_history(self.last_copied_content)
             else:
                 logging.info("Initial clipboard content is whitespace, skipping add.")
@@ -47,14 +387,80 @@ class ClipboardManager:
     # FINISH ### CLASS INITIALIZATION ###
 
     # START ### CLIPBOARD ACCESS UTILITY ###
+    def _read_target(self, target):
+        """ Raw bytes for one clipboard target via xclip, or None. """
+        try:
+            result = subprocess.run(
+                [self._xclip, '-selection', 'clipboard', '-t', target, '-o'],
+                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, timeout=2
+            )
+        except (OSError, subprocess.TimeoutExpired) as e:
+            logging.debug(f"xclip read of {target} failed: {e}")
+            return None
+        return result.stdout if result.returncode == 0 else None
+
+    def _get_rich_clipboard(self):
+        """
+        Grabs image/HTML/file-list content as raw bytes.
+
+        Returns:
+            (changed, payload): changed is False when the selection TIMESTAMP hasn't
+            moved, so the caller can skip the read entirely. payload is None when
+            the owner only offers plain text. _selection_stamp is left None when the
+            owner doesn't answer TIMESTAMP.
+        """
+        stamp = self._read_target('TIMESTAMP')
+        if stamp and stamp == self._selection_stamp:
+            return False, None
+        self._selection_stamp = stamp or None
+
+        targets = self._read_target('TARGETS')
+        if not targets:
+            return True, None
+        offered = set(targets.decode('utf-8', errors='replace').split())
+        for target in self.RICH_TARGETS:
+            if target not in offered:
+                continue
+            data = self._read_target(target)
+            if not data:
+                continue
+            alt_text = None
+            if target == 'text/html' and offered & {'UTF8_STRING', 'text/plain', 'STRING'}:
+                alt_text = pyperclip.paste() # Keep the readable flavour for display/paste
+            return True, self.payloads.intern(target, data, alt_text)
+        return True, None
+
     def _get_current_clipboard(self):
         """
-        Safely gets the current clipboard content (text only for now).
+        Safely gets the current clipboard content: a str for text, a ClipPayload for
+        images, HTML and file lists (when xclip is available).
         Handles potential errors if the clipboard is weird. Like checkin' if the product is legit.
         """
         try:
-            # TODO: Add support for other types later (images, files?)
-            content = pyperclip.paste()
+            text = None
+            last = getattr(self, 'last_copied_content', None) # Not set yet during __init__
+            if self._xclip and self._stampless_text is not None:
+                # Owner without TIMESTAMP: poll only its plain text, no TIMESTAMP/TARGETS forks,
+                # until the text changes (a new copy, maybe a new owner worth asking again)
+                text = pyperclip.paste()
+                if text == self._stampless_text and time.monotonic() < self._rich_retry_at:
+                    return last if last is not None else text
+                self._stampless_text = None
+            if self._xclip:
+                changed, payload = self._get_rich_clipboard()
+                # Same selection owner, same stuff. Nothing recorded yet (empty or
+                # unreadable at startup) means we read the text, not report a failure.
+                if not changed and last is not None:
+                    return last
+                if self._selection_stamp is None:
+                    text = pyperclip.paste() if text is None else text
+                    self._stampless_text = text
+                    self._rich_retry_at = time.monotonic() + self.STAMP_RETRY_INTERVAL
+                if payload is not None:
+                    return payload
+            content = pyperclip.paste() if text is None else text
+            if isinstance(last, ClipPayload) and content == last.alt_text:
+                return last # Text-only read of the HTML clip we already have
             # Check if content is actually text data, not some weird object handle
             if isinstance(content, str):
                 return content
@@ -86,7 +492,7 @@ class ClipboardManager:
         Prepends the new item (timestamp, content). Timestamp helps keep order true.
         """
         # Basic check to prevent adding empty or only whitespace strings
-        if not content or content.isspace():
+        if not content or (isinstance(content, str) and content.isspace()):
             logging.debug("Skipping empty or whitespace-only clip.")
             return False
 
@@ -94,12 +500,20 @@ class ClipboardManager:
         new_entry = (timestamp, content)
 
         # Avoid adding duplicates: Check the *most recent* item in history if history is not empty
-        if self.history and self.history[0][1] == content:
-             logging.debug(f"Skipping duplicate clip: {content[:30]}...")
+        latest = self.history.latest()
+        if latest is not None and latest[1] == content:
+             logging.debug(f"Skipping duplicate clip: {describe_clip(content)}...")
              return False # Indicate not added
 
-        logging.info(f"Adding new clip to history: {content[:30]}...")
-        self.history.appendleft(new_entry) # appendleft makes it the new #1
+        logging.info(f"Adding new clip to history: {describe_clip(content)}...")
+        if isinstance(content, ClipPayload):
+            self.payloads.retain(content)
+        evicted = self.history.append(new_entry) # New #1, oldest falls off if we're full
+        if evicted is not None:
+            if isinstance(evicted[1], ClipPayload):
+                self.payloads.release(evicted[1])
+            self._emit('evict', evicted[0], evicted[1])
+        self._emit('add', timestamp, content)
         # TODO: Add persistence logic here later (e.g., save history to file/db)
         return True # Indicate added
 
@@ -109,14 +523,25 @@ class ClipboardManager:
         Latest item first. Ready for display.
         """
         # Return a copy to prevent external modification
-        return list(self.history)
+        return list(self.history.snapshot()[1])
+
+    def history_view(self):
+        """
+        Returns a copy-free HistoryView of the current history version. Use this
+        instead of get_history() when you just need to read, not keep.
+        """
+        version, entries = self.history.snapshot()
+        return HistoryView(version, entries)
 
     def clear_history(self):
         """ Clears the clipboard history. Like cleaning out the stash spot. """
         logging.info("Clearing clipboard history.")
-        self.history.clear()
+        for _, content in self.history.clear():
+            if isinstance(content, ClipPayload):
+                self.payloads.release(content)
+        self._emit('clear', time.time(), None)
         # TODO: Add persistence logic here later (e.g., clear saved history file/db)
-        # Maybe keep pinned clips? TBD. For now, clears everything non-pinned.
+        # Pinned clips live in their own slots, so they survive a clear.
 
     # FINISH ### HISTORY MANAGEMENT ###
 
@@ -125,48 +550,54 @@ class ClipboardManager:
         """
         The core loop that runs in a separate thread to watch the clipboard.
         This is the lookout, constantly checkin' the corners (clipboard).
+        How often it looks is up to self.scheduler; every wait is on _wake_event,
+        so stop_monitoring() never has to sit out a backoff.
         """
         logging.info("Clipboard monitoring thread started.")
-        consecutive_error_count = 0
-        MAX_CONSECUTIVE_ERRORS = 5 # Stop spamming logs if clipboard is consistently broken
+        MAX_CONSECUTIVE_ERRORS = 5 # Past this we stop logging every failure, just the backoff
 
         while not self._stop_event.is_set():
+            captured = False
+            error = False
             try:
                 current_content = self._get_current_clipboard()
+                # None means the read itself failed, _get_current_clipboard already logged why
+                error = current_content is None
 
                 # Check if content is valid (not None) and different from the last *recorded* copy
-                if current_content is not None and current_content != self.last_copied_content:
-                    logging.debug(f"Detected potential new clip: {current_content[:30]}...")
-                    added = self._add_to_history(current_content)
-                    if added:
+                if not error and current_content != self.last_copied_content:
+                    logging.debug(f"Detected potential new clip: {describe_clip(current_content)}...")
+                    captured = self._add_to_history(current_content)
+                    if captured:
                         # Update last_copied_content *only* if it was successfully added
                         self.last_copied_content = current_content
-                        # TODO: Signal the UI or other parts that history updated
+                        # Listeners already got an 'add' event from _add_to_history
                         logging.info("Clipboard history updated.")
-                        # Reset error count on success
-                        consecutive_error_count = 0
 
-                # Reset error count if clipboard read was successful (even if content was same/empty)
-                if current_content is not None:
-                     consecutive_error_count = 0
+            except Exception as e:
+                error = True
+                if self.scheduler.consecutive_errors < MAX_CONSECUTIVE_ERRORS:
+                    logging.error(f"Error during clipboard monitoring loop (Count: {self.scheduler.consecutive_errors + 1}): {e}", exc_info=True)
 
-                # Wait a bit before checking again, don't hog the CPU
-                # Use wait on the event for faster shutdown
-                self._stop_event.wait(0.5) # Check every 0.5 seconds
+            self.scheduler.record_poll(captured=captured, error=error)
+            delay = self.scheduler.next_delay()
+            if self.scheduler.consecutive_errors == MAX_CONSECUTIVE_ERRORS:
+                logging.critical(f"Too many consecutive errors reading clipboard. Backing off (next try in {delay:.1f}s).")
 
-            except Exception as e:
-                consecutive_error_count += 1
-                logging.error(f"Error during clipboard monitoring loop (Count: {consecutive_error_count}): {e}", exc_info=True)
-                if consecutive_error_count >= MAX_CONSECUTIVE_ERRORS:
-                     logging.critical("Too many consecutive errors reading clipboard. Pausing monitoring for 60s.")
-                     self._stop_event.wait(60) # Pause for a minute before retrying
-                     consecutive_error_count = 0 # Reset count after long pause
-                else:
-                     # Avoid spamming logs if error persists rapidly
-                     time.sleep(5) # Short sleep for transient errors
+            poked = self._wake_event.wait(delay)
+            self._wake_event.clear()
+            self.scheduler.record_wakeup(poked=poked and not self._stop_event.is_set())
 
         logging.info("Clipboard monitoring thread stopped.")
 
+    def poke(self):
+        """ Forces an immediate poll, e.g. right before a paste hotkey fires. """
+        self._wake_event.set()
+
+    def get_monitor_stats(self):
+        """ Poll/wakeup/capture counters and latency-to-capture numbers from the scheduler. """
+        return self.scheduler.stats()
+
 
     def start_monitoring(self):
         """ Starts the clipboard monitoring thread if not already running. """
@@ -179,6 +610,7 @@ class ClipboardManager:
             if not self._monitor_thread: # Only create thread if it doesn't exist or was cleared
                 logging.info("Starting clipboard monitor...")
                 self._stop_event.clear() # Ensure the stop flag is reset
+                self._wake_event.clear()
                 self._monitor_thread = threading.Thread(target=self._monitor_clipboard, daemon=True)
                 # Daemon=True means thread won't block program exit
                 self._monitor_thread.start()
@@ -194,6 +626,7 @@ class ClipboardManager:
         if self._monitoring_active:
             logging.info("Stopping clipboard monitor...")
             self._stop_event.set() # Signal the thread to stop
+            self._wake_event.set() # And cut short whatever wait/backoff it's sitting in
             if self._monitor_thread and self._monitor_thread.is_alive():
                  self._monitor_thread.join(timeout=2) # Wait for thread to finish
                  if self._monitor_thread.is_alive():
@@ -210,34 +643,244 @@ class ClipboardManager:
 
     # FINISH ### MONITORING LOGIC ###
 
-    # START ### PINNING FUNCTIONALITY (PLACEHOLDER) ###
-    # TODO: Implement pinning logic
-    def pin_clip(self, index_or_content):
-        logging.warning("Pinning functionality not yet implemented.")
-        pass
+    # START ### LISTENER API ###
+    def _emit(self, kind, timestamp, content, hotkey=None):
+        """ Queues an event for listeners. Cheap no-op when nobody's listening. """
+        if not self._listeners:
+            return
+        with self._lock:
+            self._pending_events.append(ClipboardEvent(kind, timestamp, content, hotkey))
+        self._events_ready.set()
+
+    def subscribe(self, callback):
+        """
+        Registers a callback for history changes. It gets called from the dispatcher
+        thread with a list of ClipboardEvent, oldest first. Bursts get coalesced
+        into one call per coalesce_window.
+
+        Returns:
+            The callback, so it can be handed straight back to unsubscribe().
+        """
+        with self._lock:
+            if callback not in self._listeners:
+                self._listeners.append(callback)
+            if not self._dispatch_thread or not self._dispatch_thread.is_alive():
+                self._dispatch_thread = threading.Thread(target=self._dispatch_events, daemon=True)
+                self._dispatch_thread.start()
+        return callback
+
+    def unsubscribe(self, callback):
+        """ Removes a callback added with subscribe(). Returns True if it was registered. """
+        with self._lock:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+                if not self._listeners:
+                    self._events_ready.set() # Wake the dispatcher so it can exit
+                return True
+        return False
+
+    def subscribe_queue(self, loop=None, maxsize=0):
+        """
+        asyncio adapter for subscribe(). Returns an asyncio.Queue that receives
+        each batch (list of ClipboardEvent). Must be called with a running loop
+        unless one is passed in. Batches get dropped if a bounded queue is full.
+        """
+        loop = loop or asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=maxsize)
+
+        def _put(batch):
+            try:
+                queue.put_nowait(batch)
+            except asyncio.QueueFull:
+                logging.warning(f"Listener queue full, dropping {len(batch)} clipboard events.")
+
+        def _forward(batch):
+            if loop.is_closed():
+                self.unsubscribe(_forward)
+                return
+            loop.call_soon_threadsafe(_put, batch)
+
+        queue.clipboard_callback = _forward # So callers can unsubscribe the queue later
+        self.subscribe(_forward)
+        return queue
+
+    def _dispatch_events(self):
+        """ Dispatcher loop. Waits for events, lets the burst settle, then fans out one batch. """
+        while True:
+            self._events_ready.wait()
+            if not self._listeners:
+                with self._lock:
+                    self._pending_events = []
+                    self._events_ready.clear()
+                    if not self._listeners: # Re-check under lock, subscribe() may have raced us
+                        self._dispatch_thread = None
+                        return
+                continue
+            time.sleep(self.coalesce_window)
+            with self._lock:
+                batch, self._pending_events = self._pending_events, []
+                self._events_ready.clear()
+                listeners = list(self._listeners)
+            if not batch:
+                continue
+            for callback in listeners:
+                try:
+                    callback(batch)
+                except Exception as e:
+                    logging.error(f"Clipboard listener {callback!r} failed: {e}", exc_info=True)
+    # FINISH ### LISTENER API ###
+
+    # START ### PINNING FUNCTIONALITY ###
+    def _resolve_clip(self, index_or_content):
+        """
+        Turns a 1-based history position (#1 = latest) or raw content into clip content.
+        Returns None if the position is out of range.
+        """
+        if isinstance(index_or_content, int):
+            entries = self.history.snapshot()[1]
+            if 1 <= index_or_content <= len(entries):
+                return entries[index_or_content - 1][1]
+            logging.warning(f"No clip at history position #{index_or_content}.")
+            return None
+        return index_or_content
+
+    def _next_free_pin_slot(self):
+        """ Pops the lowest open default slot. Slots taken by explicit hotkeys get skipped lazily. """
+        while self._free_pin_slots:
+            slot = str(heapq.heappop(self._free_pin_slots))
+            if slot not in self.pinned_clips:
+                return slot
+        return None
+
+    def _release_pin(self, hotkey):
+        """ Drops a pin and hands its slot back. Caller holds the lock. """
+        _, content = self.pinned_clips.pop(hotkey)
+        if self._pinned_by_content.get(content) == hotkey:
+            del self._pinned_by_content[content]
+        if isinstance(content, ClipPayload):
+            self.payloads.release(content)
+        self._emit('unpin', time.time(), content, hotkey)
+        slot = int(hotkey) if hotkey.isdigit() else None
+        # Explicit hotkeys and replacements never popped their slot, so it may still be in the heap
+        if slot is not None and 1 <= slot <= self.PIN_SLOTS and slot not in self._free_pin_slots:
+            heapq.heappush(self._free_pin_slots, slot)
+        return content
+
+    def pin_clip(self, index_or_content, hotkey=None):
+        """
+        Pins a clip to a hotkey slot. Pinned clips are stored outside the history deque,
+        so they stay put when history rolls over or gets cleared.
+
+        Args:
+            index_or_content (int | str): 1-based history position or the clip content itself.
+            hotkey (str, optional): Slot to pin into. Defaults to the lowest free slot (1-9).
+
+        Returns:
+            str | None: The hotkey the clip landed on, or None if it couldn't be pinned.
+        """
+        with self._lock:
+            content = self._resolve_clip(index_or_content)
+            if not content or (isinstance(content, str) and content.isspace()):
+                logging.warning("Nothing to pin.")
+                return None
+
+            existing = self._pinned_by_content.get(content)
+            if existing is not None and (hotkey is None or str(hotkey) == existing):
+                logging.info(f"Clip already pinned to slot {existing}.")
+                return existing
+
+            if hotkey is None:
+                hotkey = self._next_free_pin_slot()
+                if hotkey is None:
+                    logging.warning(f"All {self.PIN_SLOTS} pin slots are taken. Unpin somethin' first.")
+                    return None
+            hotkey = str(hotkey)
+
+            if isinstance(content, ClipPayload):
+                # Before any release below, so moving a clip never drops its last reference
+                self.payloads.retain(content)
+            if hotkey in self.pinned_clips:
+                logging.info(f"Replacing clip pinned to slot {hotkey}.")
+                self._release_pin(hotkey)
+            if existing is not None:
+                self._release_pin(existing) # Moving the clip to a new slot
+
+            pinned_at = time.time()
+            self.pinned_clips[hotkey] = (pinned_at, content)
+            self._pinned_by_content[content] = hotkey
+            self._emit('pin', pinned_at, content, hotkey)
+            logging.info(f"Pinned clip to slot {hotkey}: {describe_clip(content)}...")
+            return hotkey
 
     def unpin_clip(self, hotkey_or_content):
-        logging.warning("Unpinning functionality not yet implemented.")
-        pass
+        """
+        Unpins by hotkey or by content. Returns True if somethin' got unpinned.
+        """
+        with self._lock:
+            key = str(hotkey_or_content) if isinstance(hotkey_or_content, int) else hotkey_or_content
+            if key not in self.pinned_clips:
+                key = self._pinned_by_content.get(hotkey_or_content)
+            if key is None:
+                logging.warning("No pinned clip matches that hotkey or content.")
+                return False
+            self._release_pin(key)
+            logging.info(f"Unpinned slot {key}.")
+            return True
 
     def get_pinned_clips(self):
-        logging.warning("Pinned clips retrieval not yet implemented.")
-        return self.pinned_clips
-    # FINISH ### PINNING FUNCTIONALITY (PLACEHOLDER) ###
-
-    # START ### SEQUENTIAL PASTE (PLACEHOLDER) ###
-    # TODO: Implement sequential paste logic
-    sequential_mode_active = False
-    sequential_paste_index = 0
+        """ Returns a copy of the pinned clips as {hotkey: (timestamp, content)}. """
+        with self._lock:
+            return dict(self.pinned_clips)
+    # FINISH ### PINNING FUNCTIONALITY ###
 
+    # START ### SEQUENTIAL PASTE ###
     def toggle_sequential_paste(self):
-        logging.warning("Sequential paste toggle not yet implemented.")
-        pass
+        """
+        Flips sequential paste mode. Turning it on freezes the current history
+        version so new copies don't shift the cursor mid-batch. Clips come out
+        oldest first.
+
+        Returns:
+            bool: True if sequential mode is now active.
+        """
+        with self._lock:
+            if self.sequential_mode_active:
+                self.sequential_mode_active = False
+                self._sequential_snapshot = ()
+                self._sequential_index = 0
+                logging.info("Sequential paste mode OFF.")
+            else:
+                # History versions are immutable, so freezing the batch is just holding a reference
+                self._sequential_snapshot = self.history.snapshot()[1]
+                self._sequential_index = 0
+                self.sequential_mode_active = True
+                logging.info(f"Sequential paste mode ON with {len(self._sequential_snapshot)} clips queued.")
+            return self.sequential_mode_active
 
     def get_next_sequential_clip(self):
-        logging.warning("Sequential paste logic not yet implemented.")
-        return None
-    # FINISH ### SEQUENTIAL PASTE (PLACEHOLDER) ###
+        """
+        Returns the next clip from the frozen snapshot and advances the cursor.
+        Returns None (and drops out of sequential mode) once the batch runs dry.
+        """
+        with self._lock:
+            if not self.sequential_mode_active:
+                return None
+            if self._sequential_index >= len(self._sequential_snapshot):
+                logging.info("Sequential paste batch finished.")
+                self.sequential_mode_active = False
+                self._sequential_snapshot = ()
+                self._sequential_index = 0
+                return None
+            # Snapshot is latest-first, the batch pastes oldest-first
+            content = self._sequential_snapshot[-1 - self._sequential_index][1]
+            self._sequential_index += 1
+            return content
+
+    def get_sequential_remaining(self):
+        """ How many clips are left in the current sequential batch. """
+        with self._lock:
+            return len(self._sequential_snapshot) - self._sequential_index
+    # FINISH ### SEQUENTIAL PASTE ###
 
 # FINISH ### CLIPBOARD MANAGER CLASS ###
 
@@ -249,28 +892,30 @@ if __name__ == '__main__':
     # Ensure we handle potential path issues if run from different directories
     # If using file logging later, configure path carefully
     manager = ClipboardManager(max_history=10)
+
+    def print_updates(events):
+        """ Prints each coalesced batch, then the history through a copy-free view. """
+        kinds = ", ".join(f"{e.kind}" for e in events)
+        print(f"\n----- History Updated ({len(events)} events: {kinds}) -----")
+        view = manager.history_view()
+        if not view:
+            print("-- Empty --")
+        else:
+            # Display in the numbered format we want (#1 = latest)
+            for i, (ts, content) in enumerate(view, 1):
+                print(f"#{i}: {describe_clip(content, 60).replace(chr(10), ' ')}...") # Show first 60 chars, replace newlines
+        print("-------------------------------------------")
+
+    manager.subscribe(print_updates)
     manager.start_monitoring()
 
     print("Clipboard monitor started. Copy text to see history updates.")
     print("Press Ctrl+C to stop.")
 
     try:
+        # Nothing to poll anymore, updates get pushed to print_updates
         while True:
-            # Keep the main thread alive to let the monitor run
-            # Print history periodically for testing - less spammy than every loop
-            print("\n----- Current History (Latest First) -----")
-            history = manager.get_history()
-            if not history:
-                print("-- Empty --")
-            else:
-                # Display in the numbered format we want (#1 = latest)
-                for i, (ts, content) in enumerate(history, 1):
-                    # Format timestamp nicely? Maybe later. Use ISO format for clarity?
-                    # timestamp_str = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(ts))
-                    print(f"#{i}: {content[:60].replace(chr(10), ' ')}...") # Show first 60 chars, replace newlines
-            print("-------------------------------------------")
-            # Sleep longer in the main thread for testing, monitor thread runs independently
-            time.sleep(10)
+            time.sleep(1)
     except KeyboardInterrupt:
         print("\nCtrl+C detected. Stopping test...")
     except Exception as main_e:
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+
+# START ### IMPORTS ###
+import os
+import sys
+import json
+import shlex
+import shutil
+import argparse
+import subprocess
+from pathlib import Path
+from typing import NamedTuple
+from rich.console import Console
+from rich.table import Table
+# FINISH ### IMPORTS ###
+
+# START ### CONSOLE SETUP ###
+console = Console()
+# FINISH ### CONSOLE SETUP ###
+
+# START ### CONFIGURATION ###
+SYSFS_ROOT = Path("/sys/devices/system")
+PLAN_PATH = Path("/app/config/cpu_plan.json")
+SERVICES_CONFIG = Path("/app/config/services.json")
+SERVER_CONFIG = Path("/app/config/server.json")
+INFERENCE_PREFIX = "llama_server" # llama_server, llama_server_green: the services that get the dedicated cores
+HELPER_CORES = os.environ.get("CPU_HELPER_CORES") # Physical cores kept for bolt/ngrok/proxy; unset = ~1 in 8
+# FINISH ### CONFIGURATION ###
+
+# START ### TOPOLOGY ###
+class Cpu(NamedTuple):
+    id: int
+    core: tuple  # (package, core_id): hardware threads sharing it are SMT siblings
+    node: int
+
+
+class Topology(NamedTuple):
+    cpus: list   # Cpu, only the ones this process may run on
+
+    def nodes(self):
+        return sorted({cpu.node for cpu in self.cpus})
+
+    def cores(self, node=None):
+        """{core: [cpu ids]} with the sibling list sorted, first sibling = the one we give a thread"""
+        cores = {}
+        for cpu in self.cpus:
+            if node is None or cpu.node == node:
+                cores.setdefault(cpu.core, []).append(cpu.id)
+        return {core: sorted(ids) for core, ids in sorted(cores.items(), key=lambda item: min(item[1]))}
+
+
+def parse_cpu_list(text):
+    """'0-3,8,10-11' -> [0, 1, 2, 3, 8, 10, 11]"""
+    cpus = []
+    for part in text.strip().split(","):
+        if not part:
+            continue
+        start, _, end = part.partition("-")
+        cpus.extend(range(int(start), int(end or start) + 1))
+    return cpus
+
+
+def format_cpu_list(cpus):
+    """[0, 1, 2, 3, 8] -> '0-3,8' (what taskset -c takes)"""
+    parts, cpus = [], sorted(cpus)
+    start = previous = None
+    for cpu in cpus + [None]:
+        if start is not None and cpu == previous + 1:
+            previous = cpu
+            continue
+        if start is not None:
+            parts.append(f"{start}-{previous}" if previous != start else str(start))
+        start = previous = cpu
+    return ",".join(parts)
+
+
+def _read(path, default=None):
+    try:
+        return Path(path).read_text().strip()
+    except OSError:
+        return default
+
+
+def read_topology(root=SYSFS_ROOT, allowed=None):
+    """
+    CPUs, their physical cores and NUMA nodes from sysfs. root and allowed
+    are injectable so a fake tree works in tests; allowed defaults to this
+    process's affinity mask (the container's cpuset).
+    """
+    root = Path(root)
+    online = parse_cpu_list(_read(root / "cpu" / "online", "") or "")
+    if not online:
+        online = list(range(os.cpu_count() or 1))
+    if allowed is None:
+        allowed = os.sched_getaffinity(0) if hasattr(os, "sched_getaffinity") else set(online)
+
+    node_of = {}
+    for node_dir in sorted((root / "node").glob("node[0-9]*")):
+        for cpu in parse_cpu_list(_read(node_dir / "cpulist", "")):
+            node_of[cpu] = int(node_dir.name[4:])
+
+    cpus = []
+    for cpu in online:
+        if cpu not in allowed:
+            continue
+        topology = root / "cpu" / f"cpu{cpu}" / "topology"
+        package = int(_read(topology / "physical_package_id", "0") or 0)
+        core_id = _read(topology / "core_id")
+        # No topology info (some VMs): every CPU is its own core
+        core = (package, int(core_id)) if core_id is not None else (package, 100000 + cpu)
+        cpus.append(Cpu(cpu, core, node_of.get(cpu, 0)))
+    return Topology(cpus)
+# FINISH ### TOPOLOGY ###
+
+# START ### PLANNER ###
+def plan_affinity(topology, services, helper_cores=None, numactl=None):
+    """
+    Split the allowed CPUs between the model server and everything else.
+    The llama_server* services get one hardware thread on each physical core
+    of the biggest NUMA node (matmul threads fighting their own SMT sibling
+    just slows both), minus helper_cores cores left for bolt, ngrok and the
+    proxy. With more than one node the helpers get the other nodes instead
+    and the server's memory is kept local with numactl. Returns the plan dict.
+    """
+    numactl = shutil.which("numactl") if numactl is None else numactl
+    nodes = topology.nodes()
+    node = max(nodes, key=lambda n: len(topology.cores(n)))
+    cores = list(topology.cores(node).items())
+
+    if len(nodes) > 1:
+        inference_cores = cores
+        helper_cpus = [cpu.id for cpu in topology.cpus if cpu.node != node]
+    else:
+        reserve = int(helper_cores) if helper_cores is not None else max(1, round(len(cores) / 8))
+        reserve = min(reserve, len(cores) - 1) # Server always keeps at least one core
+        inference_cores = cores[:len(cores) - reserve]
+        helper_cpus = [cpu for _, ids in cores[len(cores) - reserve:] for cpu in ids]
+    inference_cpus = [ids[0] for _, ids in inference_cores]
+    if not helper_cpus: # Single core box: nothing to split, everybody shares
+        helper_cpus = inference_cpus
+
+    inference_prefix = ["taskset", "-c", format_cpu_list(inference_cpus)]
+    if len(nodes) > 1 and numactl:
+        # preferred, not membind: a model bigger than the node still loads, just partly remote
+        inference_prefix = [numactl, f"--physcpubind={format_cpu_list(inference_cpus)}",
+                            f"--cpunodebind={node}", f"--preferred={node}"]
+    helper_prefix = ["taskset", "-c", format_cpu_list(helper_cpus)]
+
+    plan = {
+        "node": node,
+        "nodes": nodes,
+        "n_threads": len(inference_cpus),
+        "inference_cpus": format_cpu_list(inference_cpus),
+        "helper_cpus": format_cpu_list(helper_cpus),
+        "services": {},
+    }
+    for name in services:
+        inference = name.startswith(INFERENCE_PREFIX)
+        plan["services"][name] = {
+            "cpus": plan["inference_cpus"] if inference else plan["helper_cpus"],
+            "prefix": inference_prefix if inference else helper_prefix,
+        }
+    return plan
+
+
+def wrap_command(command, plan, service):
+    """command (argv list) prefixed with the service's taskset/numactl, unchanged if the plan doesn't cover it"""
+    entry = (plan or {}).get("services", {}).get(service)
+    return [*entry["prefix"], *command] if entry else list(command)
+
+
+def load_plan(path=PLAN_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_plan(plan, path=PLAN_PATH):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(plan, f, indent=2)
+    os.replace(tmp_path, path)
+# FINISH ### PLANNER ###
+
+# START ### BENCHMARK ###
+DECODE_SNIPPET = """
+import sys, json, time, llama_cpp
+model, threads, tokens, gpu_layers = sys.argv[1], int(sys.argv[2]), int(sys.argv[3]), int(sys.argv[4])
+llama = llama_cpp.Llama(model_path=model, n_ctx=512, n_threads=threads, n_gpu_layers=gpu_layers, verbose=False)
+llama.create_completion("Hello", max_tokens=1)
+count, first = 0, None
+for _ in llama.create_completion("Write a long story about a lighthouse.", max_tokens=tokens, temperature=0, stream=True):
+    first = first or time.monotonic()
+    count += 1
+print(json.dumps({"tokens": count, "tokens_per_second": (count - 1) / (time.monotonic() - first) if count > 1 else 0.0}))
+"""
+
+
+def decode_rate(prefix, model, threads, tokens, gpu_layers, background, background_prefix):
+    """Decode tokens/s of one fresh model load under prefix, with busy loops standing in for bolt/ngrok"""
+    hogs = [subprocess.Popen([*background_prefix, sys.executable, "-c", "while True: pass"])
+            for _ in range(background)]
+    try:
+        result = subprocess.run([*prefix, sys.executable, "-c", DECODE_SNIPPET, str(model), str(threads),
+                                 str(tokens), str(gpu_layers)], capture_output=True, text=True, check=True)
+        return json.loads(result.stdout.strip().splitlines()[-1])["tokens_per_second"]
+    finally:
+        for hog in hogs:
+            hog.kill()
+            hog.wait()
+
+
+def benchmark(plan, model, tokens=64, gpu_layers=0, background=2, runs=2):
+    """Unpinned (n_threads = physical cores, the old default) vs the plan. Best of runs each."""
+    physical = len(read_topology().cores())
+    llama_prefix = plan["services"].get(INFERENCE_PREFIX, {}).get("prefix") or ["taskset", "-c", plan["inference_cpus"]]
+    helper_prefix = ["taskset", "-c", plan["helper_cpus"]]
+    baseline = max(decode_rate([], model, physical, tokens, gpu_layers, background, []) for _ in range(runs))
+    planned = max(decode_rate(llama_prefix, model, plan["n_threads"], tokens, gpu_layers, background, helper_prefix)
+                  for _ in range(runs))
+    return {
+        "baseline_threads": physical, "baseline_tokens_per_second": round(baseline, 2),
+        "planned_threads": plan["n_threads"], "planned_tokens_per_second": round(planned, 2),
+        "gain_percent": round(100.0 * (planned - baseline) / baseline, 1) if baseline else None,
+    }
+# FINISH ### BENCHMARK ###
+
+# START ### MAIN FUNCTION ###
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CPU/NUMA affinity plan for the supervised services")
+    parser.add_argument("--sysfs", default=str(SYSFS_ROOT))
+    parser.add_argument("--plan", default=str(PLAN_PATH))
+    sub = parser.add_subparsers(dest="command", required=True)
+    plan_cmd = sub.add_parser("plan", help="Read the topology and write the per-service core plan")
+    plan_cmd.add_argument("--services", default=str(SERVICES_CONFIG))
+    plan_cmd.add_argument("--helper-cores", type=int, default=int(HELPER_CORES) if HELPER_CORES else None)
+    plan_cmd.add_argument("--json", action="store_true")
+    prefix_cmd = sub.add_parser("prefix", help="Print a service's launch prefix (for shell scripts)")
+    prefix_cmd.add_argument("service")
+    bench = sub.add_parser("bench", help="Decode tokens/s unpinned vs planned (stop the server first)")
+    bench.add_argument("--model", help="GGUF (default: model_path from server.json)")
+    bench.add_argument("--tokens", type=int, default=64)
+    bench.add_argument("--background", type=int, default=2, help="Busy processes standing in for bolt/ngrok")
+    bench.add_argument("--runs", type=int, default=2)
+    args = parser.parse_args(argv)
+
+    if args.command == "prefix":
+        plan = load_plan(args.plan)
+        print(shlex.join(wrap_command([], plan, args.service)))
+        return 0
+
+    if args.command == "bench":
+        plan = load_plan(args.plan)
+        if not plan:
+            parser.error(f"No plan at {args.plan}; run 'plan' first")
+        server = json.loads(SERVER_CONFIG.read_text()) if SERVER_CONFIG.exists() else {}
+        model = args.model or server.get("model_path")
+        if not model:
+            parser.error("bench needs --model (or a model_path in server.json)")
+        console.print(f"[cyan][CPU] Decoding {args.tokens} tokens, unpinned vs planned, {args.background} busy helpers...[/cyan]")
+        result = benchmark(plan, model, args.tokens, server.get("n_gpu_layers", 0), args.background, args.runs)
+        table = Table(title="Decode throughput", border_style="cyan")
+        for column in ("Layout", "Threads", "Tokens/s"):
+            table.add_column(column)
+        table.add_row("Unpinned", str(result["baseline_threads"]), str(result["baseline_tokens_per_second"]))
+        table.add_row(f"Planned ({plan['inference_cpus']})", str(result["planned_threads"]), str(result["planned_tokens_per_second"]))
+        console.print(table)
+        gain = f"{result['gain_percent']:+.1f}%" if result["gain_percent"] is not None else "n/a"
+        console.print(f"[green][CPU] Gain: {gain}[/green]")
+        return 0
+
+    services = json.loads(Path(args.services).read_text()).get("services", {}) if Path(args.services).exists() else {}
+    topology = read_topology(args.sysfs)
+    plan = plan_affinity(topology, services, args.helper_cores)
+    save_plan(plan, args.plan)
+    if args.json:
+        print(json.dumps(plan))
+        return 0
+    table = Table(title=f"CPU plan ({len(topology.cpus)} CPUs, {len(topology.cores())} cores, "
+                        f"{len(plan['nodes'])} NUMA node(s))", border_style="cyan")
+    table.add_column("Service")
+    table.add_column("CPUs")
+    table.add_column("Launch prefix")
+    for name, entry in plan["services"].items():
+        table.add_row(name, entry["cpus"], " ".join(entry["prefix"]))
+    console.print(table)
+    console.print(f"[green][CPU] llama_server threads: {plan['n_threads']}. Plan saved to {args.plan}[/green]")
+    return 0
+# FINISH ### MAIN FUNCTION ###
+
+# START ### SCRIPT RUNNER ###
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        sys.exit(130)
+    except Exception as e:
+        console.print(f"[red][CPU] Error: {str(e)}[/red]")
+        sys.exit(1)
+# FINISH ### SCRIPT RUNNER ###
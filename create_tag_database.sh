@@ -4,72 +4,85 @@
 set -e
 
 # START ### CONFIGURATION ###
-# File containing the raw list of NVIDIA CUDA tags, one per line.
+# File containing the raw scrape of the NVIDIA CUDA tags page, one line per line.
 # Make sure this file exists and has the tags from https://termbin.com/5ceo
-INPUT_TAG_FILE="nvidia_tags.txt"
+# Pass other dump files as arguments to ingest those instead.
+if [ "$#" -gt 0 ]; then
+    INPUT_TAG_FILES=("$@")
+else
+    INPUT_TAG_FILES=("nvidia_tags.txt")
+fi
+
+# The structured index we upsert into. This is your database.
+OUTPUT_INDEX_FILE="config/cuda_tags_index.json"
 
-# The output JSON file we gon' create. This is your database.
-OUTPUT_JSON_FILE="cuda_tags_database.json"
+# Set PRUNE=no when the dump is only some pages of the listing, so tags it
+# doesn't mention don't get dropped.
+PRUNE="${PRUNE:-yes}"
 # FINISH ### CONFIGURATION ###
 
 
 # START ### SCRIPT BANNER ###
 echo "=============================================="
-echo " NVIDIA CUDA Tag Database Creator Script      "
-echo " Input : $INPUT_TAG_FILE                      "
-echo " Output: $OUTPUT_JSON_FILE                   "
+echo " NVIDIA CUDA Tag Database Updater Script      "
+echo " Input : ${INPUT_TAG_FILES[*]}"
+echo " Output: $OUTPUT_INDEX_FILE"
 echo "=============================================="
 # FINISH ### SCRIPT BANNER ###
 
 
 # START ### INPUT VALIDATION ###
-echo "[*] Checkin' if input file '$INPUT_TAG_FILE' is present..."
-if [ ! -f "$INPUT_TAG_FILE" ]; then
-    echo "[!] ERROR: Input tag file '$INPUT_TAG_FILE' not found, my boy."
-    echo "[!] Make sure you saved that tag list from termbin into this file."
-    echo "[!] Peace out."
-    exit 1
-else
-    echo "[+] Input file found. Solid."
-fi
+for INPUT_TAG_FILE in "${INPUT_TAG_FILES[@]}"; do
+    echo "[*] Checkin' if input file '$INPUT_TAG_FILE' is present..."
+    if [ ! -f "$INPUT_TAG_FILE" ]; then
+        echo "[!] ERROR: Input tag file '$INPUT_TAG_FILE' not found, my boy."
+        echo "[!] Make sure you saved that tag list from termbin into this file."
+        echo "[!] Peace out."
+        exit 1
+    fi
+done
+echo "[+] Input files found. Solid."
 
-echo "[*] Checkin' if 'jq' command is available..."
-if ! command -v jq &> /dev/null; then
-    echo "[!] ERROR: 'jq' command not found. This script needs jq to build the JSON."
-    echo "[!] Install that tool, G. On Debian/Ubuntu run this:"
-    echo "    sudo apt update && sudo apt install jq"
+echo "[*] Checkin' if 'python3' is available..."
+if ! command -v python3 &> /dev/null; then
+    echo "[!] ERROR: 'python3' not found. The ingest runs through cuda_tags.py."
     echo "[!] Peace out."
     exit 1
 else
-    echo "[+] 'jq' is installed. We good."
+    echo "[+] 'python3' is installed. We good."
 fi
 # FINISH ### INPUT VALIDATION ###
 
 
 # START ### TAG PROCESSING ###
-echo "[*] Aight, processin' tags from '$INPUT_TAG_FILE'..."
-echo "[*] Readin' raw lines, choppin' empty ones, buildin' JSON array..."
-
-# Use jq:
-# -R : Read raw text strings, not JSON
-# -s : Slurp the entire input into a single string
-# 'split("\n")' : Split the slurped string into an array based on newlines
-# '| map(select(length > 0))' : Filter out any empty strings resulting from blank lines
-jq -R -s 'split("\n") | map(select(length > 0))' "$INPUT_TAG_FILE" > "$OUTPUT_JSON_FILE"
-
-if [ $? -ne 0 ]; then
-    echo "[!] FUCK! Somethin' went wrong usin' jq."
-    echo "[!] Couldn't create '$OUTPUT_JSON_FILE'. Check for errors above."
+# No more full regeneration. cuda_tags.py parses the dump(s), upserts only the
+# (tag, arch) pairs that changed, keeps digest/push history per tag and writes
+# the index atomically. It reports what got added, re-pushed or removed.
+echo "[*] Aight, ingestin' tags from '${INPUT_TAG_FILES[*]}'..."
+INGEST_FLAGS=(--index "$OUTPUT_INDEX_FILE" --verbose)
+if [ "$PRUNE" = "yes" ]; then
+    INGEST_FLAGS+=(--prune)
+fi
+
+if ! python3 cuda_tags.py ingest "${INPUT_TAG_FILES[@]}" "${INGEST_FLAGS[@]}"; then
+    echo "[!] FUCK! Somethin' went wrong ingestin' the dump."
+    echo "[!] '$OUTPUT_INDEX_FILE' was left untouched. Check for errors above."
     exit 1
 fi
 # FINISH ### TAG PROCESSING ###
 
 
+# START ### INDEX CHECK ###
+echo "[+] Newest devel image for CUDA 12 on ubuntu22.04/amd64:"
+python3 cuda_tags.py query --flavor devel --os ubuntu22.04 --cuda 12 --image --index "$OUTPUT_INDEX_FILE" || echo "[!] No match for that in the index yet."
+# FINISH ### INDEX CHECK ###
+
+
 # START ### COMPLETION MESSAGE ###
 echo "[+] BET! Operation complete."
-echo "[+] We processed them tags and dropped a clean JSON database file:"
-echo "    '$OUTPUT_JSON_FILE'"
-echo "[+] Now your application can load this file and know all the CUDA tags."
+echo "[+] Structured index is up to date:"
+echo "    '$OUTPUT_INDEX_FILE'"
+echo "[+] Query it with: python3 cuda_tags.py query --flavor devel --os ubuntu22.04 --cuda 12"
 echo "[+] Handle your business, big dawg!"
 # FINISH ### COMPLETION MESSAGE ###
 
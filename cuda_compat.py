@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+
+# START ### IMPORTS ###
+import sys
+import argparse
+import subprocess
+from typing import NamedTuple
+from rich.console import Console
+from rich.table import Table
+import cuda_tags
+# FINISH ### IMPORTS ###
+
+# START ### CONSOLE SETUP ###
+console = Console()
+err_console = Console(stderr=True) # manage.sh captures stdout as build args, so diagnostics stay off it
+# FINISH ### CONSOLE SETUP ###
+
+# START ### COMPATIBILITY TABLES ###
+# Minimum Linux x86_64 driver per CUDA toolkit minor release (GA driver from the
+# CUDA toolkit release notes). The nvidia/cuda images enforce the same thing at
+# container start through NVIDIA_REQUIRE_CUDA.
+MIN_DRIVER_BY_CUDA = [
+    ((10, 2), "440.33"),
+    ((11, 0), "450.36.06"),
+    ((11, 1), "455.23"),
+    ((11, 2), "460.27.03"),
+    ((11, 3), "465.19.01"),
+    ((11, 4), "470.42.01"),
+    ((11, 5), "495.29.05"),
+    ((11, 6), "510.39.01"),
+    ((11, 7), "515.43.04"),
+    ((11, 8), "520.61.05"),
+    ((12, 0), "525.60.13"),
+    ((12, 1), "530.30.02"),
+    ((12, 2), "535.54.03"),
+    ((12, 3), "545.23.06"),
+    ((12, 4), "550.54.14"),
+    ((12, 5), "555.42.02"),
+    ((12, 6), "560.28.03"),
+    ((12, 8), "570.26"),
+    ((12, 9), "575.51.03"),
+    ((13, 0), "580.65.06"),
+]
+
+# (first CUDA version, lowest compute capability, highest compute capability) the
+# toolkit can build for. Each row holds until the next one. P2000 is 6.1, which
+# CUDA 12.x still covers; 13.0 drops Maxwell/Pascal/Volta.
+COMPUTE_CAPABILITY_BY_CUDA = [
+    ((10, 0), (3, 0), (7, 5)),
+    ((11, 0), (3, 5), (8, 0)),
+    ((11, 1), (3, 5), (8, 6)),
+    ((11, 5), (3, 5), (8, 7)),
+    ((11, 8), (3, 5), (9, 0)),
+    ((12, 0), (5, 0), (9, 0)),
+    ((12, 8), (5, 0), (12, 0)),
+    ((13, 0), (7, 5), (12, 1)),
+]
+# FINISH ### COMPATIBILITY TABLES ###
+
+# START ### VERSION HELPERS ###
+def driver_tuple(version):
+    """'535.183.01' -> (535, 183, 1)."""
+    return tuple(int(p) for p in str(version).strip().split(".") if p.isdigit())
+
+
+def capability_tuple(capability):
+    """'6.1' -> (6, 1)."""
+    major, _, minor = str(capability).strip().partition(".")
+    return int(major), int(minor or 0)
+
+
+def min_driver_for(cuda_version, minor_compat=False):
+    """
+    Lowest driver that runs this CUDA version, or None if it's not in the table.
+    With minor_compat the major's .0 driver is enough (CUDA minor version
+    compatibility), at the cost of no PTX JIT for newer features.
+    """
+    major, minor, _ = cuda_tags.version_tuple(cuda_version)
+    if minor_compat and major >= 11:
+        minor = 0
+    best = None
+    for (t_major, t_minor), driver in MIN_DRIVER_BY_CUDA:
+        if (t_major, t_minor) <= (major, minor) and t_major == major:
+            best = driver
+    return best
+
+
+def supports_capability(cuda_version, capability):
+    """True if the toolkit can still target this GPU architecture."""
+    version = cuda_tags.version_tuple(cuda_version)[:2]
+    row = None
+    for entry in COMPUTE_CAPABILITY_BY_CUDA:
+        if entry[0] <= version:
+            row = entry
+    if row is None:
+        return False
+    _, low, high = row
+    return low <= capability_tuple(capability) <= high
+
+
+def is_compatible(cuda_version, driver_version, capability, minor_compat=False):
+    required = min_driver_for(cuda_version, minor_compat)
+    if required is None:
+        return False
+    return driver_tuple(driver_version) >= driver_tuple(required) and supports_capability(cuda_version, capability)
+# FINISH ### VERSION HELPERS ###
+
+# START ### HOST DETECTION ###
+def detect_host_gpu():
+    """
+    Ask nvidia-smi for the driver version and the lowest compute capability
+    across installed GPUs. Returns (driver, capability) or (None, None).
+    """
+    try:
+        output = subprocess.check_output(
+            ["nvidia-smi", "--query-gpu=driver_version,compute_cap", "--format=csv,noheader"],
+            stderr=subprocess.DEVNULL, text=True, timeout=10
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None, None
+    drivers, capabilities = [], []
+    for line in output.strip().splitlines():
+        parts = [p.strip() for p in line.split(",")]
+        if len(parts) >= 2:
+            drivers.append(parts[0])
+            capabilities.append(parts[1])
+    if not drivers:
+        return None, None
+    # Mixed cards: the image has to work on the oldest one
+    capability = min(capabilities, key=capability_tuple)
+    return drivers[0], capability
+# FINISH ### HOST DETECTION ###
+
+# START ### RESOLVER ###
+class ImagePair(NamedTuple):
+    cuda_version: str
+    cudnn: str
+    devel: cuda_tags.CudaImageTag
+    runtime: cuda_tags.CudaImageTag
+
+    @property
+    def total_size(self):
+        return self.devel.size_bytes + self.runtime.size_bytes
+
+
+def resolve_image_pairs(index, driver_version, capability, os_name="ubuntu22.04", arch="amd64",
+                        cudnn=None, minor_compat=False):
+    """
+    Newest CUDA version that this driver + GPU can run and that has both a
+    devel and a runtime image for os_name/arch. Returns every devel/runtime
+    pair at that version (one per cuDNN variant, or just the requested one),
+    smallest combined pull first. Empty list if nothing fits.
+
+    cudnn=None means any variant, "" means plain images only.
+    """
+    variants = [cudnn] if cudnn is not None else sorted({r.cudnn for r in index.records})
+    candidates = {} # cuda_version -> [ImagePair]
+    for variant in variants:
+        runtimes = {r.cuda_version: r for r in index.range("runtime", os_name, arch, cudnn=variant)}
+        for devel in index.range("devel", os_name, arch, cudnn=variant):
+            runtime = runtimes.get(devel.cuda_version)
+            if runtime is None:
+                continue
+            candidates.setdefault(devel.cuda_version, []).append(ImagePair(devel.cuda_version, variant, devel, runtime))
+
+    for cuda_version in sorted(candidates, key=cuda_tags.version_tuple, reverse=True):
+        if is_compatible(cuda_version, driver_version, capability, minor_compat):
+            return sorted(candidates[cuda_version], key=lambda pair: pair.total_size)
+    return []
+# FINISH ### RESOLVER ###
+
+# START ### CLI ###
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pick the newest nvidia/cuda images this host can actually run")
+    parser.add_argument("--driver", help="Host driver version (default: ask nvidia-smi)")
+    parser.add_argument("--cc", help="GPU compute capability, e.g. 6.1 (default: ask nvidia-smi)")
+    parser.add_argument("--os", dest="os_name", default="ubuntu22.04")
+    parser.add_argument("--arch", default="amd64")
+    parser.add_argument("--cudnn", default="none", help="cuDNN variant (cudnn8, cudnn9, ...), 'none' or 'any'")
+    parser.add_argument("--minor-compat", action="store_true", help="Allow newer 12.x minors on an older 12.x driver")
+    parser.add_argument("--docker-args", action="store_true", help="Print --build-arg flags for the best pair")
+    parser.add_argument("--index", default=str(cuda_tags.INDEX_PATH))
+    args = parser.parse_args(argv)
+
+    driver, capability = args.driver, args.cc
+    if not driver or not capability:
+        detected_driver, detected_cc = detect_host_gpu()
+        driver = driver or detected_driver
+        capability = capability or detected_cc
+    if not driver or not capability:
+        err_console.print("[red]Couldn't detect the GPU. Pass --driver and --cc (e.g. --driver 535.183.01 --cc 6.1).[/red]")
+        return 2
+
+    cudnn = {"none": "", "any": None}.get(args.cudnn, args.cudnn)
+    index = cuda_tags.load_index(args.index)
+    pairs = resolve_image_pairs(index, driver, capability, args.os_name, args.arch, cudnn, args.minor_compat)
+    if not pairs:
+        err_console.print(f"[yellow]No {args.os_name}/{args.arch} devel+runtime pair fits driver {driver} / sm_{capability}.[/yellow]")
+        return 1
+
+    best = pairs[0]
+    if args.docker_args:
+        build_args = cuda_tags.docker_build_args(best.devel)
+        print(" ".join(f"--build-arg {k}={v}" for k, v in build_args.items()))
+        return 0
+
+    table = Table(title=f"CUDA {best.cuda_version} for driver {driver}, compute {capability}", border_style="cyan")
+    for column in ("cuDNN", "Devel image", "Runtime image", "Pull size"):
+        table.add_column(column)
+    for pair in pairs:
+        table.add_row(pair.cudnn or "-", pair.devel.image, pair.runtime.image, cuda_tags.format_size(pair.total_size))
+    console.print(table)
+    console.print(f"[dim]Needs driver >= {min_driver_for(best.cuda_version, args.minor_compat)}[/dim]")
+    return 0
+# FINISH ### CLI ###
+
+# START ### SCRIPT RUNNER ###
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        sys.exit(130)
+    except Exception as e:
+        err_console.print(f"[red]Critical error: {str(e)}[/red]")
+        sys.exit(1)
+# FINISH ### SCRIPT RUNNER ###
@@ -0,0 +1,514 @@
+#!/usr/bin/env python3
+
+# START ### IMPORTS ###
+import os
+import re
+import sys
+import json
+import bisect
+import argparse
+import tempfile
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import NamedTuple
+from rich.console import Console
+from rich.table import Table
+# FINISH ### IMPORTS ###
+
+# START ### CONSOLE SETUP ###
+console = Console()
+# FINISH ### CONSOLE SETUP ###
+
+# START ### CONFIGURATION ###
+BASE_DIR = Path(__file__).resolve().parent
+RAW_DATABASE = BASE_DIR / "cuda_tags_database.json" # Raw Docker Hub scrape from create_tag_database.sh
+INDEX_PATH = BASE_DIR / "config" / "cuda_tags_index.json" # Structured, sorted, queryable form
+IMAGE_REPO = "nvidia/cuda"
+INDEX_FORMAT_VERSION = 2
+# FINISH ### CONFIGURATION ###
+
+# START ### RECORD TYPES ###
+class CudaImageTag(NamedTuple):
+    """One (tag, arch) pair from Docker Hub - a single pullable image."""
+    tag: str                 # e.g. "12.2.2-cudnn8-devel-ubuntu22.04"
+    cuda_version: str        # e.g. "12.2.2"
+    flavor: str              # base | runtime | devel
+    cudnn: str               # "" when no cuDNN, else "cudnn", "cudnn8", "cudnn9"
+    os: str                  # e.g. "ubuntu22.04"; "" for the old OS-less tags
+    arch: str                # amd64 | arm64 | ppc64le
+    digest: str              # Short digest as shown on Docker Hub
+    size_bytes: int          # Compressed size
+    pushed: str              # Docker Hub's relative "Last pushed ..." text
+
+    @property
+    def version_tuple(self):
+        return version_tuple(self.cuda_version)
+
+    @property
+    def image(self):
+        return f"{IMAGE_REPO}:{self.tag}"
+
+    def sort_key(self):
+        return (self.flavor, self.cudnn, self.os, self.arch, self.version_tuple, self.tag)
+
+
+INDEX_FIELDS = list(CudaImageTag._fields)
+# FINISH ### RECORD TYPES ###
+
+# START ### PARSING HELPERS ###
+TAG_PATTERN = re.compile(
+    r'^(?P<version>\d+\.\d+(?:\.\d+)?)'
+    r'(?:-(?P<cudnn>cudnn\d*))?'
+    r'-(?P<flavor>base|runtime|devel)'
+    r'(?:-(?P<os>[a-z]+[0-9.]*))?$'
+)
+DIGEST_PATTERN = re.compile(r'^[0-9a-f]{12}$')
+SIZE_PATTERN = re.compile(r'^(?P<value>\d+(?:\.\d+)?) (?P<unit>[KMG]?B)$')
+SIZE_UNITS = {"B": 1, "KB": 1024, "MB": 1024**2, "GB": 1024**3}
+
+
+def version_tuple(version):
+    """'12.2.2' -> (12, 2, 2). Missing parts count as 0 so 12.2 sorts with 12.2.0."""
+    parts = [int(p) for p in str(version).split(".") if p.isdigit()]
+    while len(parts) < 3:
+        parts.append(0)
+    return tuple(parts[:3])
+
+
+def parse_tag_name(tag):
+    """Split a tag into (cuda_version, cudnn, flavor, os). Returns None for tags we don't model."""
+    match = TAG_PATTERN.match(tag)
+    if not match:
+        return None
+    return match.group("version"), match.group("cudnn") or "", match.group("flavor"), match.group("os") or ""
+
+
+def parse_size(text):
+    """'4.58 GB' -> bytes. None if it isn't a size."""
+    match = SIZE_PATTERN.match(text.strip())
+    if not match:
+        return None
+    return int(float(match.group("value")) * SIZE_UNITS[match.group("unit")])
+
+
+def format_size(size_bytes):
+    return f"{size_bytes / 1024**3:.2f} GB" if size_bytes >= 1024**3 else f"{size_bytes / 1024**2:.0f} MB"
+# FINISH ### PARSING HELPERS ###
+
+# START ### STREAMING READERS ###
+def iter_json_array_strings(path, chunk_size=1 << 16):
+    """
+    Yield the elements of a top-level JSON array one at a time without loading
+    the whole file. The raw database is a flat array of strings, so we only
+    ever hold one chunk plus one partial element in memory.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buf = ""
+        pos = 0
+        started = False
+        eof = False
+        while True:
+            # Skip whitespace/commas and the opening bracket
+            while True:
+                while pos < len(buf) and buf[pos] in " \t\r\n,":
+                    pos += 1
+                if pos < len(buf) or eof:
+                    break
+                chunk = f.read(chunk_size)
+                buf, pos = buf[pos:] + chunk, 0
+                eof = not chunk
+            if pos >= len(buf):
+                return
+            if not started:
+                if buf[pos] != "[":
+                    raise ValueError(f"{path} is not a JSON array")
+                started = True
+                pos += 1
+                continue
+            if buf[pos] == "]":
+                return
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                chunk = f.read(chunk_size) # Element straddles the chunk boundary, pull more
+                buf, pos = buf[pos:] + chunk, 0
+                eof = not chunk
+                continue
+            # A number cut off mid-chunk would decode "fine" but short - make sure it ended
+            if end == len(buf) and not eof:
+                chunk = f.read(chunk_size)
+                buf, pos = buf[pos:] + chunk, 0
+                eof = not chunk
+                continue
+            yield value
+            pos = end
+            if pos > chunk_size: # Drop what we've consumed so the buffer stays small
+                buf, pos = buf[pos:], 0
+
+
+def iter_dump_lines(path):
+    """
+    Yield raw scrape lines from either the jq-built JSON array or a plain text
+    dump (one page line per line, like nvidia_tags.txt).
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        head = f.read(64).lstrip()
+    if head.startswith("["):
+        yield from iter_json_array_strings(path)
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if line:
+                yield line
+# FINISH ### STREAMING READERS ###
+
+# START ### TAG RECORD PARSER ###
+def parse_tag_records(lines):
+    """
+    Turn scraped Docker Hub page lines into CudaImageTag records.
+
+    Each tag block on the page looks like:
+        TAG / <tag> / Last pushed ... / docker pull ... / Digest<TAB>OS/ARCH<TAB>Compressed size
+        then per arch: <digest> / <TAB> / linux/<arch> / <TAB> / <size>
+    Everything else (nav, footer, cookie banner) gets skipped.
+    """
+    tag = None
+    parsed = None
+    pushed = ""
+    digest = None
+    arch = None
+    expect_tag = False
+    for raw in lines:
+        line = raw.strip()
+        if raw == "TAG":
+            expect_tag = True
+            tag = parsed = digest = arch = None
+            pushed = ""
+            continue
+        if expect_tag:
+            expect_tag = False
+            tag = line
+            parsed = parse_tag_name(tag)
+            continue
+        if parsed is None:
+            continue
+        if line.startswith("Last pushed"):
+            pushed = re.sub(r"^Last pushed\s+", "", line)
+            pushed = re.sub(r"\s+by\s+\S+$", "", pushed)
+        elif DIGEST_PATTERN.match(line):
+            digest, arch = line, None
+        elif line.startswith("linux/") and digest:
+            arch = line.split("/", 1)[1]
+        elif digest and arch:
+            size = parse_size(line)
+            if size is not None:
+                cuda_version, cudnn, flavor, os_name = parsed
+                yield CudaImageTag(tag, cuda_version, flavor, cudnn, os_name, arch, digest, size, pushed)
+                digest = arch = None
+# FINISH ### TAG RECORD PARSER ###
+
+# START ### TAG INDEX ###
+class TagIndex:
+    """
+    Records sorted by (flavor, cudnn, os, arch, cuda version). Lookups bisect a
+    parallel key list, so "newest X for CUDA 12.x" is O(log n) instead of a
+    scan over every scraped line.
+
+    history maps "tag|arch" to [[digest, pushed_estimate, seen_at], ...], one entry
+    per digest we've ever seen for that image, oldest first.
+    """
+    def __init__(self, records, history=None, last_ingest=None):
+        self.set_records(records)
+        self.history = history or {}
+        self.last_ingest = last_ingest or {}
+
+    def set_records(self, records):
+        """Replace the rows and rebuild the sorted key list."""
+        self.records = sorted(records, key=CudaImageTag.sort_key)
+        self._keys = [r.sort_key()[:5] for r in self.records]
+
+    def __len__(self):
+        return len(self.records)
+
+    @classmethod
+    def load(cls, path=INDEX_PATH):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("format") not in (1, INDEX_FORMAT_VERSION):
+            raise ValueError(f"Unsupported tag index format in {path}: {data.get('format')}")
+        fields = data["fields"]
+        records = (CudaImageTag(**dict(zip(fields, row))) for row in data["rows"])
+        return cls(records, data.get("history"), data.get("last_ingest"))
+
+    def save(self, path=INDEX_PATH):
+        """Write the index atomically: temp file in the same dir, fsync, rename over."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        payload = {
+            "format": INDEX_FORMAT_VERSION,
+            "image": IMAGE_REPO,
+            "fields": INDEX_FIELDS,
+            "rows": [list(r) for r in self.records], # Row arrays, not dicts - way smaller on disk
+            "history": self.history,
+            "last_ingest": self.last_ingest,
+        }
+        fd, tmp_path = tempfile.mkstemp(prefix=f".{path.name}.", dir=path.parent)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(payload, f, separators=(",", ":"))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path) # Readers see the old index or the new one, never half of one
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return path
+
+    def by_key(self):
+        """{(tag, arch): record} for the upsert path."""
+        return {(r.tag, r.arch): r for r in self.records}
+
+    def range(self, flavor, os_name, arch, cuda_prefix=None, cudnn=""):
+        """
+        All records for one (flavor, cudnn, os, arch) whose CUDA version starts with
+        cuda_prefix ("12", "12.2", "12.2.2" or None for any), oldest first.
+        Wildcard parts count as the end of the prefix: "12.x" and "12.*" mean "12".
+        """
+        base = (flavor, cudnn, os_name, arch)
+        prefix = ()
+        for part in str(cuda_prefix or "").split("."):
+            if not part.isdigit():
+                break
+            prefix += (int(part),)
+        if prefix:
+            lo_version = prefix + (0,) * (3 - len(prefix))
+            hi_version = prefix + (float("inf"),) * (3 - len(prefix))
+            if len(prefix) >= 3:
+                hi_version = prefix
+        else:
+            lo_version, hi_version = (), (float("inf"),)
+        lo = bisect.bisect_left(self._keys, base + (lo_version,))
+        hi = bisect.bisect_right(self._keys, base + (hi_version,))
+        return self.records[lo:hi]
+
+    def newest(self, flavor, os_name, arch="amd64", cuda_prefix=None, cudnn=""):
+        """Newest matching image, or None."""
+        matches = self.range(flavor, os_name, arch, cuda_prefix, cudnn)
+        return matches[-1] if matches else None
+
+
+def build_index(source=RAW_DATABASE, output=INDEX_PATH):
+    """
+    Full rebuild: stream the raw scrape, parse it and write a fresh index.
+    Throws away push history - use ingest() for routine updates.
+    """
+    index = TagIndex(())
+    ingest_dumps(index, [source])
+    index.save(output)
+    return index
+
+
+def load_index(path=INDEX_PATH, source=RAW_DATABASE):
+    """Load the index, seeding it from the raw scrape the first time."""
+    path = Path(path)
+    if not path.exists():
+        return build_index(source, path)
+    return TagIndex.load(path)
+# FINISH ### TAG INDEX ###
+
+# START ### INCREMENTAL INGEST ###
+RELATIVE_AGE_PATTERN = re.compile(r'(?:about|over|almost)?\s*(?P<count>an?|\d+)\s+(?P<unit>minute|hour|day|week|month|year)s?')
+RELATIVE_AGE_DAYS = {"minute": 1 / 1440, "hour": 1 / 24, "day": 1, "week": 7, "month": 30, "year": 365}
+
+
+def estimate_pushed_date(pushed, scraped_at):
+    """
+    Docker Hub only says "about 1 month" / "over 1 year", so turn that into a
+    rough ISO date relative to when the dump was scraped. None if unparseable.
+    """
+    match = RELATIVE_AGE_PATTERN.search(pushed or "")
+    if not match:
+        return None
+    count = 1 if match.group("count") in ("a", "an") else int(match.group("count"))
+    age = timedelta(days=count * RELATIVE_AGE_DAYS[match.group("unit")])
+    return (scraped_at - age).date().isoformat()
+
+
+class IngestReport(NamedTuple):
+    added: list      # (tag, arch) keys new to the index
+    repushed: list   # keys whose digest changed
+    updated: list    # keys with other field changes (size, pushed text)
+    removed: list    # keys pruned because a full dump no longer lists them
+    unchanged: int
+
+    def summary(self):
+        return {
+            "added": len(self.added), "repushed": len(self.repushed),
+            "updated": len(self.updated), "removed": len(self.removed),
+            "unchanged": self.unchanged,
+        }
+
+
+def history_key(tag, arch):
+    return f"{tag}|{arch}"
+
+
+def ingest_dumps(index, dump_paths, prune=False, scraped_at=None):
+    """
+    Upsert records from one or more scrape dumps into index, in place.
+
+    Only (tag, arch) keys whose record actually changed get touched. A digest
+    change counts as a re-push and lands in history with an estimated push
+    date. With prune=True the dumps are treated as a complete listing and keys
+    they don't mention get dropped (and reported as removed).
+    """
+    scraped_at = scraped_at or datetime.now(timezone.utc)
+    seen_at = scraped_at.replace(microsecond=0).isoformat()
+    current = index.by_key()
+    incoming = {}
+    for path in dump_paths:
+        for record in parse_tag_records(iter_dump_lines(path)):
+            incoming[(record.tag, record.arch)] = record
+
+    added, repushed, updated = [], [], []
+    unchanged = 0
+    for key, record in incoming.items():
+        old = current.get(key)
+        if old == record:
+            unchanged += 1
+            continue
+        if old is None:
+            added.append(key)
+        elif old.digest != record.digest:
+            repushed.append(key)
+        else:
+            updated.append(key)
+        current[key] = record
+        entries = index.history.setdefault(history_key(*key), [])
+        if not entries or entries[-1][0] != record.digest:
+            entries.append([record.digest, estimate_pushed_date(record.pushed, scraped_at), seen_at])
+
+    removed = []
+    if prune:
+        removed = sorted(key for key in current if key not in incoming)
+        for key in removed:
+            del current[key]
+
+    report = IngestReport(sorted(added), sorted(repushed), sorted(updated), removed, unchanged)
+    if added or repushed or updated or removed:
+        index.set_records(current.values()) # Re-sort only when something moved
+    index.last_ingest = {"at": seen_at, "sources": [str(p) for p in dump_paths], **report.summary()}
+    return report
+
+
+def ingest(dump_paths, index_path=INDEX_PATH, prune=False):
+    """Load (or seed) the index, upsert the dumps, write it back atomically. Returns the IngestReport."""
+    index_path = Path(index_path)
+    index = TagIndex.load(index_path) if index_path.exists() else TagIndex(())
+    report = ingest_dumps(index, dump_paths, prune=prune)
+    index.save(index_path)
+    return report
+# FINISH ### INCREMENTAL INGEST ###
+
+# START ### DOCKER BUILD ARGS ###
+def docker_build_args(record):
+    """Build args for the Dockerfile: base image plus the matching apt package suffix (12-2)."""
+    major, minor, _ = record.version_tuple
+    return {
+        "CUDA_BASE_IMAGE": record.image,
+        "CUDA_PKG_VERSION": f"{major}-{minor}",
+    }
+# FINISH ### DOCKER BUILD ARGS ###
+
+# START ### CLI ###
+def print_records(records, title):
+    table = Table(title=title, border_style="cyan")
+    for column in ("Tag", "CUDA", "Flavor", "OS", "Arch", "Size", "Pushed"):
+        table.add_column(column)
+    for r in records:
+        flavor = f"{r.cudnn}-{r.flavor}" if r.cudnn else r.flavor
+        table.add_row(r.tag, r.cuda_version, flavor, r.os or "-", r.arch, format_size(r.size_bytes), r.pushed)
+    console.print(table)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Structured index over the nvidia/cuda tag scrape")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="Parse the raw scrape into the indexed form")
+    build.add_argument("--source", default=str(RAW_DATABASE))
+    build.add_argument("--output", default=str(INDEX_PATH))
+
+    ingest_cmd = sub.add_parser("ingest", help="Upsert new scrape dumps into the index")
+    ingest_cmd.add_argument("dumps", nargs="+", help="Raw scrape dumps (text lines or JSON array)")
+    ingest_cmd.add_argument("--prune", action="store_true", help="Dumps are a full listing: drop tags they don't mention")
+    ingest_cmd.add_argument("--index", default=str(INDEX_PATH))
+    ingest_cmd.add_argument("--verbose", action="store_true", help="List every changed tag")
+
+    query = sub.add_parser("query", help="Find the newest image matching the filters")
+    query.add_argument("--flavor", default="devel", choices=["base", "runtime", "devel"])
+    query.add_argument("--os", dest="os_name", default="ubuntu22.04")
+    query.add_argument("--arch", default="amd64")
+    query.add_argument("--cuda", default=None, help="Version prefix, e.g. 12 or 12.2")
+    query.add_argument("--cudnn", default="", help="cuDNN variant, e.g. cudnn8 (default: none)")
+    query.add_argument("--all", action="store_true", help="List every match instead of just the newest")
+    query.add_argument("--image", action="store_true", help="Print just the image reference")
+    query.add_argument("--docker-args", action="store_true", help="Print --build-arg flags for docker build")
+    query.add_argument("--index", default=str(INDEX_PATH))
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        index = build_index(args.source, args.output)
+        console.print(f"[green]✓ Indexed {len(index)} images into {args.output}[/green]")
+        return 0
+
+    if args.command == "ingest":
+        report = ingest(args.dumps, args.index, prune=args.prune)
+        summary = report.summary()
+        console.print(f"[green]✓ Ingested into {args.index}:[/green] "
+                      f"[cyan]{summary['added']}[/cyan] added, [yellow]{summary['repushed']}[/yellow] re-pushed, "
+                      f"{summary['updated']} updated, [red]{summary['removed']}[/red] removed, "
+                      f"[dim]{summary['unchanged']} unchanged[/dim]")
+        if args.verbose:
+            for label, keys in (("+", report.added), ("~", report.repushed), ("*", report.updated), ("-", report.removed)):
+                for tag, arch in keys:
+                    console.print(f"  {label} {tag} ({arch})")
+        return 0
+
+    index = load_index(args.index)
+    if args.all:
+        matches = index.range(args.flavor, args.os_name, args.arch, args.cuda, args.cudnn)
+        if not matches:
+            console.print("[yellow]No images match those filters.[/yellow]")
+            return 1
+        print_records(matches, f"{len(matches)} matching images")
+        return 0
+
+    record = index.newest(args.flavor, args.os_name, args.arch, args.cuda, args.cudnn)
+    if record is None:
+        Console(stderr=True).print("[yellow]No images match those filters.[/yellow]")
+        return 1
+    if args.image:
+        print(record.image)
+    elif args.docker_args:
+        print(" ".join(f"--build-arg {k}={v}" for k, v in docker_build_args(record).items()))
+    else:
+        print_records([record], "Newest match")
+    return 0
+# FINISH ### CLI ###
+
+# START ### SCRIPT RUNNER ###
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        sys.exit(130)
+    except Exception as e:
+        console.print(f"[red]Critical error: {str(e)}[/red]")
+        sys.exit(1)
+# FINISH ### SCRIPT RUNNER ###
@@ -1,6 +1,15 @@
 #!/bin/bash
 set -e # Exit immediately if a command exits with a non-zero status.
 
+# Dedicated cores for llama_server, the rest for bolt/ngrok/proxy (config/cpu_plan.json).
+# huggingface.py sizes n_threads from it and the orchestrator wraps each command
+# in its taskset/numactl. CPU_AFFINITY=no runs everything unpinned.
+rm -f /app/config/cpu_plan.json
+if [ "${CPU_AFFINITY:-yes}" != "no" ]; then
+    echo "[Entrypoint] Planning CPU affinity..."
+    python3 /app/cpu_topology.py plan || echo "[Entrypoint] Warning: CPU planning failed, services will run unpinned."
+fi
+
 echo "[Entrypoint] Running pre-flight checks and setup via huggingface.py..."
 # Run the setup script - it will download model if needed & create run_server.sh
 python3 /app/huggingface.py
@@ -14,8 +23,19 @@ fi
 # Ensure run_server.sh is executable (huggingface.py should do this, but double-check)
 chmod +x /app/scripts/run_server.sh
 
-echo "[Entrypoint] Setup complete. Handing over to Supervisor..."
-# Execute supervisord using the configuration file
-# The '-n' flag runs it in the foreground, which is required for Docker CMD/ENTRYPOINT
-exec /usr/bin/supervisord -n -c /etc/supervisor/supervisord.conf
+# Pull the GGUF into page cache with big parallel reads before llama_server
+# mmaps it, so the load isn't a crawl of 4 KB page faults. Skips itself when
+# the model is already cached; never blocks startup if it fails.
+echo "[Entrypoint] Warming model into page cache..."
+# Under the server's own CPU/NUMA policy so the cached pages land on its node.
+$(python3 /app/cpu_topology.py prefix llama_server 2>/dev/null) python3 /app/model_warmup.py || echo "[Entrypoint] Warning: model warmup failed, continuing with a cold cache."
+
+echo "[Entrypoint] Setup complete. Handing over to the orchestrator..."
+# The orchestrator starts llama_server first and only brings up bolt_app/ngrok
+# once /v1/models answers. Service graph and probes live in config/services.json.
+mkdir -p /app/logs
+# A fresh boot always serves from the blue slot (run_server.sh, :8080); forget
+# any proxy route a hot swap left behind.
+rm -f /app/config/route.json
+exec python3 /app/scripts/orchestrator.py --config /app/config/services.json
 
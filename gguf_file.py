@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+
+# START ### IMPORTS ###
+import re
+import sys
+import struct
+from pathlib import Path
+from typing import NamedTuple
+# FINISH ### IMPORTS ###
+
+# START ### FORMAT CONSTANTS ###
+GGUF_MAGIC = b"GGUF"
+DEFAULT_ALIGNMENT = 32
+# gguf-split naming: model-00001-of-00005.gguf
+SHARD_PATTERN = re.compile(r"^(?P<base>.+)-(?P<index>\d{5})-of-(?P<total>\d{5})\.gguf$")
+
+# GGUF metadata value types
+(T_UINT8, T_INT8, T_UINT16, T_INT16, T_UINT32, T_INT32, T_FLOAT32, T_BOOL,
+ T_STRING, T_ARRAY, T_UINT64, T_INT64, T_FLOAT64) = range(13)
+
+SCALAR_FORMATS = {
+    T_UINT8: "<B", T_INT8: "<b", T_UINT16: "<H", T_INT16: "<h",
+    T_UINT32: "<I", T_INT32: "<i", T_FLOAT32: "<f", T_BOOL: "<?",
+    T_UINT64: "<Q", T_INT64: "<q", T_FLOAT64: "<d",
+}
+# FINISH ### FORMAT CONSTANTS ###
+
+# START ### DATA TYPES ###
+class TensorInfo(NamedTuple):
+    name: str
+    shape: tuple
+    ggml_type: int
+    offset: int  # Absolute offset in the file
+    size: int    # Bytes, from the gap to the next tensor (includes alignment padding)
+
+
+class GGUFFile(NamedTuple):
+    path: Path
+    version: int
+    metadata: dict
+    tensors: list     # TensorInfo, sorted by offset
+    data_offset: int  # Where tensor data starts
+    file_size: int
+
+    @property
+    def tensor_bytes(self):
+        return self.file_size - self.data_offset
+
+    def data_ranges(self, chunk_size=None):
+        """
+        (offset, length) ranges covering the tensor data in file order,
+        adjacent tensors merged. With chunk_size, split into pieces no bigger.
+        """
+        ranges = []
+        for tensor in self.tensors:
+            if ranges and ranges[-1][0] + ranges[-1][1] == tensor.offset:
+                ranges[-1][1] += tensor.size
+            else:
+                ranges.append([tensor.offset, tensor.size])
+        if not chunk_size:
+            return [tuple(r) for r in ranges]
+        pieces = []
+        for start, length in ranges:
+            for offset in range(start, start + length, chunk_size):
+                pieces.append((offset, min(chunk_size, start + length - offset)))
+        return pieces
+# FINISH ### DATA TYPES ###
+
+# START ### READER ###
+class _Reader:
+    """Little-endian reads off a buffered file with a running position."""
+
+    def __init__(self, handle, version):
+        self.handle = handle
+        self.version = version
+
+    def unpack(self, fmt):
+        size = struct.calcsize(fmt)
+        data = self.handle.read(size)
+        if len(data) != size:
+            raise ValueError("Truncated GGUF header")
+        return struct.unpack(fmt, data)[0]
+
+    def count(self):
+        # v1 used 32-bit counts and lengths, v2+ 64-bit
+        return self.unpack("<I" if self.version == 1 else "<Q")
+
+    def string(self):
+        length = self.count()
+        data = self.handle.read(length)
+        if len(data) != length:
+            raise ValueError("Truncated GGUF string")
+        return data.decode("utf-8", errors="replace")
+
+    def value(self, value_type):
+        if value_type in SCALAR_FORMATS:
+            return self.unpack(SCALAR_FORMATS[value_type])
+        if value_type == T_STRING:
+            return self.string()
+        if value_type == T_ARRAY:
+            item_type = self.unpack("<I")
+            length = self.count()
+            if item_type in SCALAR_FORMATS:
+                # Bulk-unpack numeric arrays (token scores/types are 32k+ long)
+                fmt = SCALAR_FORMATS[item_type]
+                item_size = struct.calcsize(fmt)
+                data = self.handle.read(item_size * length)
+                if len(data) != item_size * length:
+                    raise ValueError("Truncated GGUF array")
+                return list(struct.unpack(f"<{length}{fmt[1]}", data))
+            return [self.value(item_type) for _ in range(length)]
+        raise ValueError(f"Unknown GGUF value type {value_type}")
+
+
+def read_gguf(path):
+    """Parse header, metadata and tensor table. Tensor data isn't touched."""
+    path = Path(path)
+    file_size = path.stat().st_size
+    with open(path, "rb", buffering=1 << 20) as handle:
+        if handle.read(4) != GGUF_MAGIC:
+            raise ValueError(f"{path} is not a GGUF file")
+        version = struct.unpack("<I", handle.read(4))[0]
+        reader = _Reader(handle, version)
+        tensor_count = reader.count()
+        kv_count = reader.count()
+
+        metadata = {}
+        for _ in range(kv_count):
+            key = reader.string()
+            metadata[key] = reader.value(reader.unpack("<I"))
+
+        raw_tensors = []
+        for _ in range(tensor_count):
+            name = reader.string()
+            n_dims = reader.unpack("<I")
+            shape = tuple(reader.count() for _ in range(n_dims))
+            ggml_type = reader.unpack("<I")
+            offset = reader.unpack("<Q")
+            raw_tensors.append((name, shape, ggml_type, offset))
+
+        alignment = int(metadata.get("general.alignment", DEFAULT_ALIGNMENT))
+        position = handle.tell()
+        data_offset = position + (-position % alignment)
+
+    raw_tensors.sort(key=lambda t: t[3])
+    tensors = []
+    for index, (name, shape, ggml_type, offset) in enumerate(raw_tensors):
+        end = raw_tensors[index + 1][3] if index + 1 < len(raw_tensors) else file_size - data_offset
+        tensors.append(TensorInfo(name, shape, ggml_type, data_offset + offset, end - offset))
+    return GGUFFile(path, version, metadata, tensors, data_offset, file_size)
+
+
+def split_files(path):
+    """Every shard of the split model path belongs to, in order ([path] if it isn't split)"""
+    path = Path(path)
+    match = SHARD_PATTERN.match(path.name)
+    if not match:
+        return [path]
+    total = int(match["total"])
+    return [path.with_name(f"{match['base']}-{index:05d}-of-{total:05d}.gguf") for index in range(1, total + 1)]
+# FINISH ### READER ###
+
+# START ### CLI ###
+def main(argv=None):
+    argv = argv if argv is not None else sys.argv[1:]
+    if not argv:
+        print("Usage: python3 gguf_file.py <model.gguf> [--tensors]")
+        return 2
+    gguf = read_gguf(argv[0])
+    print(f"{gguf.path}: GGUF v{gguf.version}, {len(gguf.tensors)} tensors, "
+          f"{gguf.tensor_bytes / 1024**3:.2f} GiB tensor data at offset {gguf.data_offset}")
+    for key, value in gguf.metadata.items():
+        if isinstance(value, list):
+            value = f"[{len(value)} items]"
+        print(f"  {key} = {value}")
+    if "--tensors" in argv:
+        for tensor in gguf.tensors:
+            print(f"  {tensor.name:48} {str(tensor.shape):24} type={tensor.ggml_type:<3} {tensor.size:>12} @ {tensor.offset}")
+    return 0
+# FINISH ### CLI ###
+
+# START ### SCRIPT RUNNER ###
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+# FINISH ### SCRIPT RUNNER ###
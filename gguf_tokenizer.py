@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+
+# START ### IMPORTS ###
+import re
+import sys
+import time
+import heapq
+import argparse
+import threading
+from pathlib import Path
+from functools import lru_cache
+import gguf_file
+# FINISH ### IMPORTS ###
+
+# START ### CONFIGURATION ###
+SPACE = "▁"            # SentencePiece's visible space
+WORD_CACHE_SIZE = 1 << 16   # Encoded pieces kept per tokenizer; prompts repeat words a lot
+# Token types in tokenizer.ggml.token_type
+TOKEN_NORMAL, TOKEN_UNKNOWN, TOKEN_CONTROL, TOKEN_USER_DEFINED, TOKEN_UNUSED, TOKEN_BYTE = 1, 2, 3, 4, 5, 6
+# GPT-2 pre-tokenizer, with [^\s\d\W] standing in for \p{L} since re has no Unicode classes
+BPE_SPLIT = re.compile(r"""'s|'t|'re|'ve|'m|'ll|'d| ?[^\s\d\W]+| ?\d+| ?[^\s\w]+|\s+(?!\S)|\s+""")
+# What llama_cpp.server falls back to when the GGUF has no chat template
+LLAMA2_SYSTEM = "<<SYS>>\n{}\n<</SYS>>\n\n"
+# FINISH ### CONFIGURATION ###
+
+# START ### BYTE-LEVEL HELPERS ###
+@lru_cache(maxsize=1)
+def bytes_to_unicode():
+    """GPT-2's byte -> printable character table (the alphabet byte-level BPE vocabs are written in)"""
+    printable = list(range(ord("!"), ord("~") + 1)) + list(range(ord("¡"), ord("¬") + 1)) + list(range(ord("®"), ord("ÿ") + 1))
+    chars = printable[:]
+    extra = 0
+    for byte in range(256):
+        if byte not in printable:
+            printable.append(byte)
+            chars.append(256 + extra)
+            extra += 1
+    return dict(zip(printable, map(chr, chars)))
+# FINISH ### BYTE-LEVEL HELPERS ###
+
+# START ### TOKENIZER ###
+class Tokenizer:
+    """
+    The model's own vocab, straight from GGUF metadata, no llama.cpp needed.
+    SentencePiece ("llama": Mistral/Mixtral/Llama 2) follows llama.cpp's
+    merge-by-score exactly. Byte-level BPE ("gpt2": Llama 3, Qwen, ...) uses
+    the GPT-2 pre-tokenizer, so counts can be off by a few tokens from
+    models with their own split regex. Good for counting, not for decoding.
+    """
+
+    def __init__(self, metadata):
+        self.model = metadata.get("tokenizer.ggml.model", "llama")
+        if self.model not in ("llama", "gpt2"):
+            raise ValueError(f"Unsupported tokenizer model '{self.model}'")
+        tokens = metadata.get("tokenizer.ggml.tokens")
+        if not tokens:
+            raise ValueError("GGUF has no tokenizer.ggml.tokens")
+        self.tokens = tokens
+        self.scores = metadata.get("tokenizer.ggml.scores") or [0.0] * len(tokens)
+        types = metadata.get("tokenizer.ggml.token_type") or [TOKEN_NORMAL] * len(tokens)
+        self.ids = {text: index for index, text in enumerate(tokens)}
+        self.bos_id = metadata.get("tokenizer.ggml.bos_token_id")
+        self.eos_id = metadata.get("tokenizer.ggml.eos_token_id")
+        self.unk_id = metadata.get("tokenizer.ggml.unknown_token_id")
+        self.add_bos = metadata.get("tokenizer.ggml.add_bos_token", self.model == "llama")
+        self.add_space_prefix = metadata.get("tokenizer.ggml.add_space_prefix", self.model == "llama")
+        self.chat_template = metadata.get("tokenizer.chat_template")
+        self.merges = {}
+        if self.model == "gpt2":
+            for rank, merge in enumerate(metadata.get("tokenizer.ggml.merges") or []):
+                left, _, right = merge.partition(" ")
+                self.merges[(left, right)] = rank
+            self.byte_encoder = bytes_to_unicode()
+
+        # Control/user-defined tokens are matched verbatim in the text (chat templates emit <s>, [INST], ...)
+        special = sorted((tokens[i] for i, t in enumerate(types) if t in (TOKEN_CONTROL, TOKEN_USER_DEFINED) and tokens[i]),
+                         key=len, reverse=True)
+        self.special = re.compile("(" + "|".join(map(re.escape, special)) + ")") if special else None
+        self._encode_piece = lru_cache(maxsize=WORD_CACHE_SIZE)(self._spm_piece if self.model == "llama" else self._bpe_piece)
+
+    @property
+    def bos_token(self):
+        return self.tokens[self.bos_id] if self.bos_id is not None else ""
+
+    @property
+    def eos_token(self):
+        return self.tokens[self.eos_id] if self.eos_id is not None else ""
+
+    def _spm_piece(self, piece):
+        """llama.cpp's SPM: merge the adjacent pair whose result scores best until nothing merges"""
+        symbols = list(piece)
+        if len(symbols) > 1:
+            prev = list(range(-1, len(symbols) - 1))
+            nxt = list(range(1, len(symbols) + 1))
+            nxt[-1] = -1
+            queue = []
+
+            def push(left, right):
+                if left == -1 or right == -1:
+                    return
+                index = self.ids.get(symbols[left] + symbols[right])
+                if index is not None:
+                    heapq.heappush(queue, (-self.scores[index], left, right, len(symbols[left]) + len(symbols[right])))
+
+            for left in range(len(symbols) - 1):
+                push(left, left + 1)
+            while queue:
+                _, left, right, size = heapq.heappop(queue)
+                if not symbols[left] or not symbols[right] or len(symbols[left]) + len(symbols[right]) != size:
+                    continue # Stale: one side already merged into something else
+                symbols[left] += symbols[right]
+                symbols[right] = ""
+                nxt[left] = nxt[right]
+                if nxt[right] != -1:
+                    prev[nxt[right]] = left
+                push(prev[left], left)
+                push(left, nxt[left])
+
+        ids = []
+        for symbol in symbols:
+            if not symbol:
+                continue
+            index = self.ids.get(symbol)
+            if index is not None:
+                ids.append(index)
+                continue
+            for byte in symbol.encode("utf-8"): # Byte fallback: <0xE2><0x96>...
+                fallback = self.ids.get(f"<0x{byte:02X}>", self.unk_id)
+                if fallback is not None:
+                    ids.append(fallback)
+        return tuple(ids)
+
+    def _bpe_piece(self, piece):
+        word = [self.byte_encoder[b] for b in piece.encode("utf-8")]
+        while len(word) > 1:
+            ranked = [(self.merges.get(pair, float("inf")), i) for i, pair in enumerate(zip(word, word[1:]))]
+            rank, i = min(ranked)
+            if rank == float("inf"):
+                break
+            word[i:i + 2] = [word[i] + word[i + 1]]
+        ids = []
+        for symbol in word:
+            index = self.ids.get(symbol)
+            if index is not None:
+                ids.append(index)
+            else:
+                ids.extend(self.ids[c] for c in symbol if c in self.ids)
+        return tuple(ids)
+
+    def _pieces(self, text, space_prefix):
+        if self.model == "gpt2":
+            return BPE_SPLIT.findall(text)
+        text = text.replace(" ", SPACE)
+        if space_prefix and self.add_space_prefix:
+            text = SPACE + text
+        # Vocab pieces only carry ▁ at the front, so a ▁ after anything else starts a new word.
+        # Merging word by word is exact and lets the cache do most of the work.
+        return re.findall(f"{SPACE}+[^{SPACE}]*|[^{SPACE}]+", text)
+
+    def encode(self, text, add_bos=None, special=True):
+        """Token ids for text. special: match control tokens like <s> in the text instead of spelling them out."""
+        ids = [self.bos_id] if (self.add_bos if add_bos is None else add_bos) and self.bos_id is not None else []
+        segments = self.special.split(text) if special and self.special else [text]
+        # Like llama.cpp: the start of the text and anything right after a special token gets the SPM space prefix
+        after_special = True
+        for index, segment in enumerate(segments):
+            if not segment:
+                continue
+            if index % 2: # Odd split results are the special tokens themselves
+                ids.append(self.ids[segment])
+                after_special = True
+                continue
+            for piece in self._pieces(segment, after_special):
+                ids.extend(self._encode_piece(piece))
+            after_special = False
+        return ids
+
+    def count_tokens(self, text, add_bos=None, special=True):
+        return len(self.encode(text, add_bos, special))
+
+    def render_chat(self, messages):
+        """
+        The prompt llama_cpp.server builds from chat messages: the GGUF's own
+        template when it has one (and jinja2 is around, which llama-cpp-python
+        pulls in), else its llama-2 fallback.
+        """
+        if self.chat_template:
+            try:
+                from jinja2.sandbox import ImmutableSandboxedEnvironment
+                def raise_exception(message):
+                    raise ValueError(message)
+                template = ImmutableSandboxedEnvironment(trim_blocks=True, lstrip_blocks=True).from_string(self.chat_template)
+                return template.render(messages=messages, bos_token=self.bos_token, eos_token=self.eos_token,
+                                       add_generation_prompt=True, raise_exception=raise_exception)
+            except ImportError:
+                pass
+        system = "".join(message_text(m.get("content")) for m in messages if m.get("role") == "system")
+        prompt, first_user = "", True
+        for message in messages:
+            role, content = message.get("role"), message_text(message.get("content"))
+            if role == "user":
+                if first_user and system:
+                    content = LLAMA2_SYSTEM.format(system) + content
+                prompt += f"[INST] {content} [/INST]"
+                first_user = False
+            elif role == "assistant":
+                prompt += f" {content} "
+        return prompt
+
+    def count_chat_tokens(self, messages):
+        prompt = self.render_chat(messages)
+        # A template that writes <s> itself already has its BOS; don't count a second one
+        return self.count_tokens(prompt, add_bos=not (self.bos_token and prompt.startswith(self.bos_token)))
+
+
+def message_text(content):
+    """Message content as plain text: multi-part lists flattened to their text parts, None as empty"""
+    if isinstance(content, list):
+        return "".join(p.get("text", "") for p in content if isinstance(p, dict))
+    return content if isinstance(content, str) else ""
+
+
+def _read_metadata(path):
+    return gguf_file.read_gguf(path).metadata
+
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def load_tokenizer(path):
+    """Tokenizer for a GGUF, built once per file version (size + mtime) and shared"""
+    path = Path(path)
+    stat = path.stat()
+    key = (str(path.resolve()), stat.st_size, stat.st_mtime_ns)
+    with _cache_lock:
+        tokenizer = _cache.get(key)
+    if tokenizer is None:
+        tokenizer = Tokenizer(_read_metadata(path))
+        with _cache_lock:
+            _cache.clear() # One model at a time is what the server serves
+            _cache[key] = tokenizer
+    return tokenizer
+
+
+def count_tokens(path, text, add_bos=None):
+    """Prompt tokens of text for the model at path"""
+    return load_tokenizer(path).count_tokens(text, add_bos)
+# FINISH ### TOKENIZER ###
+
+# START ### CLI ###
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Count tokens with a GGUF model's own vocab")
+    parser.add_argument("model")
+    sub = parser.add_subparsers(dest="command", required=True)
+    count = sub.add_parser("count", help="Tokens in a text (stdin if no --text)")
+    count.add_argument("--text")
+    count.add_argument("--ids", action="store_true", help="Print the token ids too")
+    bench = sub.add_parser("bench", help="Load time and counting throughput")
+    bench.add_argument("--file", help="Text to count (default: stdin)")
+    bench.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    started = time.monotonic()
+    tokenizer = load_tokenizer(args.model)
+    load_seconds = time.monotonic() - started
+    text = args.text if getattr(args, "text", None) is not None else (
+        Path(args.file).read_text() if getattr(args, "file", None) else sys.stdin.read())
+
+    if args.command == "count":
+        ids = tokenizer.encode(text)
+        print(len(ids))
+        if args.ids:
+            print(" ".join(map(str, ids)))
+        return 0
+
+    cold_started = time.monotonic()
+    tokens = tokenizer.count_tokens(text)
+    cold = time.monotonic() - cold_started
+    warm = []
+    for _ in range(args.runs):
+        started = time.monotonic()
+        tokenizer.count_tokens(text)
+        warm.append(time.monotonic() - started)
+    warm = sorted(warm)[len(warm) // 2]
+    print(f"Vocab: {len(tokenizer.tokens)} tokens ({tokenizer.model}), loaded in {load_seconds * 1000:.0f} ms")
+    print(f"Text: {len(text)} chars -> {tokens} tokens")
+    print(f"Cold: {cold * 1000:.1f} ms ({tokens / cold:,.0f} tokens/s)" if cold else "Cold: n/a")
+    print(f"Warm (median of {args.runs}): {warm * 1000:.1f} ms ({tokens / warm:,.0f} tokens/s)" if warm else "Warm: n/a")
+    return 0
+# FINISH ### CLI ###
+
+# START ### SCRIPT RUNNER ###
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+# FINISH ### SCRIPT RUNNER ###
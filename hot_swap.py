@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+
+# START ### IMPORTS ###
+import sys
+import json
+import time
+import socket
+import argparse
+import threading
+import urllib.request
+import urllib.error
+from pathlib import Path
+from rich.console import Console
+from rich.table import Table
+import huggingface
+import model_warmup
+# FINISH ### IMPORTS ###
+
+# START ### CONSOLE SETUP ###
+console = Console()
+# FINISH ### CONSOLE SETUP ###
+
+# START ### CONFIGURATION ###
+# Two model server slots; the proxy points at one, the other is the standby.
+SLOTS = {
+    "blue": {"service": "llama_server", "port": 8080, "script": Path("/app/scripts/run_server.sh")},
+    "green": {"service": "llama_server_green", "port": 8082, "script": Path("/app/scripts/run_server_green.sh")},
+}
+PROXY_URL = "http://127.0.0.1:8081"
+CONTROL_SOCKET = Path("/app/logs/orchestrator.sock")
+SERVER_CONFIG = Path("/app/config/server.json")
+READY_TIMEOUT = 900.0   # Same budget the orchestrator gives a cold llama_server
+DRAIN_TIMEOUT = 300.0   # Longest we let old streams run before stopping the old server anyway
+PROBE_INTERVAL = 0.02   # Availability sampling through the proxy around the switch
+# FINISH ### CONFIGURATION ###
+
+# START ### CONTROL CLIENTS ###
+def orchestrator(action, service=None, socket_path=CONTROL_SOCKET, timeout=120):
+    """One request over the orchestrator's control socket"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(str(socket_path))
+        sock.sendall(json.dumps({"action": action, "service": service}).encode() + b"\n")
+        reply = b""
+        while not reply.endswith(b"\n"):
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            reply += chunk
+    reply = json.loads(reply or b"{}")
+    if not reply.get("ok"):
+        raise RuntimeError(f"Orchestrator {action} {service or ''} failed: {reply.get('error')}")
+    return reply
+
+
+def http_json(method, url, payload=None, timeout=10):
+    data = json.dumps(payload).encode() if payload is not None else None
+    request = urllib.request.Request(url, data=data, method=method, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read() or b"{}")
+# FINISH ### CONTROL CLIENTS ###
+
+# START ### AVAILABILITY MONITOR ###
+class AvailabilityMonitor(threading.Thread):
+    """
+    Hammers a cheap endpoint through the proxy while the switch happens.
+    Unavailable time is measured from the first failed probe to the next
+    successful one, summed over every outage.
+    """
+
+    def __init__(self, url, interval=PROBE_INTERVAL):
+        super().__init__(daemon=True)
+        self.url = url
+        self.interval = interval
+        self.samples = [] # (started, finished, ok)
+        self.stop_event = threading.Event()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            started = time.monotonic()
+            try:
+                with urllib.request.urlopen(self.url, timeout=5) as response:
+                    response.read()
+                    ok = response.status < 500
+            except urllib.error.HTTPError as e:
+                ok = e.code < 500
+            except Exception:
+                ok = False
+            self.samples.append((started, time.monotonic(), ok))
+            self.stop_event.wait(self.interval)
+
+    def stop(self):
+        self.stop_event.set()
+        self.join(timeout=10)
+
+    def report(self):
+        unavailable, outage_start, failures = 0.0, None, 0
+        for started, finished, ok in self.samples:
+            if not ok:
+                failures += 1
+                outage_start = started if outage_start is None else outage_start
+            elif outage_start is not None:
+                unavailable += finished - outage_start
+                outage_start = None
+        if outage_start is not None: # Still down when we stopped looking
+            unavailable += self.samples[-1][1] - outage_start
+        latencies = [finished - started for started, finished, ok in self.samples if ok]
+        return {
+            "probes": len(self.samples),
+            "failed_probes": failures,
+            "unavailable_seconds": round(unavailable, 4),
+            "max_probe_latency": round(max(latencies), 4) if latencies else None,
+        }
+# FINISH ### AVAILABILITY MONITOR ###
+
+# START ### SWAP STEPS ###
+def build_config(model_path, overrides, port):
+    """Server config for the standby slot: current config, new model/overrides, the slot's port"""
+    config = {}
+    if SERVER_CONFIG.exists():
+        config = json.loads(SERVER_CONFIG.read_text())
+    if model_path:
+        # The live slot is still serving from its staged copy; evicting it to make
+        # room would leave that slot's script pointing at a deleted file
+        live = [config.get("source_model_path"), config.get("model_path")]
+        huggingface.stage_model(model_path, protect=[p for p in live if p])
+        fresh = huggingface.generate_server_config(model_path, huggingface.check_system_specs())
+        if not fresh:
+            raise RuntimeError(f"Couldn't build a server config for {model_path}")
+        config = {**config, **fresh}
+    if not config.get("model_path"):
+        raise RuntimeError(f"No model given and nothing in {SERVER_CONFIG} to reuse")
+    for key, value in overrides.items():
+        config[key] = value
+    config["port"] = port
+    return config
+
+
+def parse_override(text):
+    key, sep, value = text.partition("=")
+    if not sep:
+        raise argparse.ArgumentTypeError(f"Expected key=value, got {text}")
+    try:
+        return key, json.loads(value) # Numbers, lists, true/false
+    except ValueError:
+        return key, value
+
+
+def wait_healthy(service, socket_path, timeout):
+    """Block until the orchestrator reports the service healthy. Raises if it fails to come up."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        state = orchestrator("status", socket_path=socket_path)["services"][service]
+        if state["state"] == "healthy":
+            return state
+        if state["failures"] > 0:
+            raise RuntimeError(f"{service} failed to start (state {state['state']}); see /app/logs/{service}.err.log")
+        time.sleep(1.0)
+    raise RuntimeError(f"{service} not healthy after {timeout:.0f}s")
+
+
+def warm_probe(port, timeout=300):
+    """
+    One real 1-token completion against the new server, straight to its port.
+    /v1/models answers before the first decode is fast; this doesn't.
+    """
+    started = time.monotonic()
+    reply = http_json("POST", f"http://127.0.0.1:{port}/v1/completions",
+                      {"prompt": "Hello", "max_tokens": 1, "temperature": 0}, timeout=timeout)
+    if not reply.get("choices"):
+        raise RuntimeError(f"Warm probe on port {port} returned no choices: {reply}")
+    return time.monotonic() - started
+
+
+def wait_drained(proxy_url, port, timeout):
+    """Wait for requests still on the old backend to finish. Returns (seconds, requests left)."""
+    started = time.monotonic()
+    while True:
+        draining = [p for p in http_json("GET", f"{proxy_url}/proxy/backend")["draining"] if p["port"] == port]
+        left = sum(p["active"] for p in draining)
+        if not left or time.monotonic() - started >= timeout:
+            return time.monotonic() - started, left
+        time.sleep(0.5)
+# FINISH ### SWAP STEPS ###
+
+# START ### HOT SWAP ###
+def hot_swap(model_path=None, overrides=None, proxy_url=PROXY_URL, socket_path=CONTROL_SOCKET,
+             ready_timeout=READY_TIMEOUT, drain_timeout=DRAIN_TIMEOUT, warmup=True):
+    """Bring the new model up on the standby slot, move traffic, drain and stop the old one."""
+    report = {}
+    route = http_json("GET", f"{proxy_url}/proxy/backend")["backend"]
+    active = next((name for name, slot in SLOTS.items() if slot["port"] == route["port"]), None)
+    if not active:
+        raise RuntimeError(f"Proxy points at port {route['port']}, which isn't a known slot")
+    standby = "green" if active == "blue" else "blue"
+    old, new = SLOTS[active], SLOTS[standby]
+    console.print(f"[cyan][Swap] Live: {active} (:{old['port']}). Bringing up {standby} on :{new['port']}...[/cyan]")
+
+    # Leftovers from an aborted swap would hold the port
+    orchestrator("stop", new["service"], socket_path)
+    config = build_config(model_path, overrides or {}, new["port"])
+    if not huggingface.create_server_script(config, new["script"]):
+        raise RuntimeError(f"Couldn't write {new['script']}")
+    if warmup: # Page cache first so the load below is sequential reads, not faults
+        model_warmup.main([config["model_path"]])
+
+    started = time.monotonic()
+    orchestrator("start", new["service"], socket_path)
+    try:
+        wait_healthy(new["service"], socket_path, ready_timeout)
+        report["ready_seconds"] = round(time.monotonic() - started, 1)
+        report["warm_probe_seconds"] = round(warm_probe(new["port"]), 3)
+    except Exception:
+        console.print(f"[red][Swap] {standby} didn't come up; traffic stays on {active}.[/red]")
+        orchestrator("stop", new["service"], socket_path)
+        raise
+    console.print(f"[green][Swap] {standby} ready in {report['ready_seconds']}s, "
+                  f"first token in {report['warm_probe_seconds']}s.[/green]")
+
+    monitor = AvailabilityMonitor(f"{proxy_url}/v1/models")
+    monitor.start()
+    time.sleep(0.5) # Baseline before the switch
+    switch = http_json("PUT", f"{proxy_url}/proxy/backend", {"host": "127.0.0.1", "port": new["port"]})
+    time.sleep(1.0) # And after
+    monitor.stop()
+    report.update(monitor.report())
+    draining = sum(p["active"] for p in switch["draining"])
+    console.print(f"[green][Swap] Traffic on {standby}. {draining} request(s) draining on {active}.[/green]")
+
+    drain_seconds, left = wait_drained(proxy_url, old["port"], drain_timeout)
+    report["drain_seconds"] = round(drain_seconds, 1)
+    if left:
+        console.print(f"[yellow][Swap] {left} request(s) still on {active} after {drain_timeout:.0f}s, stopping it anyway.[/yellow]")
+    orchestrator("stop", old["service"], socket_path)
+
+    # server.json describes what's live now (warmup and the next swap read it)
+    huggingface.save_server_config(config, SERVER_CONFIG)
+    huggingface.register_served_model(config.get("source_model_path") or config["model_path"])
+    report.update(live=standby, port=new["port"], model=config["model_path"])
+    return report
+# FINISH ### HOT SWAP ###
+
+# START ### MAIN FUNCTION ###
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Blue/green swap of the model server behind the LLM proxy")
+    parser.add_argument("--model", help="GGUF to serve (default: keep the current one, e.g. to apply --set)")
+    parser.add_argument("--set", dest="overrides", action="append", type=parse_override, default=[],
+                        metavar="KEY=VALUE", help="Server config override, e.g. --set n_gpu_layers=12 (repeatable)")
+    parser.add_argument("--proxy", default=PROXY_URL)
+    parser.add_argument("--socket", default=str(CONTROL_SOCKET))
+    parser.add_argument("--ready-timeout", type=float, default=READY_TIMEOUT)
+    parser.add_argument("--drain-timeout", type=float, default=DRAIN_TIMEOUT)
+    parser.add_argument("--no-warmup", action="store_true", help="Skip the page-cache warmup of the new model")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args(argv)
+
+    report = hot_swap(args.model, dict(args.overrides), args.proxy, Path(args.socket),
+                      args.ready_timeout, args.drain_timeout, not args.no_warmup)
+    if args.json:
+        print(json.dumps(report))
+        return 0
+    table = Table(title=f"Hot swap complete: {report['live']} live on :{report['port']}", border_style="green")
+    table.add_column("Step")
+    table.add_column("Result")
+    table.add_row("Model", report["model"])
+    table.add_row("Standby ready", f"{report['ready_seconds']}s")
+    table.add_row("First token (warm probe)", f"{report['warm_probe_seconds']}s")
+    table.add_row("Traffic unavailable", f"{report['unavailable_seconds'] * 1000:.1f} ms "
+                  f"({report['failed_probes']}/{report['probes']} probes failed)")
+    table.add_row("Old instance drained", f"{report['drain_seconds']}s")
+    console.print(table)
+    return 0
+# FINISH ### MAIN FUNCTION ###
+
+# START ### SCRIPT RUNNER ###
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        sys.exit(130)
+    except Exception as e:
+        console.print(f"[red][Swap] Error: {str(e)}[/red]")
+        sys.exit(1)
+# FINISH ### SCRIPT RUNNER ###
@@ -7,9 +7,11 @@ import sys
 import json
 import time
 import subprocess
+import threading
 import psutil
 import requests
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from rich.console import Console
 from rich.panel import Panel
 from rich.prompt import Prompt
@@ -18,6 +20,10 @@ from rich.style import Style
 from huggingface_hub import HfApi, hf_hub_download, model_info
 from tqdm import tqdm
 from packaging import version as pkg_version # Use alias to avoid name clash
+from model_staging import StagingCache
+import model_store
+import gguf_file
+import cpu_topology
 # FINISH ### IMPORTS ###
 
 # START ### CONSOLE SETUP ###
@@ -185,8 +191,148 @@ def get_file_size(repo_id, file_name):
     except Exception as e:
         print_styled(f"Error getting size for {file_name}: {str(e)}", "error_red")
         return None
+def get_file_sha256(repo_id, file_name):
+    """sha256 Hugging Face has on record for an LFS file (its X-Linked-Etag), or None"""
+    try:
+        from huggingface_hub.utils import build_hf_headers
+        headers = build_hf_headers(token=os.environ.get("HUGGING_FACE_HUB_TOKEN"))
+        url = f"https://huggingface.co/{repo_id}/resolve/main/{file_name}"
+        response = requests.head(url, headers=headers, allow_redirects=False, timeout=15)
+        etag = response.headers.get("x-linked-etag", "").strip('"')
+        return etag if re.fullmatch(r"[0-9a-f]{64}", etag) else None
+    except requests.exceptions.RequestException:
+        return None
 # FINISH ### MODEL FILES HANDLER ###
 
+# START ### SHARD SETS ###
+SHARD_PATTERN = gguf_file.SHARD_PATTERN
+SHARD_DOWNLOAD_WORKERS = int(os.environ.get("SHARD_DOWNLOAD_WORKERS", "4"))
+
+def group_model_files(files):
+    """
+    Logical models in a repo: {file llama.cpp gets pointed at: [every file it needs]}.
+    A *-00001-of-0000N.gguf split set is one model keyed by its first shard;
+    sets missing shards are left out.
+    """
+    models = {}
+    sets = {}
+    for file_name in sorted(files):
+        match = SHARD_PATTERN.match(file_name)
+        if match:
+            sets.setdefault((match["base"], int(match["total"])), {})[int(match["index"])] = file_name
+        else:
+            models[file_name] = [file_name]
+    for (base, total), shards in sets.items():
+        if sorted(shards) != list(range(1, total + 1)):
+            print_styled(f"Warning: Split model {base} is missing shards ({len(shards)}/{total} listed), skipping it.", "warn_yellow")
+            continue
+        ordered = [shards[index] for index in range(1, total + 1)]
+        models[ordered[0]] = ordered
+    return models
+
+def resolve_model_file(models, wanted):
+    """MODEL_FILENAME may name a single file, any shard of a set, or the set without the -0000X-of-0000N suffix"""
+    if wanted in models:
+        return wanted
+    for first, shards in models.items():
+        if wanted in shards:
+            return first
+        match = SHARD_PATTERN.match(first)
+        if match and f"{match['base']}.gguf" == wanted:
+            return first
+    return None
+
+def get_set_size(repo_id, shards):
+    """Total GB of every shard, HEADs in parallel. None if any size lookup failed."""
+    with ThreadPoolExecutor(max_workers=SHARD_DOWNLOAD_WORKERS) as pool:
+        sizes = list(pool.map(lambda shard: get_file_size(repo_id, shard), shards))
+    return None if any(size is None for size in sizes) else sum(sizes)
+
+def verify_shard(path, index, total, expected_sha256=None):
+    """
+    Check a downloaded shard is the one we asked for: its split.* metadata
+    (written by gguf-split) says index/total, and its sha256 matches the
+    Hub's when the Hub gave us one. Returns the digest.
+    """
+    metadata = gguf_file.read_gguf(path).metadata
+    if "split.count" in metadata and int(metadata["split.count"]) != total:
+        raise ValueError(f"{Path(path).name} says it's one of {metadata['split.count']} shards, expected {total}")
+    if "split.no" in metadata and int(metadata["split.no"]) != index - 1: # split.no is 0-based
+        raise ValueError(f"{Path(path).name} is shard {int(metadata['split.no']) + 1}, expected {index}")
+    digest = model_store.file_digest(path)
+    if expected_sha256 and digest != expected_sha256:
+        raise ValueError(f"{Path(path).name} sha256 mismatch (got {digest[:12]}, Hub has {expected_sha256[:12]})")
+    return digest
+
+def download_model_set(repo_id, shards, model_info_dict):
+    """
+    Fetch every shard of a split GGUF concurrently, verify each, then record
+    the whole set in the model DB in one write. Returns the first shard's
+    path (what llama.cpp opens) only once the full set is on disk.
+    """
+    try:
+        quant_type = next((k for k in QUANT_INFO.keys() if k in shards[0]), "base")
+        model_dir = setup_model_directory(repo_id.split("/")[1], quant_type)
+
+        db = get_model_database()
+        models_db = db.get("models", {})
+        known_set = models_db.get(repo_id, {}).get("sets", {}).get(shards[0])
+        if known_set and len(known_set) == len(shards) and all(Path(p).exists() for p in known_set):
+            print_styled(f"✓ All {len(shards)} shards already listed in DB and present.", "neon_green")
+            return known_set[0]
+
+        print_styled(f"Starting download of {len(shards)} shards of {shards[0]} from {repo_id} "
+                     f"({SHARD_DOWNLOAD_WORKERS} at a time)", "cyber_orange")
+        expected_size_gb = model_info_dict.get("size_gb", 0)
+        if expected_size_gb:
+             console.print(f"[dim]Expected Size: {expected_size_gb:.2f} GB total[/dim]")
+
+        lock = threading.Lock()
+        done = []
+        def fetch(item):
+            index, shard = item
+            path = hf_hub_download(
+                repo_id=repo_id,
+                filename=shard,
+                local_dir=model_dir,
+                local_dir_use_symlinks=False,
+                resume_download=True,
+                token=os.environ.get("HUGGING_FACE_HUB_TOKEN"),
+            )
+            digest = verify_shard(path, index, len(shards), get_file_sha256(repo_id, shard))
+            with lock:
+                done.append(shard)
+                console.print(f"[dim]✓ Shard {index}/{len(shards)} verified ({len(done)}/{len(shards)} done)[/dim]")
+            return path, digest
+
+        with ThreadPoolExecutor(max_workers=SHARD_DOWNLOAD_WORKERS) as pool:
+            results = list(pool.map(fetch, enumerate(shards, start=1))) # Re-raises the first failure
+
+        # Only now does the set exist as far as anyone reading the DB is concerned
+        repo_db = models_db.setdefault(repo_id, {})
+        repo_db.setdefault("files", {})
+        for shard, (path, digest) in zip(shards, results):
+            repo_db["files"][shard] = path
+            try:
+                model_store.ingest(db, path, digest=digest)
+            except Exception as e:
+                print_styled(f"Warning: Could not add {path} to the model store: {e}", "warn_yellow")
+        repo_db.setdefault("sets", {})[shards[0]] = [path for path, _ in results]
+        repo_db["info"] = model_info_dict
+        db["models"] = models_db
+        save_model_database(db)
+
+        print_styled(f"✓ Download complete! {len(shards)} shards verified.", "neon_green")
+        print_styled(f"✓ Saved to: {model_dir}", "neon_green")
+        return results[0][0]
+
+    except Exception as e:
+        import traceback
+        print_styled(f"Error downloading split model: {str(e)}", "error_red")
+        console.print(f"{traceback.format_exc()}")
+        return None
+# FINISH ### SHARD SETS ###
+
 # START ### MODEL ANALYZER ###
 def analyze_model(repo_id):
     """Analyze model information"""
@@ -213,25 +359,23 @@ def setup_model_directory(model_name, quant_type):
     return model_dir
 
 def get_model_database():
-    """Get model database from mapped location"""
-    db_path = Path("/home/flintx/.local/share/llm_models.json") # Mapped from host ~/.local/share
-    db_path.parent.mkdir(parents=True, exist_ok=True)
-    if db_path.exists():
-        try:
-            with open(db_path) as f:
-                return json.load(f)
-        except Exception: # Catch broad exceptions for file read errors
-             return {"models": {}} # Return empty if read fails
-    return {"models": {}}
+    """Get model database from mapped location (also holds the blob store's usage stats)"""
+    return model_store.load_registry() # Mapped from host ~/.local/share
 
 def save_model_database(db):
     """Save model database to mapped location"""
-    db_path = Path("/home/flintx/.local/share/llm_models.json")
     try:
-        with open(db_path, "w") as f:
-            json.dump(db, f, indent=2)
+        model_store.save_registry(db)
+    except Exception as e:
+         print_styled(f"Error saving model database to {model_store.REGISTRY_PATH}: {e}", "error_red")
+
+def store_model_file(db, path):
+    """Move a model into the content-addressed store, leaving a link at path. Never fatal."""
+    try:
+        return model_store.ingest(db, path)
     except Exception as e:
-         print_styled(f"Error saving model database to {db_path}: {e}", "error_red")
+        print_styled(f"Warning: Could not add {path} to the model store: {e}", "warn_yellow")
+        return None
 
 def download_model(repo_id, file_name, model_info_dict):
     """Download model with progress tracking using hf_hub_download"""
@@ -249,6 +393,8 @@ def download_model(repo_id, file_name, model_info_dict):
              existing_path_str = repo_files_db[file_name]
              if Path(existing_path_str).exists():
                   print_styled(f"✓ Model already listed in DB and exists at: {existing_path_str}", "neon_green")
+                  if store_model_file(db, existing_path_str): # No-op unless it predates the store
+                       save_model_database(db)
                   return existing_path_str # Assume file is good if it exists
              else:
                   print_styled(f"! Model listed in DB but file missing at: {existing_path_str}. Re-downloading.", "warn_yellow")
@@ -277,7 +423,9 @@ def download_model(repo_id, file_name, model_info_dict):
         models_db[repo_id]["files"][file_name] = downloaded_path_str # Use actual downloaded path
         # Add/update other info if needed
         models_db[repo_id]["info"] = model_info_dict
-        save_model_database({"models": models_db}) # Save updated db
+        db["models"] = models_db
+        store_model_file(db, downloaded_path_str) # Dedupes against blobs from other repos/mirrors
+        save_model_database(db) # Save updated db (keeps the blob stats)
 
         print_styled(f"✓ Download complete!", "neon_green")
         print_styled(f"✓ Saved to: {downloaded_path_str}", "neon_green")
@@ -290,6 +438,39 @@ def download_model(repo_id, file_name, model_info_dict):
         return None
 # FINISH ### DOWNLOAD MANAGER ###
 
+# START ### MODEL STORE & STAGING ###
+def register_served_model(model_path):
+    """Record that this model is being served (usage stats + GC pin), then GC the store down to quota"""
+    db = get_model_database()
+    if not model_store.mark_served(db, model_path):
+        store_model_file(db, model_path)
+        model_store.mark_served(db, model_path)
+    quota_gb = os.environ.get("MODEL_STORE_QUOTA_GB")
+    if quota_gb:
+        try:
+            model_store.collect_garbage(db, int(float(quota_gb) * 1024**3), keep=[model_path])
+        except Exception as e:
+            print_styled(f"Warning: Model store GC failed: {e}", "warn_yellow")
+    save_model_database(db)
+
+def model_companions(model_path):
+    """The other shards a split model needs next to it ([] for a single file)"""
+    return model_store.model_set(get_model_database(), model_path)[1:]
+
+def stage_model(model_path, protect=()):
+    """
+    Copy the model onto the local staging disk (LRU, byte quota). Failures just mean serving from the volume.
+    protect: paths a running server still uses, so making room never evicts them.
+    """
+    if os.environ.get("MODEL_STAGING", "yes").lower() == "no":
+        return None
+    try:
+        return StagingCache().stage(model_path, protect=protect, companions=model_companions(model_path))
+    except Exception as e:
+        print_styled(f"Warning: Could not stage model, serving from {model_path}: {e}", "warn_yellow")
+        return None
+# FINISH ### MODEL STORE & STAGING ###
+
 # START ### SERVER CONFIG GENERATOR ###
 def generate_server_config(model_path, system_specs):
     """Generate server configuration based on P2000 optimizations"""
@@ -297,13 +478,20 @@ def generate_server_config(model_path, system_specs):
          print_styled("Error: Cannot generate config without valid model path.", "error_red")
          return None
 
+    # Serve from the fast-disk copy when one is staged and current
+    staged_path = StagingCache().lookup(model_path, companions=model_companions(model_path))
+    if staged_path:
+        print_styled(f"✓ Using staged copy: {staged_path}", "neon_green")
+
+    cpu_plan = cpu_topology.load_plan()
     config = {
-        "model_path": str(model_path), # Ensure path is string
+        "model_path": staged_path or str(model_path), # Ensure path is string
+        "source_model_path": str(model_path),
         "host": "0.0.0.0",
         "port": 8080,
         "n_ctx": 2048,
-        # Use logical=False for physical cores, maybe safer in container
-        "n_threads": max(1, psutil.cpu_count(logical=False) or 1), # Default to 1 if count fails
+        # One thread per dedicated core when there's a CPU plan, else every physical core
+        "n_threads": (cpu_plan or {}).get("n_threads") or max(1, psutil.cpu_count(logical=False) or 1), # Default to 1 if count fails
         "n_gpu_layers": 8,         # *** P2000 Optimized ***
         "tensor_split_values": [0.35, 0.35], # Store actual values
         "n_batch": 64             # *** P2000 Optimized ***
@@ -317,22 +505,34 @@ def generate_server_config(model_path, system_specs):
     console.print(json.dumps(config, indent=2))
     return config
 
-# Saving JSON config is less critical if script is generated directly
-# def save_server_config(config): ...
+def save_server_config(config, config_path=Path("/app/config/server.json")):
+    """Write the config next to the script so pre-launch stages (model_warmup.py) know what's coming"""
+    try:
+        config_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = config_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(config, f, indent=2)
+        os.replace(tmp_path, config_path)
+        return str(config_path)
+    except Exception as e:
+        print_styled(f"Warning: Could not save server config to {config_path}: {e}", "warn_yellow")
+        return None
 
-def create_server_script(config):
+def create_server_script(config, script_path=Path("/app/scripts/run_server.sh")):
     """Create server launch script with corrected rope_freq_base and explicit tensor_split"""
     if not config: # Added check for valid config
          print_styled("Error: Cannot create server script without valid config.", "error_red")
          return None
 
-    script_dir = Path("/app/scripts") # Use /app path inside container
-    script_dir.mkdir(parents=True, exist_ok=True)
-    script_path = script_dir / "run_server.sh"
+    script_path = Path(script_path) # Use /app path inside container; hot_swap.py writes the standby slot's
+    script_path.parent.mkdir(parents=True, exist_ok=True)
 
     # Construct the command line arguments carefully
+    # Same CLI as `-m llama_cpp.server`, plus restored KV snapshots of registered prompt prefixes
+    entry_point = ["/app/scripts/llama_server_kv.py"] if os.environ.get("KV_SNAPSHOTS", "yes").lower() not in ("no", "false", "0") \
+        else ["-m", "llama_cpp.server"]
     cmd_args = [
-        "python3", "-m", "llama_cpp.server",
+        "python3", *entry_point,
         "--model", config["model_path"],
         "--host", config["host"],
         "--port", str(config["port"]),
@@ -363,7 +563,7 @@ echo -e "\\033[32m[+] GPU Layers: {config["n_gpu_layers"]} | Batch: {config["n_b
 echo -e "\\033[32m[+] Server will run on {config["host"]}:{config["port"]}\\033[0m"
 echo ""
 
-# Use exec to replace the shell process - IMPORTANT for Supervisor/Docker signal handling
+# Use exec to replace the shell process - IMPORTANT for orchestrator/Docker signal handling
 exec {escaped_args}
 """
 
@@ -421,19 +621,29 @@ def main():
         print_styled(f"ERROR: No GGUF files found in repo {repo_id}.", "error_red")
         sys.exit(1)
 
-    selected_file = None
-    if default_filename in files:
-        selected_file = default_filename
+    models = group_model_files(files) # Split sets count as one model
+    if not models:
+        print_styled(f"ERROR: No complete GGUF models found in repo {repo_id}.", "error_red")
+        sys.exit(1)
+
+    selected_file = resolve_model_file(models, default_filename)
+    if selected_file:
         print_styled(f"Target model file: {selected_file}", "cyber_purple")
     else:
         # Fallback logic if default/env var filename isn't found
-        fallback_file = files[0] # Use the first file found
+        fallback_file = next(iter(models)) # Use the first model found
         print_styled(f"Warning: Target file '{default_filename}' not found in repo.", "warn_yellow")
-        print_styled(f"Using first available GGUF file: {fallback_file}", "warn_yellow")
+        print_styled(f"Using first available GGUF model: {fallback_file}", "warn_yellow")
         selected_file = fallback_file
+    selected_shards = models[selected_file]
+    if len(selected_shards) > 1:
+        print_styled(f"Split model: {len(selected_shards)} shards", "cyber_purple")
 
     # --- Get model size ---
-    selected_file_size_gb = get_file_size(repo_id, selected_file)
+    if len(selected_shards) > 1:
+        selected_file_size_gb = get_set_size(repo_id, selected_shards)
+    else:
+        selected_file_size_gb = get_file_size(repo_id, selected_file)
     if selected_file_size_gb is None:
          # Decide how to handle failure: exit or proceed with unknown size?
          print_styled(f"Warning: Could not determine size for {selected_file}. Proceeding...", "warn_yellow")
@@ -443,7 +653,8 @@ def main():
         "repo_id": repo_id,
         "file": selected_file,
         "type": "gguf",
-        "size_gb": selected_file_size_gb
+        "size_gb": selected_file_size_gb,
+        "shards": len(selected_shards)
     }
 
     # --- Ensure model is downloaded (non-interactive) ---
@@ -453,7 +664,10 @@ def main():
     model_available = False
     if should_download:
          console.print(f"[cyan]Ensuring model file '{selected_file}' exists...[/cyan]")
-         downloaded_path_str = download_model(repo_id, selected_file, model_info_payload)
+         if len(selected_shards) > 1:
+              downloaded_path_str = download_model_set(repo_id, selected_shards, model_info_payload)
+         else:
+              downloaded_path_str = download_model(repo_id, selected_file, model_info_payload)
          if downloaded_path_str and Path(downloaded_path_str).exists():
               model_available = True
          else:
@@ -464,7 +678,14 @@ def main():
          db = get_model_database()
          models_db = db.get("models", {})
          repo_files_db = models_db.get(repo_id, {}).get("files", {})
-         if selected_file in repo_files_db:
+         known_set = models_db.get(repo_id, {}).get("sets", {}).get(selected_file)
+         if len(selected_shards) > 1:
+             # A split model only counts when every shard is there
+             if known_set and len(known_set) == len(selected_shards) and all(Path(p).exists() for p in known_set):
+                 downloaded_path_str = known_set[0]
+                 print_styled(f"✓ Using existing {len(known_set)}-shard model found in DB (download skipped): {downloaded_path_str}", "neon_green")
+                 model_available = True
+         elif selected_file in repo_files_db:
              existing_path_str = repo_files_db[selected_file]
              if Path(existing_path_str).exists():
                  downloaded_path_str = existing_path_str
@@ -483,11 +704,15 @@ def main():
          print_styled("ERROR: Failed to get system specs for config generation.", "error_red")
          sys.exit(1) # Exit if we can't get specs
 
+    register_served_model(downloaded_path_str)
+    stage_model(downloaded_path_str)
+
     print_styled("Generating server configuration and launch script...", "cyber_orange")
     config = generate_server_config(downloaded_path_str, sys_specs)
     if not config: # Check if config generation failed
         print_styled("ERROR: Failed to generate server config.", "error_red")
         sys.exit(1)
+    save_server_config(config)
 
     server_script_path = create_server_script(config)
     if not server_script_path:
@@ -497,7 +722,7 @@ def main():
     console.rule("[bold green]✓ Setup Complete[/bold green]")
     console.print(f"[cyan]Model:[/cyan] [yellow]{downloaded_path_str}[/yellow]")
     console.print(f"[cyan]Launch Script:[/cyan] [yellow]{server_script_path}[/yellow]")
-    console.print("[dim]Supervisor will now launch services defined in supervisord.conf.[/dim]")
+    console.print("[dim]The orchestrator will now launch the services defined in config/services.json.[/dim]")
     console.print() # Add a newline for cleaner exit
 
 # FINISH ### MAIN FUNCTION (SETUP ONLY) ###
@@ -1,11 +1,11 @@
 #!/usr/bin/env python3
 
 import sys
-import subprocess
 from pathlib import Path
 from rich import print as rprint
 from rich.console import Console
 from rich.progress import Progress, SpinnerColumn, TextColumn
+from steps import Step, StepGraph
 
 BOLT_BANNER = """
 [bright_magenta]╔══════════════════════════════════════════════════════╗
@@ -22,17 +22,26 @@ INIT_BANNER = """
 """
 
 def handoff_to_scratch():
-    """Hand off to scratch.py for bolt.diy installation"""
-    scratch_path = Path.home() / "deploy.bolt" / "scratch.py"
-    try:
-        subprocess.run([sys.executable, str(scratch_path)], check=True)
-    except subprocess.CalledProcessError:
-        rprint("[bright_red]ERROR: Failed to launch scratch.py![/]")
-        sys.exit(1)
-    except FileNotFoundError:
+    """
+    Node/pnpm setup doesn't need the tokens and the model download doesn't need
+    Node, so they run side by side instead of scratch -> tokens -> huggingface.
+    """
+    deploy_dir = Path.home() / "deploy.bolt"
+    if not (deploy_dir / "scratch.py").exists():
         rprint("[bright_red]ERROR: scratch.py not found![/]")
         sys.exit(1)
 
+    steps = [
+        Step("environment", "NODE + PNPM", [sys.executable, str(deploy_dir / "scratch.py"), "--no-handoff"]),
+        Step("tokens", "TOKENS", [sys.executable, str(deploy_dir / "tokens.py"), "--no-launch"], cache=False),
+        # huggingface.py asks which model to pull and skips files it already has
+        Step("model", "HUGGINGFACE", [sys.executable, str(deploy_dir / "huggingface.py")], deps=["tokens"],
+             cache=False),
+    ]
+    if not StepGraph(steps).run():
+        rprint("[bright_red]ERROR: Deployment sequence didn't finish clean, check the table above.[/]")
+        sys.exit(1)
+
 def main():
     # Print main banner
     rprint(BOLT_BANNER)
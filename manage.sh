@@ -1,5 +1,14 @@
 #!/bin/bash
 
+# Pick the CUDA base image for this host's driver + GPU from the local tag index.
+# Prints nothing (so the Dockerfile defaults win) if nvidia-smi or the index isn't there.
+cuda_build_args() {
+    local args
+    if args=$(python3 cuda_compat.py --docker-args 2>/dev/null); then
+        echo "$args"
+    fi
+}
+
 # When you run "./manage.sh start"
 if [ "$1" = "start" ]; then
     # Just start the container and give you a shell
@@ -14,7 +23,7 @@ elif [ "$1" = "stop" ]; then
 # When you run "./manage.sh rebuild"
 elif [ "$1" = "rebuild" ]; then
     # Rebuild and start the container
-    docker-compose build
+    docker-compose build $(cuda_build_args)
     docker-compose up -d
     docker-compose exec -u flintx bolt bash
 
@@ -22,11 +31,16 @@ elif [ "$1" = "rebuild" ]; then
 elif [ "$1" = "clean" ]; then
     # Full cleanup and rebuild
     docker-compose down --rmi all
-    docker-compose build
+    docker-compose build $(cuda_build_args)
     docker-compose up -d
     docker-compose exec -u flintx bolt bash
 
+# When you run "./manage.sh swap --model /home/flintx/models/... [--set n_gpu_layers=12]"
+elif [ "$1" = "swap" ]; then
+    # Blue/green swap of the model server, no API downtime
+    docker-compose exec -u flintx bolt python3 /app/hot_swap.py "${@:2}"
+
 # If you run it wrong
 else
-    echo "Usage: ./manage.sh start|stop|rebuild|clean"
+    echo "Usage: ./manage.sh start|stop|rebuild|clean|swap"
 fi
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+
+# START ### IMPORTS ###
+import os
+import sys
+import json
+import time
+import fcntl
+import hashlib
+import argparse
+import contextlib
+from pathlib import Path
+from rich.console import Console
+from rich.table import Table
+# FINISH ### IMPORTS ###
+
+# START ### CONSOLE SETUP ###
+console = Console()
+# FINISH ### CONSOLE SETUP ###
+
+# START ### CONFIGURATION ###
+# Fast local disk (a docker volume by default, see docker-compose.yml). The
+# mounted /home/flintx/models stays the source of truth; this is just a cache.
+STAGING_DIR = Path(os.environ.get("MODEL_STAGING_DIR", "/home/flintx/staging"))
+STAGING_QUOTA_GB = float(os.environ.get("MODEL_STAGING_QUOTA_GB", "64"))
+INDEX_NAME = "index.json"
+COPY_CHUNK = 64 * 1024 * 1024
+FICLONE = 0x40049409 # ioctl: share extents on btrfs/xfs (reflink), no data copied
+# FINISH ### CONFIGURATION ###
+
+# START ### HELPERS ###
+def format_size(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}" if unit != "B" else f"{size} B"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+def source_key(source):
+    """Staging slot for a source file; same file name from two repos can't collide"""
+    return hashlib.sha256(str(Path(source).resolve()).encode()).hexdigest()[:16]
+
+
+def source_signature(source):
+    stat = Path(source).stat()
+    return {"size": stat.st_size, "mtime": stat.st_mtime}
+# FINISH ### HELPERS ###
+
+# START ### COPY ###
+def _try_reflink(src_fd, dst_fd):
+    try:
+        fcntl.ioctl(dst_fd, FICLONE, src_fd)
+        return True
+    except OSError:
+        return False
+
+
+def _copy_range(src_fd, dst_fd, offset, length):
+    """Kernel-side copy where possible (copy_file_range can reflink on its own), read/write otherwise"""
+    end = offset + length
+    while offset < end:
+        count = min(COPY_CHUNK, end - offset)
+        try:
+            copied = os.copy_file_range(src_fd, dst_fd, count, offset, offset)
+        except (AttributeError, OSError):
+            data = os.pread(src_fd, count, offset)
+            copied = os.pwrite(dst_fd, data, offset) if data else 0
+        if copied <= 0:
+            raise OSError(f"Short copy at offset {offset}")
+        offset += copied
+
+
+def _data_extents(fd, size):
+    """(offset, length) of the non-hole parts. Whole file when SEEK_DATA isn't supported."""
+    if not hasattr(os, "SEEK_DATA"):
+        return [(0, size)]
+    extents, offset = [], 0
+    try:
+        while offset < size:
+            start = os.lseek(fd, offset, os.SEEK_DATA)
+            end = os.lseek(fd, start, os.SEEK_HOLE)
+            extents.append((start, end - start))
+            offset = end
+    except OSError as e:
+        if e.errno == 6: # ENXIO: no more data past offset
+            return extents
+        return [(0, size)]
+    return extents
+
+
+def copy_file(source, destination):
+    """
+    Copy keeping it cheap: reflink when the filesystem allows, else copy only
+    the data extents so holes stay holes. Returns "reflink" or "copy".
+    """
+    size = os.path.getsize(source)
+    src_fd = os.open(source, os.O_RDONLY)
+    try:
+        dst_fd = os.open(destination, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            if _try_reflink(src_fd, dst_fd):
+                method = "reflink"
+            else:
+                method = "copy"
+                for offset, length in _data_extents(src_fd, size):
+                    _copy_range(src_fd, dst_fd, offset, length)
+                os.ftruncate(dst_fd, size) # Trailing hole
+            os.fsync(dst_fd)
+        finally:
+            os.close(dst_fd)
+    finally:
+        os.close(src_fd)
+    return method
+# FINISH ### COPY ###
+
+# START ### STAGING CACHE ###
+class StagingCache:
+    """
+    Byte-quota LRU of model files copied onto fast local disk. Entries live in
+    <dir>/<key>/<file name>; index.json keeps size, source signature and last
+    use. Copies land under a temp name and get renamed in, so the server never
+    sees half a model.
+    """
+
+    def __init__(self, directory=STAGING_DIR, quota_bytes=None):
+        self.directory = Path(directory)
+        self.quota = int(quota_bytes if quota_bytes is not None else STAGING_QUOTA_GB * 1024**3)
+        self.index_path = self.directory / INDEX_NAME
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """Whole-cache lock so two setups can't evict each other's copy mid-stage"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self.directory / ".lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _load(self):
+        try:
+            with open(self.index_path) as f:
+                entries = json.load(f).get("entries", {})
+        except (OSError, ValueError):
+            entries = {}
+        # Drop entries whose file vanished (someone cleaned up by hand)
+        return {k: e for k, e in entries.items() if Path(e.get("path", "")).exists()}
+
+    def _save(self, entries):
+        tmp_path = self.index_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"entries": entries}, f, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+    def _free_space(self):
+        stat = os.statvfs(self.directory)
+        return stat.f_bavail * stat.f_frsize
+
+    def _evict(self, entries, key):
+        entry = entries.pop(key)
+        path = Path(entry["path"])
+        # The server mmaps the files; unlinking under it is fine on Linux
+        for name in [path.name] + [Path(c["source"]).name for c in entry.get("companions", [])]:
+            with contextlib.suppress(OSError):
+                (path.parent / name).unlink()
+        with contextlib.suppress(OSError):
+            path.parent.rmdir()
+        console.print(f"[dim][Staging] Evicted {path.name} ({format_size(entry['size'])})[/dim]")
+
+    @staticmethod
+    def _is_current(entry, source, companions):
+        """Staged copy still matches the source file (and every companion shard)"""
+        try:
+            signature = source_signature(source)
+            parts = [dict(source=str(c), **source_signature(c)) for c in companions]
+        except OSError:
+            return False
+        if entry["source_size"] != signature["size"] or entry["source_mtime"] != signature["mtime"]:
+            return False
+        return entry.get("companions", []) == parts
+
+    def lookup(self, source, companions=()):
+        """Staged path for source if a current copy is there, else None. Doesn't copy."""
+        entry = self._load().get(source_key(source))
+        if not entry or not self._is_current(entry, source, companions):
+            return None
+        return entry["path"]
+
+    def stage(self, source, protect=(), companions=()):
+        """
+        Make sure a current copy of source is staged and return its path. Evicts
+        least-recently-used models to fit; protect lists paths that must stay,
+        by source or by staged path (whatever a live server config points at). companions are files that have to sit next to it (the other
+        shards of a split GGUF) and are staged and evicted with it. None when
+        it can't fit (the caller just uses the source).
+        """
+        source = Path(source)
+        companions = [Path(c) for c in companions]
+        signature = source_signature(source)
+        parts = [dict(source=str(c), **source_signature(c)) for c in companions]
+        key = source_key(source)
+        with self._locked():
+            entries = self._load()
+            entry = entries.get(key)
+            if entry and self._is_current(entry, source, companions):
+                entry["last_used"] = time.time()
+                entry["hits"] = entry.get("hits", 0) + 1
+                self._save(entries)
+                return entry["path"]
+            if entry: # Source changed since we staged it
+                self._evict(entries, key)
+
+            size = signature["size"] + sum(part["size"] for part in parts)
+            if size > self.quota:
+                console.print(f"[yellow][Staging] {source.name} ({format_size(size)}) is bigger than the "
+                              f"{format_size(self.quota)} quota, serving from the models volume.[/yellow]")
+                self._save(entries)
+                return None
+
+            protect = {str(p) for p in protect if p}
+            protected = {source_key(p) for p in protect}
+            protected |= {k for k, e in entries.items() if e["path"] in protect}
+            for victim in sorted(entries, key=lambda k: entries[k]["last_used"]):
+                used = sum(e["size"] for e in entries.values())
+                if used + size <= self.quota and self._free_space() > size:
+                    break
+                if victim not in protected:
+                    self._evict(entries, victim)
+            if sum(e["size"] for e in entries.values()) + size > self.quota or self._free_space() <= size:
+                console.print(f"[yellow][Staging] Not enough room for {source.name}, serving from the models volume.[/yellow]")
+                self._save(entries)
+                return None
+
+            target_dir = self.directory / key
+            target_dir.mkdir(parents=True, exist_ok=True)
+            target = target_dir / source.name
+            console.print(f"[cyan][Staging] Copying {source.name}{f' + {len(parts)} shards' if parts else ''} "
+                          f"({format_size(size)}) to {self.directory}...[/cyan]")
+            started = time.monotonic()
+            # Companions first, the file the server opens last: a crash midway
+            # never leaves a complete-looking entry point over a partial set
+            for part_source in companions + [source]:
+                part_target = target_dir / part_source.name
+                tmp_target = target_dir / f".{part_source.name}.partial"
+                try:
+                    method = copy_file(part_source, tmp_target)
+                    os.replace(tmp_target, part_target)
+                except OSError:
+                    with contextlib.suppress(OSError):
+                        tmp_target.unlink()
+                    raise
+            elapsed = time.monotonic() - started
+            entries[key] = {
+                "source": str(source), "path": str(target), "size": size,
+                "source_size": signature["size"], "source_mtime": signature["mtime"], "companions": parts,
+                "staged_at": time.time(), "last_used": time.time(), "hits": 0, "method": method,
+            }
+            self._save(entries)
+            rate = f", {size / elapsed / 1e9:.2f} GB/s" if method == "copy" and elapsed > 0 else ""
+            console.print(f"[green][Staging] ✓ Staged via {method} in {elapsed:.1f}s{rate}: {target}[/green]")
+            return str(target)
+
+    def evict(self, source=None):
+        """Drop one staged model (by source path) or everything. Returns how many went."""
+        with self._locked():
+            entries = self._load()
+            keys = [source_key(source)] if source else list(entries)
+            removed = 0
+            for key in keys:
+                if key in entries:
+                    self._evict(entries, key)
+                    removed += 1
+            self._save(entries)
+            return removed
+
+    def entries(self):
+        return sorted(self._load().values(), key=lambda e: e["last_used"], reverse=True)
+# FINISH ### STAGING CACHE ###
+
+# START ### CLI ###
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fast-disk staging cache for GGUF models")
+    parser.add_argument("--dir", default=str(STAGING_DIR))
+    parser.add_argument("--quota-gb", type=float, default=STAGING_QUOTA_GB)
+    sub = parser.add_subparsers(dest="command", required=True)
+    stage = sub.add_parser("stage", help="Copy a model into the staging cache (LRU-evicting to fit)")
+    stage.add_argument("model")
+    sub.add_parser("list", help="Show staged models, most recently used first")
+    evict = sub.add_parser("evict", help="Remove a staged model, or everything with --all")
+    evict.add_argument("model", nargs="?")
+    evict.add_argument("--all", action="store_true")
+    args = parser.parse_args(argv)
+
+    cache = StagingCache(args.dir, int(args.quota_gb * 1024**3))
+    if args.command == "stage":
+        staged = cache.stage(args.model)
+        if not staged:
+            return 1
+        print(staged)
+        return 0
+
+    if args.command == "evict":
+        if not args.model and not args.all:
+            parser.error("evict needs a model path or --all")
+        removed = cache.evict(None if args.all else args.model)
+        console.print(f"[green]✓ Evicted {removed} staged model(s)[/green]")
+        return 0
+
+    entries = cache.entries()
+    table = Table(title=f"Staged models in {cache.directory} (quota {format_size(cache.quota)})", border_style="cyan")
+    for column in ("File", "Size", "Method", "Hits", "Last used", "Source"):
+        table.add_column(column)
+    for entry in entries:
+        last_used = time.strftime("%Y-%m-%d %H:%M", time.localtime(entry["last_used"]))
+        table.add_row(Path(entry["path"]).name, format_size(entry["size"]), entry.get("method", "-"),
+                      str(entry.get("hits", 0)), last_used, entry["source"])
+    console.print(table)
+    console.print(f"[dim]{format_size(sum(e['size'] for e in entries))} used[/dim]")
+    return 0
+# FINISH ### CLI ###
+
+# START ### SCRIPT RUNNER ###
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        sys.exit(130)
+    except Exception as e:
+        console.print(f"[red][Staging] Error: {str(e)}[/red]")
+        sys.exit(1)
+# FINISH ### SCRIPT RUNNER ###
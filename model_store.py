@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+
+# START ### IMPORTS ###
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import contextlib
+from pathlib import Path
+from rich.console import Console
+from rich.table import Table
+from model_staging import StagingCache, format_size
+# FINISH ### IMPORTS ###
+
+# START ### CONSOLE SETUP ###
+console = Console()
+# FINISH ### CONSOLE SETUP ###
+
+# START ### CONFIGURATION ###
+MODELS_DIR = Path("/home/flintx/models")
+# Blobs live on the same volume as the named files so names can be hardlinks
+BLOB_DIR = MODELS_DIR / ".store" / "sha256"
+REGISTRY_PATH = Path("/home/flintx/.local/share/llm_models.json") # Same file huggingface.py keeps
+STORE_QUOTA_GB = os.environ.get("MODEL_STORE_QUOTA_GB") # Unset: never GC
+HASH_CHUNK = 8 * 1024 * 1024
+# FINISH ### CONFIGURATION ###
+
+# START ### REGISTRY ###
+def load_registry(path=REGISTRY_PATH):
+    try:
+        with open(path) as f:
+            db = json.load(f)
+    except (OSError, ValueError):
+        db = {}
+    db.setdefault("models", {})
+    db.setdefault("blobs", {})
+    return db
+
+
+def save_registry(db, path=REGISTRY_PATH):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(db, f, indent=2)
+    os.replace(tmp_path, path)
+# FINISH ### REGISTRY ###
+
+# START ### BLOB STORE ###
+def blob_path(digest, blob_dir=BLOB_DIR):
+    return Path(blob_dir) / digest[:2] / digest
+
+
+def file_digest(path):
+    sha = hashlib.sha256()
+    with open(path, "rb", buffering=0) as f:
+        buffer = bytearray(HASH_CHUNK)
+        view = memoryview(buffer)
+        while True:
+            count = f.readinto(buffer)
+            if not count:
+                break
+            sha.update(view[:count])
+    return sha.hexdigest()
+
+
+def find_digest(db, path):
+    """Digest of a named file the registry already knows, without rehashing"""
+    path = str(path)
+    for digest, blob in db["blobs"].items():
+        if path in blob.get("names", []):
+            return digest
+    return None
+
+
+def _link(blob, name):
+    """Point name at blob: hardlink (same volume), symlink if the filesystem won't"""
+    name = Path(name)
+    name.parent.mkdir(parents=True, exist_ok=True)
+    tmp_name = name.with_name(f".{name.name}.link")
+    with contextlib.suppress(FileNotFoundError):
+        tmp_name.unlink()
+    try:
+        os.link(blob, tmp_name)
+    except OSError:
+        os.symlink(blob, tmp_name)
+    os.replace(tmp_name, name)
+
+
+def ingest(db, path, blob_dir=BLOB_DIR, digest=None):
+    """
+    Move a downloaded file into the store under its sha256 and leave a link
+    at the original path. Identical content pulled from another repo/mirror
+    collapses onto the existing blob. Pass digest when it's already been
+    computed (shard downloads hash in parallel). Returns the digest.
+    """
+    path = Path(path)
+    known = find_digest(db, path)
+    if known and blob_path(known, blob_dir).exists() and os.path.samefile(path, blob_path(known, blob_dir)):
+        return known
+
+    if not digest:
+        console.print(f"[dim][Store] Hashing {path.name}...[/dim]")
+        digest = file_digest(path)
+    blob = blob_path(digest, blob_dir)
+    if blob.exists():
+        if not os.path.samefile(path, blob):
+            console.print(f"[cyan][Store] {path.name} is a duplicate of a stored blob, keeping one copy.[/cyan]")
+    else:
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(path, blob) # Same volume: a rename, not a copy
+        os.chmod(blob, 0o444)  # Shared by every name; nobody writes through one
+    _link(blob, path)
+
+    entry = db["blobs"].setdefault(digest, {
+        "size": blob.stat().st_size, "names": [], "added": time.time(),
+        "last_served": None, "serve_count": 0,
+    })
+    if str(path) not in entry["names"]:
+        entry["names"].append(str(path))
+    return digest
+
+
+def model_set(db, path):
+    """Every file of the split GGUF path starts (first shard), or just [path]"""
+    for repo in db["models"].values():
+        for names in repo.get("sets", {}).values():
+            if str(path) in names:
+                return list(names)
+    return [str(path)]
+
+
+def mark_served(db, path):
+    """The server is about to load path: bump its usage and pin it (all its shards) against GC"""
+    digests = [find_digest(db, name) for name in model_set(db, path)]
+    if not all(digests):
+        return None
+    now = time.time()
+    for digest in digests:
+        entry = db["blobs"][digest]
+        entry["last_served"] = now
+        entry["serve_count"] = entry.get("serve_count", 0) + 1
+    db["serving"] = digests
+    return digests
+
+
+def store_usage(db):
+    return sum(blob["size"] for blob in db["blobs"].values())
+
+
+def collect_garbage(db, quota_bytes, keep=(), blob_dir=BLOB_DIR, dry_run=False):
+    """
+    While the store is over quota, delete the least-recently-served blob and
+    every name pointing at it. The blob being served and anything in keep are
+    never touched. Returns the removed digests.
+    """
+    serving = db.get("serving") or []
+    pinned = set([serving] if isinstance(serving, str) else serving)
+    pinned |= {find_digest(db, name) for path in keep for name in model_set(db, path)}
+    used = store_usage(db)
+    removed = []
+    # Never-served blobs age from when they were added
+    for digest in sorted(db["blobs"], key=lambda d: db["blobs"][d]["last_served"] or db["blobs"][d]["added"]):
+        if used <= quota_bytes:
+            break
+        if digest in removed or digest not in db["blobs"]:
+            continue
+        # Shards of a split model only make sense together: they go (or stay) as one
+        group = {find_digest(db, name) for name in db["blobs"][digest]["names"] for name in model_set(db, name)}
+        group = [d for d in group if d and d in db["blobs"]] or [digest]
+        if pinned.intersection(group):
+            continue
+        for victim in group:
+            blob = db["blobs"][victim]
+            used -= blob["size"]
+            removed.append(victim)
+            console.print(f"[yellow][Store] GC {', '.join(Path(n).name for n in blob['names']) or victim[:12]} "
+                          f"({format_size(blob['size'])})[/yellow]")
+            if dry_run:
+                continue
+            for name in blob["names"]:
+                with contextlib.suppress(FileNotFoundError):
+                    os.unlink(name)
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(blob_path(victim, blob_dir))
+            _forget_names(db, blob["names"])
+            del db["blobs"][victim]
+    if used > quota_bytes:
+        console.print(f"[yellow][Store] Still {format_size(used)} used (quota {format_size(quota_bytes)}); "
+                      f"what's left is pinned.[/yellow]")
+    return removed
+
+
+def _forget_names(db, names):
+    """Drop model DB entries that pointed at deleted names (so the next run re-downloads)"""
+    names = set(names)
+    for repo in db["models"].values():
+        files = repo.get("files", {})
+        for file_name in [f for f, p in files.items() if p in names]:
+            del files[file_name]
+        sets = repo.get("sets", {})
+        for first in [f for f, paths in sets.items() if names.intersection(paths)]:
+            del sets[first]
+    # Staged copies of deleted files are dead weight too
+    with contextlib.suppress(OSError):
+        cache = StagingCache()
+        for name in names:
+            cache.evict(name)
+
+
+def adopt(db, blob_dir=BLOB_DIR):
+    """Ingest files the model DB lists that predate the store. Returns how many."""
+    count = 0
+    for repo in db["models"].values():
+        for path in repo.get("files", {}).values():
+            if Path(path).is_file() and not find_digest(db, path):
+                ingest(db, path, blob_dir)
+                count += 1
+    return count
+# FINISH ### BLOB STORE ###
+
+# START ### CLI ###
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Content-addressed model store: dedupe, usage stats, quota GC")
+    parser.add_argument("--registry", default=str(REGISTRY_PATH))
+    parser.add_argument("--blob-dir", default=str(BLOB_DIR))
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="Show stored blobs, least recently served first")
+    sub.add_parser("adopt", help="Move files already in the model DB into the store")
+    gc = sub.add_parser("gc", help="Delete least-recently-served models until under quota")
+    gc.add_argument("--quota-gb", type=float, default=float(STORE_QUOTA_GB) if STORE_QUOTA_GB else None)
+    gc.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args(argv)
+
+    db = load_registry(args.registry)
+    if args.command == "adopt":
+        count = adopt(db, args.blob_dir)
+        save_registry(db, args.registry)
+        console.print(f"[green]✓ Adopted {count} file(s); store holds {format_size(store_usage(db))}[/green]")
+        return 0
+
+    if args.command == "gc":
+        if args.quota_gb is None:
+            parser.error("gc needs --quota-gb or MODEL_STORE_QUOTA_GB")
+        removed = collect_garbage(db, int(args.quota_gb * 1024**3), blob_dir=args.blob_dir, dry_run=args.dry_run)
+        if not args.dry_run:
+            save_registry(db, args.registry)
+        console.print(f"[green]✓ {'Would remove' if args.dry_run else 'Removed'} {len(removed)} blob(s); "
+                      f"store holds {format_size(store_usage(db))}[/green]")
+        return 0
+
+    table = Table(title=f"Model store ({format_size(store_usage(db))})", border_style="cyan")
+    for column in ("Digest", "Size", "Served", "Last served", "Names"):
+        table.add_column(column)
+    for digest, blob in sorted(db["blobs"].items(), key=lambda item: item[1]["last_served"] or item[1]["added"]):
+        last = time.strftime("%Y-%m-%d %H:%M", time.localtime(blob["last_served"])) if blob["last_served"] else "never"
+        marker = " (serving)" if digest in (db.get("serving") or []) else ""
+        table.add_row(digest[:12] + marker, format_size(blob["size"]), str(blob.get("serve_count", 0)), last,
+                      "\n".join(blob["names"]))
+    console.print(table)
+    return 0
+# FINISH ### CLI ###
+
+# START ### SCRIPT RUNNER ###
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        sys.exit(130)
+    except Exception as e:
+        console.print(f"[red][Store] Error: {str(e)}[/red]")
+        sys.exit(1)
+# FINISH ### SCRIPT RUNNER ###
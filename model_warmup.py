@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+
+# START ### IMPORTS ###
+import os
+import re
+import sys
+import json
+import time
+import mmap
+import ctypes
+import ctypes.util
+import argparse
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from rich.console import Console
+import gguf_file
+# FINISH ### IMPORTS ###
+
+# START ### CONSOLE SETUP ###
+console = Console()
+# FINISH ### CONSOLE SETUP ###
+
+# START ### CONFIGURATION ###
+SERVER_CONFIG = Path("/app/config/server.json")
+SERVER_SCRIPT = Path("/app/scripts/run_server.sh")
+CHUNK_SIZE = 64 * 1024 * 1024   # Big sequential reads, one per fadvise/pread
+READERS = 4                     # Parallel readers; NVMe likes a few, spinning disks don't care
+SKIP_RESIDENT_PERCENT = 95.0    # Already this much in page cache -> nothing to do
+MEMORY_HEADROOM = 0.9           # Never try to cache more than this share of MemAvailable
+PAGE_SIZE = mmap.PAGESIZE
+# FINISH ### CONFIGURATION ###
+
+# START ### MODEL PATH ###
+def find_model_path(config_path=SERVER_CONFIG, script_path=SERVER_SCRIPT):
+    """Model the server is about to load: server.json first, else the --model in run_server.sh."""
+    try:
+        with open(config_path) as f:
+            model_path = json.load(f).get("model_path")
+        if model_path and Path(model_path).exists():
+            return Path(model_path)
+    except (OSError, ValueError):
+        pass
+    try:
+        match = re.search(r"--model['\"]?\s+['\"]?([^'\"\s]+)", Path(script_path).read_text())
+        if match and Path(match.group(1)).exists():
+            return Path(match.group(1))
+    except OSError:
+        pass
+    return None
+# FINISH ### MODEL PATH ###
+
+# START ### PAGE CACHE RESIDENCY ###
+_libc = None
+
+def _load_libc():
+    global _libc
+    if _libc is None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.mmap.restype = ctypes.c_void_p
+        libc.mmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_long]
+        libc.munmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+        libc.mincore.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_char_p]
+        _libc = libc
+    return _libc
+
+
+def resident_bytes(path, ranges=None, window=1024 * 1024 * 1024):
+    """
+    Bytes of the file (or just these (offset, length) ranges) sitting in the
+    page cache, via mincore() on a throwaway read-only mapping. Maps a window
+    at a time so a 26 GB file doesn't need a 26 GB mapping. None if the
+    platform won't tell us.
+    """
+    try:
+        libc = _load_libc()
+    except OSError:
+        return None
+    size = os.path.getsize(path)
+    ranges = ranges or [(0, size)]
+    resident = 0
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        for start, length in ranges:
+            end = min(start + length, size)
+            position = start - start % PAGE_SIZE
+            while position < end:
+                span = min(window, end - position)
+                address = libc.mmap(None, span, mmap.PROT_READ, mmap.MAP_SHARED, fd, position)
+                if address in (None, ctypes.c_void_p(-1).value):
+                    return None
+                try:
+                    pages = (span + PAGE_SIZE - 1) // PAGE_SIZE
+                    vector = ctypes.create_string_buffer(pages)
+                    if libc.mincore(address, span, vector) != 0:
+                        return None
+                    resident += sum(1 for flag in vector.raw if flag & 1) * PAGE_SIZE
+                finally:
+                    libc.munmap(address, span)
+                position += span
+    finally:
+        os.close(fd)
+    return min(resident, sum(length for _, length in ranges))
+
+
+def available_memory():
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+# FINISH ### PAGE CACHE RESIDENCY ###
+
+# START ### WARMUP ###
+def warm_ranges(path, pieces, readers=READERS, advise_only=False, progress=None):
+    """
+    Pull the pieces into page cache. Each reader fadvises WILLNEED on its
+    piece, then preads it into a reused buffer (pread drops the GIL, so the
+    readers really do overlap). advise_only just queues the readahead.
+    Returns bytes read.
+    """
+    fd = os.open(path, os.O_RDONLY)
+    total = [0]
+    lock = threading.Lock()
+    local = threading.local()
+    try:
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+
+        def warm(piece):
+            offset, length = piece
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(fd, offset, length, os.POSIX_FADV_WILLNEED)
+            if advise_only:
+                return
+            if not hasattr(local, "buffer") or len(local.buffer) < length:
+                local.buffer = bytearray(length)
+            view = memoryview(local.buffer)
+            done = 0
+            while done < length:
+                count = os.preadv(fd, [view[done:length]], offset + done)
+                if count <= 0:
+                    break
+                done += count
+            with lock:
+                total[0] += done
+                if progress:
+                    progress(total[0])
+
+        with ThreadPoolExecutor(max_workers=readers) as pool:
+            list(pool.map(warm, pieces))
+    finally:
+        os.close(fd)
+    return total[0]
+
+
+def warmup(model_path, readers=READERS, chunk_size=CHUNK_SIZE, force=False, advise_only=False):
+    """Warm one model. Returns a report dict."""
+    model_path = Path(model_path)
+    try:
+        gguf = gguf_file.read_gguf(model_path)
+        # Header + metadata first (tiny), then the tensor data in file order
+        pieces = [(0, gguf.data_offset)] + gguf.data_ranges(chunk_size)
+    except ValueError:
+        size = model_path.stat().st_size # Not GGUF after all; warm the whole file
+        pieces = [(offset, min(chunk_size, size - offset)) for offset in range(0, size, chunk_size)]
+    total = sum(length for _, length in pieces)
+
+    before = resident_bytes(model_path, pieces)
+    before_pct = 100.0 * before / total if before is not None and total else None
+    report = {"model": str(model_path), "bytes": total, "resident_before": round(before_pct, 1) if before_pct is not None else None}
+    if before_pct is not None and before_pct >= SKIP_RESIDENT_PERCENT and not force:
+        report.update(skipped=True, resident_after=report["resident_before"])
+        return report
+
+    budget = available_memory()
+    if budget is not None and total > budget * MEMORY_HEADROOM:
+        # Caching more than fits just evicts what we read first
+        keep = int(budget * MEMORY_HEADROOM)
+        trimmed, used = [], 0
+        for offset, length in pieces:
+            if used >= keep:
+                break
+            trimmed.append((offset, min(length, keep - used)))
+            used += trimmed[-1][1]
+        console.print(f"[yellow]Model is {total / 1024**3:.1f} GB but only {budget / 1024**3:.1f} GB is available; "
+                      f"warming the first {used / 1024**3:.1f} GB.[/yellow]")
+        pieces = trimmed
+
+    started = time.monotonic()
+    read = warm_ranges(model_path, pieces, readers=readers, advise_only=advise_only)
+    elapsed = time.monotonic() - started
+    after = resident_bytes(model_path, pieces)
+    report.update(
+        skipped=False,
+        bytes_read=read,
+        seconds=round(elapsed, 2),
+        gb_per_second=round(read / elapsed / 1e9, 2) if elapsed > 0 and read else None,
+        resident_after=round(100.0 * after / total, 1) if after is not None and total else None,
+    )
+    return report
+# FINISH ### WARMUP ###
+
+# START ### MAIN FUNCTION ###
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pull the GGUF model into page cache before the LLM server starts")
+    parser.add_argument("model", nargs="?", help="Model file (default: from server.json / run_server.sh)")
+    parser.add_argument("--readers", type=int, default=READERS)
+    parser.add_argument("--chunk-mb", type=int, default=CHUNK_SIZE // (1024 * 1024))
+    parser.add_argument("--force", action="store_true", help="Warm even if it looks cached already")
+    parser.add_argument("--advise-only", action="store_true", help="Only fadvise(WILLNEED), don't wait on the reads")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args(argv)
+
+    model_path = Path(args.model) if args.model else find_model_path()
+    if not model_path or not model_path.exists():
+        console.print("[yellow][Warmup] No model file found, skipping.[/yellow]")
+        return 0
+
+    # A split model gets every shard warmed, not just the one the server is pointed at
+    shards = [path for path in gguf_file.split_files(model_path) if path.exists()]
+    console.print(f"[cyan][Warmup] Warming {model_path}{f' (+{len(shards) - 1} shards)' if len(shards) > 1 else ''} "
+                  f"with {args.readers} readers...[/cyan]")
+    reports = [warmup(path, args.readers, args.chunk_mb * 1024 * 1024, args.force, args.advise_only) for path in shards]
+    if args.json:
+        print(json.dumps(reports[0] if len(reports) == 1 else reports))
+        return 0
+
+    def pct(value):
+        return f"{value:.1f}%" if value is not None else "unknown"
+
+    for report in reports:
+        name = Path(report["model"]).name
+        if report["skipped"]:
+            console.print(f"[green][Warmup] {name}: already {pct(report['resident_before'])} resident in page cache, skipping.[/green]")
+        else:
+            speed = f"{report['gb_per_second']:.2f} GB/s" if report["gb_per_second"] else "n/a"
+            console.print(f"[green][Warmup] {name}: read {report['bytes_read'] / 1024**3:.1f} GB in {report['seconds']:.1f}s "
+                          f"({speed}). Resident: {pct(report['resident_before'])} -> {pct(report['resident_after'])}[/green]")
+    return 0
+# FINISH ### MAIN FUNCTION ###
+
+# START ### SCRIPT RUNNER ###
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        sys.exit(130)
+    except Exception as e:
+        console.print(f"[red][Warmup] Error: {str(e)}[/red]")
+        sys.exit(1)
+# FINISH ### SCRIPT RUNNER ###
@@ -4,7 +4,7 @@ from rich.prompt import Prompt
 import subprocess
 import random
 from pathlib import Path
-import time
+from steps import DEPLOY_DIR, StepGraph, script_step
 
 console = Console()
 
@@ -30,43 +30,32 @@ def print_header():
     ╚══════════════════════════════════════╝
     """, style="magenta", justify="center")
 
+def llm_steps(after=()):
+    """Steps shared by both flows. `after` gates the spin on extra upstream steps."""
+    return [
+        script_step("input_info", "INPUT INFO", "custom/input_info.sh", cache=False),
+        script_step("create_custom", "CREATE CUSTOM", "custom/create_custom.sh", deps=["input_info"]),
+        script_step("verify", "VERIFY", "custom/verify_custom.sh", deps=["create_custom"]),
+        # Model download only needs the model info, so it runs alongside the custom/install steps
+        script_step("get_model", "GET MODEL", "spin/get.model.py", deps=["input_info"],
+                    inputs=[DEPLOY_DIR / "config" / "model_info.json"]),
+        script_step("spin", "SPIN BOLT", "spin/spin.bolt.sh", deps=["verify", "get_model", *after], detach=True),
+        script_step("expose", "EXPOSE", "spin/expose.bolt.sh", deps=["spin"], detach=True),
+        script_step("monitor", "MONITOR", "spin/monitor.sh", deps=["spin"], detach=True),
+    ]
+
 def fresh_install():
     """Fresh install flow"""
-    scripts = [
-        ("scratch/install_bolt.sh", "INSTALL"),
-        ("scratch/dependencies.sh", "DEPENDENCIES"),
-        ("custom/input_info.sh", "INPUT INFO"),
-        ("custom/create_custom.sh", "CREATE CUSTOM"),
-        ("custom/verify_custom.sh", "VERIFY"),
-        ("spin/get.model.py", "GET MODEL"),
-        ("spin/spin.bolt.sh", "SPIN BOLT"),
-        ("spin/expose.bolt.sh", "EXPOSE"),
-        ("spin/monitor.sh", "MONITOR")
+    steps = [
+        script_step("install", "INSTALL", "scratch/install_bolt.sh"),
+        script_step("dependencies", "DEPENDENCIES", "scratch/dependencies.sh", deps=["install"]),
+        *llm_steps(after=["dependencies"]),
     ]
-    
-    for script, title in scripts:
-        console.print(f"\n[cyan]Launching {title}...[/cyan]")
-        time.sleep(1)
-        subprocess.run(['xfce4-terminal', f'--title={title}', 
-                       f'--command=bash /home/flintx/deploy.bolt/{script}'])
+    StepGraph(steps).run()
 
 def add_new_llm():
     """Add new LLM flow"""
-    scripts = [
-        ("custom/input_info.sh", "INPUT INFO"),
-        ("custom/create_custom.sh", "CREATE CUSTOM"),
-        ("custom/verify_custom.sh", "VERIFY"),
-        ("spin/get.model.py", "GET MODEL"),
-        ("spin/spin.bolt.sh", "SPIN BOLT"),
-        ("spin/expose.bolt.sh", "EXPOSE"),
-        ("spin/monitor.sh", "MONITOR")
-    ]
-    
-    for script, title in scripts:
-        console.print(f"\n[cyan]Launching {title}...[/cyan]")
-        time.sleep(1)
-        subprocess.run(['xfce4-terminal', f'--title={title}', 
-                       f'--command=bash /home/flintx/deploy.bolt/{script}'])
+    StepGraph(llm_steps()).run()
 
 def use_existing():
     """Use existing setup flow"""
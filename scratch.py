@@ -1,7 +1,12 @@
 import os
-import subprocess
 import sys
+import json
 import time
+import shutil
+import hashlib
+import subprocess
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from rich import print
 from rich.console import Console
 from rich.panel import Panel
@@ -16,53 +21,163 @@ def run_command(command, shell=True):
     except subprocess.CalledProcessError:
         return False
 
-def check_node_installation():
+# Where setup remembers it already got Node/pnpm working
+ENV_STATE_FILE = Path.home() / ".local" / "share" / "deploy_bolt_env.json"
+# Drop node-v*-linux-x64.tar.xz and pnpm-linuxstatic-x64 (or pnpm-*.tgz) in here
+# to provision boxes that have no network
+OFFLINE_MIRROR = Path(os.environ.get("BOLT_OFFLINE_MIRROR", Path.home() / "deploy.bolt" / "mirror"))
+LOCAL_PREFIX = Path.home() / ".local"
+TOOLS = ("node", "pnpm")
+
+def probe_tool(tool):
+    """Return the tool's --version output, or None if it's missing/broken"""
+    try:
+        return subprocess.check_output([tool, '--version'], stderr=subprocess.STDOUT, timeout=30).decode().strip()
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired, FileNotFoundError):
+        return None
+
+def probe_tools():
+    """Run all the version probes at once instead of one after another"""
+    with ThreadPoolExecutor(max_workers=len(TOOLS)) as pool:
+        return dict(zip(TOOLS, pool.map(probe_tool, TOOLS)))
+
+def environment_fingerprint():
+    """
+    Hash of PATH plus where each tool resolves to and that binary's size/mtime.
+    No subprocesses, so checking it costs next to nothing. Upgrading, removing
+    or shadowing a tool changes the fingerprint and forces a real probe.
+    """
+    digest = hashlib.sha256(os.environ.get("PATH", "").encode())
+    for tool in TOOLS:
+        location = shutil.which(tool)
+        digest.update(f"|{tool}={location}".encode())
+        if location:
+            stat = os.stat(os.path.realpath(location))
+            digest.update(f":{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()
+
+def load_env_state():
     try:
-        # Check if Node.js is installed
-        node_version = subprocess.check_output(['node', '--version'], stderr=subprocess.STDOUT).decode().strip()
-        print(f"[green]Node.js {node_version} is installed[/green]")
+        with open(ENV_STATE_FILE) as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+def save_env_state(versions):
+    ENV_STATE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    state = {"fingerprint": environment_fingerprint(), "versions": versions, "verified_at": time.time()}
+    tmp = ENV_STATE_FILE.with_suffix(".tmp")
+    with open(tmp, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, ENV_STATE_FILE)
+
+def use_local_prefix():
+    """Put ~/.local/bin first on PATH for this process and anything it starts"""
+    local_bin = str(LOCAL_PREFIX / "bin")
+    if local_bin not in os.environ.get("PATH", "").split(os.pathsep):
+        os.environ["PATH"] = local_bin + os.pathsep + os.environ.get("PATH", "")
+
+def install_node_from_mirror():
+    """Unpack a Node.js release tarball into ~/.local. No sudo, no network."""
+    tarballs = sorted(OFFLINE_MIRROR.glob("node-v*-linux-x64.tar.*"))
+    if not tarballs:
+        return False
+    tarball = tarballs[-1]
+    print(f"[yellow]Installing Node.js from mirror: {tarball.name}[/yellow]")
+    target = LOCAL_PREFIX / "lib" / "nodejs"
+    target.mkdir(parents=True, exist_ok=True)
+    if not run_command(["tar", "-xf", str(tarball), "-C", str(target), "--strip-components=1"], shell=False):
+        return False
+    bin_dir = LOCAL_PREFIX / "bin"
+    bin_dir.mkdir(parents=True, exist_ok=True)
+    for binary in (target / "bin").iterdir():
+        link = bin_dir / binary.name
+        if link.is_symlink() or link.exists():
+            link.unlink()
+        link.symlink_to(binary)
+    use_local_prefix()
+    return True
+
+def install_pnpm_from_mirror():
+    """Standalone pnpm binary if the mirror has one, else the npm package tarball"""
+    standalone = sorted(OFFLINE_MIRROR.glob("pnpm-linuxstatic-x64*")) + sorted(OFFLINE_MIRROR.glob("pnpm-linux-x64*"))
+    if standalone:
+        print(f"[yellow]Installing pnpm from mirror: {standalone[0].name}[/yellow]")
+        bin_dir = LOCAL_PREFIX / "bin"
+        bin_dir.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(standalone[0], bin_dir / "pnpm")
+        os.chmod(bin_dir / "pnpm", 0o755)
+        use_local_prefix()
         return True
-    except (subprocess.CalledProcessError, FileNotFoundError):
+    packages = sorted(OFFLINE_MIRROR.glob("pnpm-*.tgz"))
+    if packages:
+        print(f"[yellow]Installing pnpm from mirror: {packages[-1].name}[/yellow]")
+        use_local_prefix()
+        return run_command(["npm", "install", "-g", "--offline", "--prefix", str(LOCAL_PREFIX), str(packages[-1])], shell=False)
+    return False
+
+def install_node():
+    if install_node_from_mirror():
+        return True
+    if not run_command("curl -fsSL https://deb.nodesource.com/setup_20.x | sudo -E bash -"):
+        print("[bold red]Failed to add Node.js repository[/bold red]")
+        return False
+    if not run_command("sudo apt-get install -y nodejs"):
+        print("[bold red]Failed to install Node.js[/bold red]")
         return False
+    return True
 
-def check_pnpm_installation():
-    try:
-        # Check if pnpm is installed
-        pnpm_version = subprocess.check_output(['pnpm', '--version'], stderr=subprocess.STDOUT).decode().strip()
-        print(f"[green]pnpm {pnpm_version} is installed[/green]")
+def install_pnpm():
+    if install_pnpm_from_mirror():
         return True
-    except (subprocess.CalledProcessError, FileNotFoundError):
+    if not run_command("sudo npm install -g pnpm"):
+        print("[bold red]Failed to install pnpm[/bold red]")
         return False
+    return True
 
 def setup_environment():
     print("[bold green]Setting up environment...[/bold green]")
 
-    with console.status("[bold yellow]Checking Node.js installation...", spinner="dots"):
-        if not check_node_installation():
-            print("[yellow]Installing Node.js...[/yellow]")
-            if not run_command("curl -fsSL https://deb.nodesource.com/setup_20.x | sudo -E bash -"):
-                print("[bold red]Failed to add Node.js repository[/bold red]")
-                return False
-            if not run_command("sudo apt-get install -y nodejs"):
-                print("[bold red]Failed to install Node.js[/bold red]")
-                return False
-
-        # Verify Node.js installation
-        if not check_node_installation():
-            print("[bold red]Node.js installation verification failed[/bold red]")
+    # Anything we installed from the mirror lives here, so look there first
+    if (LOCAL_PREFIX / "bin").is_dir():
+        use_local_prefix()
+
+    state = load_env_state()
+    if state.get("fingerprint") == environment_fingerprint():
+        versions = state.get("versions", {})
+        print(f"[green]Node.js {versions.get('node')} / pnpm {versions.get('pnpm')} already verified, nothing changed since.[/green]")
+        return True
+
+    with console.status("[bold yellow]Checking Node.js and pnpm...", spinner="dots"):
+        versions = probe_tools()
+
+    if not versions["node"]:
+        print("[yellow]Installing Node.js...[/yellow]")
+        if not install_node():
             return False
+        versions["node"] = probe_tool('node')
+        # Node from nodesource/mirror can come with pnpm via corepack, check again
+        versions["pnpm"] = versions["pnpm"] or probe_tool('pnpm')
 
-    with console.status("[bold yellow]Checking pnpm installation...", spinner="dots"):
-        if not check_pnpm_installation():
-            print("[yellow]Installing pnpm...[/yellow]")
-            if not run_command("sudo npm install -g pnpm"):
-                print("[bold red]Failed to install pnpm[/bold red]")
-                return False
+    # Verify Node.js installation
+    if not versions["node"]:
+        print("[bold red]Node.js installation verification failed[/bold red]")
+        return False
+    print(f"[green]Node.js {versions['node']} is installed[/green]")
 
-        # Verify pnpm installation
-        if not check_pnpm_installation():
-            print("[bold red]pnpm installation verification failed[/bold red]")
+    if not versions["pnpm"]:
+        print("[yellow]Installing pnpm...[/yellow]")
+        if not install_pnpm():
             return False
+        versions["pnpm"] = probe_tool('pnpm')
+
+    # Verify pnpm installation
+    if not versions["pnpm"]:
+        print("[bold red]pnpm installation verification failed[/bold red]")
+        return False
+    print(f"[green]pnpm {versions['pnpm']} is installed[/green]")
+
+    save_env_state(versions)
 
     # Final verification
     print("[bold green]✓ Node.js is properly installed[/bold green]")
@@ -77,6 +192,10 @@ def main():
         print("[bold red]Setup failed![/bold red]")
         sys.exit(1)
 
+    # When run as a step of the setup graph, launch.py schedules tokens.py itself
+    if "--no-handoff" in sys.argv:
+        return
+
     # Success animation
     with console.status("[bold green]Finalizing setup...", spinner="dots") as status:
         time.sleep(2)
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+
+# START ### IMPORTS ###
+import math
+import time
+import heapq
+import asyncio
+import itertools
+from collections import defaultdict, deque
+# FINISH ### IMPORTS ###
+
+# START ### CONFIGURATION ###
+# Lower number goes first. bolt.diy edits are interactive, tunnel users can wait, batch_infer.py soaks up the rest.
+SOURCE_PRIORITIES = {"bolt": 0, "local": 0, "validator": 1, "remote": 2, "batch": 3}
+# How long each source may sit in the queue before we'd rather say 429
+SOURCE_MAX_WAIT = {"bolt": 120.0, "local": 120.0, "validator": 60.0, "remote": 30.0, "batch": 600.0}
+DEFAULT_SOURCE = "remote"
+
+DEFAULT_MAX_TOKENS = 256       # What llama_cpp.server generates when max_tokens is missing-ish
+CHARS_PER_TOKEN = 4            # Rough prompt size estimate, good enough for budgeting
+INFLIGHT_TOKEN_BUDGET = 4096   # Two n_ctx 2048 requests' worth in flight at once
+MAX_CONCURRENT = 2
+MAX_QUEUE_DEPTH = 64
+INITIAL_COST_PER_SECOND = 20.0 # Cost units (prompt + max_tokens) cleared per second, until real requests teach us
+# FINISH ### CONFIGURATION ###
+
+# START ### COST ESTIMATE ###
+def estimate_prompt_tokens(payload):
+    """Rough prompt size of an OpenAI-style request body"""
+    if not isinstance(payload, dict):
+        return 0
+    prompt_chars = 0
+    for message in payload.get("messages") or []:
+        content = message.get("content") if isinstance(message, dict) else None
+        if isinstance(content, str):
+            prompt_chars += len(content)
+        elif isinstance(content, list): # Multi-part content
+            prompt_chars += sum(len(p.get("text", "")) for p in content if isinstance(p, dict))
+    prompt = payload.get("prompt")
+    if isinstance(prompt, str):
+        prompt_chars += len(prompt)
+    elif isinstance(prompt, list):
+        prompt_chars += sum(len(p) for p in prompt if isinstance(p, str))
+    embed_input = payload.get("input")
+    if isinstance(embed_input, str):
+        prompt_chars += len(embed_input)
+    return math.ceil(prompt_chars / CHARS_PER_TOKEN)
+
+
+def estimate_cost(payload, prompt_tokens=None):
+    """
+    Token cost of a request: prompt (counted if the caller has the real
+    number, estimated otherwise) plus the completion it's allowed to
+    generate. Used for budgeting, not billing.
+    """
+    if not isinstance(payload, dict):
+        return DEFAULT_MAX_TOKENS
+    max_tokens = payload.get("max_tokens")
+    if not isinstance(max_tokens, int) or max_tokens <= 0:
+        max_tokens = DEFAULT_MAX_TOKENS
+    return (prompt_tokens if prompt_tokens is not None else estimate_prompt_tokens(payload)) + max_tokens
+# FINISH ### COST ESTIMATE ###
+
+# START ### ADMISSION CONTROLLER ###
+class Shed(Exception):
+    """Request turned away. retry_after is whole seconds for the Retry-After header."""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = max(1, int(math.ceil(retry_after)))
+
+
+class Ticket:
+    __slots__ = ("source", "cost", "enqueued", "admitted", "deadline", "future")
+
+    def __init__(self, source, cost, enqueued, deadline, future):
+        self.source = source
+        self.cost = cost
+        self.enqueued = enqueued
+        self.admitted = None
+        self.deadline = deadline
+        self.future = future
+
+
+class AdmissionController:
+    """
+    Priority queue in front of the model server. A request gets in when a
+    slot is free and its token cost fits the in-flight budget; otherwise it
+    waits in (priority, arrival) order. Requests that can't be served before
+    their source's deadline are shed up front or when the deadline passes,
+    with a Retry-After based on measured throughput.
+    """
+
+    def __init__(self, token_budget=INFLIGHT_TOKEN_BUDGET, max_concurrent=MAX_CONCURRENT,
+                 max_queue=MAX_QUEUE_DEPTH, priorities=None, max_wait=None, clock=time.monotonic):
+        self.token_budget = token_budget
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.priorities = priorities or SOURCE_PRIORITIES
+        self.max_wait = max_wait or SOURCE_MAX_WAIT
+        self.clock = clock
+        self.queue = [] # (priority, seq, ticket)
+        self.seq = itertools.count()
+        self.active = 0
+        self.active_tokens = 0
+        self.cost_per_second = INITIAL_COST_PER_SECOND
+        self.waits = deque(maxlen=500)
+        self.counters = defaultdict(int)
+
+    def priority(self, source):
+        return self.priorities.get(source, self.priorities.get(DEFAULT_SOURCE, 99))
+
+    def _fits(self, ticket):
+        if self.active >= self.max_concurrent:
+            return False
+        # An oversized request still runs, just alone
+        return self.active == 0 or self.active_tokens + ticket.cost <= self.token_budget
+
+    def predicted_wait(self, priority):
+        """Seconds until a new request at this priority would likely start"""
+        ahead = self.active_tokens + sum(t.cost for p, _, t in self.queue if p <= priority)
+        if self.active < self.max_concurrent and not ahead:
+            return 0.0
+        return ahead / max(self.cost_per_second, 0.1)
+
+    async def acquire(self, source, cost):
+        """Wait for a slot. Raises Shed instead of waiting past the source's deadline."""
+        now = self.clock()
+        priority = self.priority(source)
+        max_wait = self.max_wait.get(source, self.max_wait.get(DEFAULT_SOURCE, 30.0))
+        ticket = Ticket(source, cost, now, now + max_wait, None)
+
+        self._expire()
+        if not self.queue and self._fits(ticket):
+            self._admit(ticket)
+            return ticket
+
+        if len(self.queue) >= self.max_queue:
+            self.counters["shed_queue_full"] += 1
+            raise Shed("Queue full", self.predicted_wait(priority))
+        predicted = self.predicted_wait(priority)
+        if predicted > max_wait:
+            self.counters["shed_predicted"] += 1
+            raise Shed("Predicted wait exceeds deadline", predicted)
+
+        ticket.future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.queue, (priority, next(self.seq), ticket))
+        try:
+            await asyncio.wait_for(asyncio.shield(ticket.future), timeout=max_wait)
+        except Shed:
+            self.counters["shed_deadline"] += 1 # Expired by _expire on our clock
+            raise
+        except asyncio.TimeoutError:
+            if self._admitted(ticket):
+                return ticket # Admitted in the same tick the deadline hit
+            self._drop(ticket)
+            self.counters["shed_deadline"] += 1
+            raise Shed("Deadline passed while queued", self.predicted_wait(priority))
+        except asyncio.CancelledError:
+            if self._admitted(ticket):
+                self.release(ticket) # Client went away right after getting in
+            else:
+                self._drop(ticket)
+            raise
+        return ticket
+
+    @staticmethod
+    def _admitted(ticket):
+        future = ticket.future
+        return future.done() and not future.cancelled() and future.exception() is None
+
+    def _admit(self, ticket):
+        ticket.admitted = self.clock()
+        self.active += 1
+        self.active_tokens += ticket.cost
+        self.waits.append(ticket.admitted - ticket.enqueued)
+        self.counters["admitted"] += 1
+        self.counters[f"admitted_{ticket.source}"] += 1
+
+    def _drop(self, ticket):
+        self.queue = [entry for entry in self.queue if entry[2] is not ticket]
+        heapq.heapify(self.queue)
+        if ticket.future and not ticket.future.done():
+            ticket.future.cancel()
+        self._pump()
+
+    def _expire(self):
+        """Shed queued tickets whose deadline has passed by our clock, before they hold up the head or the estimate"""
+        now = self.clock()
+        expired = [entry for entry in self.queue if not entry[2].future.done() and entry[2].deadline <= now]
+        if not expired:
+            return
+        self.queue = [entry for entry in self.queue if entry[2].deadline > now or entry[2].future.done()]
+        heapq.heapify(self.queue)
+        for priority, _, ticket in expired:
+            ticket.future.set_exception(Shed("Deadline passed while queued", self.predicted_wait(priority)))
+
+    def _pump(self):
+        """Admit from the head of the queue while it fits. Head-of-line on purpose: no starving big requests."""
+        self._expire()
+        while self.queue:
+            _, _, ticket = self.queue[0]
+            if ticket.future.done(): # Cancelled waiter
+                heapq.heappop(self.queue)
+                continue
+            if not self._fits(ticket):
+                return
+            heapq.heappop(self.queue)
+            self._admit(ticket)
+            ticket.future.set_result(True)
+
+    def release(self, ticket):
+        """
+        Give the slot back. Its cost over its run time feeds the throughput
+        estimate behind predicted waits; same units as the costs queued, so a
+        request that stops short of max_tokens just makes the rate look faster.
+        """
+        self.active -= 1
+        self.active_tokens -= ticket.cost
+        elapsed = self.clock() - (ticket.admitted or self.clock())
+        if elapsed > 0.05 and ticket.cost > 0:
+            self.cost_per_second = 0.8 * self.cost_per_second + 0.2 * (ticket.cost / elapsed)
+        self._pump()
+
+    def stats(self):
+        waits = sorted(self.waits)
+        depth = defaultdict(int)
+        for _, _, ticket in self.queue:
+            if not ticket.future.done():
+                depth[ticket.source] += 1
+        return {
+            "queue_depth": sum(depth.values()),
+            "queue_depth_by_source": dict(depth),
+            "active": self.active,
+            "active_tokens": self.active_tokens,
+            "cost_per_second_estimate": round(self.cost_per_second, 2),
+            "wait_avg": round(sum(waits) / len(waits), 3) if waits else None,
+            "wait_p95": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 3) if waits else None,
+            "wait_max": round(waits[-1], 3) if waits else None,
+            **self.counters,
+        }
+# FINISH ### ADMISSION CONTROLLER ###
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+
+# START ### IMPORTS ###
+import os
+import sys
+import json
+import time
+import threading
+from pathlib import Path
+from typing import NamedTuple
+
+# gguf_tokenizer.py lives at the top level next to gguf_file.py
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+import gguf_tokenizer
+# FINISH ### IMPORTS ###
+
+# START ### CONFIGURATION ###
+SERVER_CONFIG = Path(os.environ.get("PROXY_SERVER_CONFIG", "/app/config/server.json")) # model_path + n_ctx of what's live
+# trim: drop the oldest chat turns and clamp max_tokens until it fits. reject: 400 instead. off: pass everything.
+CONTEXT_POLICY = os.environ.get("PROXY_CONTEXT_POLICY", "trim")
+MIN_COMPLETION_TOKENS = int(os.environ.get("PROXY_MIN_COMPLETION_TOKENS", "256")) # Room a request must leave to answer in
+RELOAD_CHECK_INTERVAL = 5.0 # How often server.json is re-checked for a swapped model
+CHAT_PATH = "/v1/chat/completions"
+COMPLETIONS_PATH = "/v1/completions"
+EMBEDDINGS_PATH = "/v1/embeddings"
+# FINISH ### CONFIGURATION ###
+
+# START ### CONTEXT GUARD ###
+class Checked(NamedTuple):
+    payload: object         # What to forward (the original dict unless trimmed/clamped)
+    prompt_tokens: int      # None when we couldn't count (no tokenizer, odd payload)
+    trimmed_messages: int
+    clamped: bool
+    error: str              # Set: answer 400 with it instead of forwarding
+
+
+class ContextOverflow(Exception):
+    pass
+
+
+class ContextGuard:
+    """
+    Counts prompt tokens with the live model's own tokenizer before a request
+    is forwarded, so an oversize bolt.diy conversation is fixed or refused in
+    the proxy instead of failing after the backend has burned the prefill.
+    The tokenizer follows server.json, so it swaps with the model.
+    """
+
+    def __init__(self, config_path=SERVER_CONFIG, policy=CONTEXT_POLICY, min_completion=MIN_COMPLETION_TOKENS):
+        self.config_path = Path(config_path)
+        self.policy = policy
+        self.min_completion = min_completion
+        self.tokenizer = None
+        self.n_ctx = None
+        self._config_mtime = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """
+        (tokenizer, n_ctx) for the model server.json names, reloaded when it
+        changes. (None, None) if unusable; that's remembered for the check
+        interval too, so an unsupported vocab isn't re-parsed per request.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._checked_at is not None and now - self._checked_at < RELOAD_CHECK_INTERVAL:
+                return self.tokenizer, self.n_ctx
+            self._checked_at = now
+            try:
+                mtime = self.config_path.stat().st_mtime_ns
+                if mtime != self._config_mtime:
+                    config = json.loads(self.config_path.read_text())
+                    self.tokenizer = gguf_tokenizer.load_tokenizer(config["model_path"])
+                    self.n_ctx = int(config.get("n_ctx") or 2048)
+                    self._config_mtime = mtime
+            except (OSError, ValueError, KeyError, TypeError):
+                self.tokenizer, self.n_ctx, self._config_mtime = None, None, None
+            return self.tokenizer, self.n_ctx
+
+    def count(self, path, payload, tokenizer=None):
+        """Prompt tokens the backend will see for this request, or None if it isn't one we can count"""
+        tokenizer = tokenizer or self.load()[0]
+        if not tokenizer or not isinstance(payload, dict):
+            return None
+        if path == CHAT_PATH and isinstance(payload.get("messages"), list):
+            messages = [{**m, "content": gguf_tokenizer.message_text(m.get("content"))} for m in payload["messages"] if isinstance(m, dict)]
+            return tokenizer.count_chat_tokens(messages)
+        if path == COMPLETIONS_PATH and isinstance(payload.get("prompt"), str):
+            return tokenizer.count_tokens(payload["prompt"])
+        if path == EMBEDDINGS_PATH and isinstance(payload.get("input"), str):
+            return tokenizer.count_tokens(payload["input"])
+        return None
+
+    def check(self, path, payload):
+        """Fit the request into n_ctx per the policy. Never raises; worst case it passes the request through untouched."""
+        try:
+            return self._check(path, payload)
+        except Exception: # A tokenizer or template bug must not take traffic down
+            return Checked(payload, None, 0, False, None)
+
+    def _check(self, path, payload):
+        tokenizer, n_ctx = self.load()
+        try:
+            prompt_tokens = self.count(path, payload, tokenizer)
+        except Exception: # A tokenizer bug must not take traffic down
+            prompt_tokens = None
+        if prompt_tokens is None or self.policy == "off":
+            return Checked(payload, prompt_tokens, 0, False, None)
+        if path == EMBEDDINGS_PATH:
+            error = None if prompt_tokens <= n_ctx else _overflow_message(n_ctx, prompt_tokens, 0)
+            return Checked(payload, prompt_tokens, 0, False, error)
+
+        max_tokens = payload.get("max_tokens")
+        max_tokens = max_tokens if isinstance(max_tokens, int) and max_tokens > 0 else None
+        reserve = min(max_tokens or self.min_completion, self.min_completion)
+        trimmed = 0
+        if prompt_tokens + reserve > n_ctx:
+            if self.policy != "trim" or path != CHAT_PATH:
+                return Checked(payload, prompt_tokens, 0, False, _overflow_message(n_ctx, prompt_tokens, reserve))
+            try:
+                payload, prompt_tokens, trimmed = self._trim(payload, tokenizer, n_ctx - reserve)
+            except ContextOverflow:
+                return Checked(payload, prompt_tokens, 0, False, _overflow_message(n_ctx, prompt_tokens, reserve))
+
+        clamped = False
+        if max_tokens and prompt_tokens + max_tokens > n_ctx:
+            if self.policy != "trim":
+                return Checked(payload, prompt_tokens, trimmed, False, _overflow_message(n_ctx, prompt_tokens, max_tokens))
+            payload = {**payload, "max_tokens": n_ctx - prompt_tokens}
+            clamped = True
+        return Checked(payload, prompt_tokens, trimmed, clamped, None)
+
+    def _trim(self, payload, tokenizer, budget):
+        """
+        Drop the oldest turns until the prompt fits budget. A turn is a user
+        message plus the replies up to the next one, so what's left still
+        alternates the way chat templates insist on. System messages and the
+        last turn always stay. Raises ContextOverflow if even that isn't
+        enough, or if the trimmed conversation can't be counted.
+        """
+        messages = payload["messages"]
+        system = [i for i, m in enumerate(messages) if isinstance(m, dict) and m.get("role") == "system"]
+        turns = []
+        for i, message in enumerate(messages):
+            if i in system:
+                continue
+            if not turns or (isinstance(message, dict) and message.get("role") == "user"):
+                turns.append([])
+            turns[-1].append(i)
+        dropped = set()
+        for turn in turns[:-1]:
+            dropped.update(turn)
+            trimmed_payload = {**payload, "messages": [m for i, m in enumerate(messages) if i not in dropped]}
+            try:
+                prompt_tokens = self.count(CHAT_PATH, trimmed_payload, tokenizer)
+            except Exception: # Template raise_exception and friends: refuse rather than guess
+                raise ContextOverflow()
+            if prompt_tokens is not None and prompt_tokens <= budget:
+                return trimmed_payload, prompt_tokens, len(dropped)
+        raise ContextOverflow()
+
+
+def _overflow_message(n_ctx, prompt_tokens, completion_tokens):
+    return (f"This model's maximum context length is {n_ctx} tokens. However, you requested "
+            f"{prompt_tokens + completion_tokens} tokens ({prompt_tokens} in the prompt, "
+            f"{completion_tokens} in the completion). Please reduce the length of the messages or completion.")
+# FINISH ### CONTEXT GUARD ###
@@ -50,8 +50,9 @@ export default class MixtralLocalProvider extends BaseProvider {
    providerSettings?: Record;
  }): LanguageModelV1 {
    const openai = createOpenAI({
-     baseURL: 'http://localhost:8080/v1',
+     baseURL: 'http://localhost:8081/v1',
      apiKey: 'not-needed',
+     headers: { 'X-LLM-Source': 'bolt' },
    });
 
     return openai(options.model);
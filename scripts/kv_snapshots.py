@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+
+# START ### IMPORTS ###
+import os
+import sys
+import json
+import time
+import pickle
+import hashlib
+import argparse
+from pathlib import Path
+from rich.console import Console
+from rich.table import Table
+# FINISH ### IMPORTS ###
+
+# START ### CONSOLE SETUP ###
+console = Console(stderr=True) # stdout belongs to llama_cpp.server when we run inside it
+# FINISH ### CONSOLE SETUP ###
+
+# START ### CONFIGURATION ###
+PREFIX_FILE = Path(os.environ.get("KV_PREFIX_FILE", "/app/config/kv_prefixes.json"))
+# On the models volume so snapshots outlive the container
+SNAPSHOT_DIR = Path(os.environ.get("KV_SNAPSHOT_DIR", "/home/flintx/models/.kv"))
+MIN_MATCH_TOKENS = 32        # Shorter shared prefixes aren't worth a state load
+FINGERPRINT_HEAD = 16 * 1024 * 1024
+FINGERPRINT_TAIL = 1024 * 1024
+# FINISH ### CONFIGURATION ###
+
+# START ### KEYS ###
+def model_fingerprint(model_path):
+    """
+    Cheap stand-in for hashing a 26 GB file: size + GGUF header/metadata
+    region + the tail. Different quant, re-download with other bytes, or a
+    different model all change it.
+    """
+    path = Path(model_path)
+    sha = hashlib.sha256(str(path.stat().st_size).encode())
+    with open(path, "rb") as f:
+        sha.update(f.read(FINGERPRINT_HEAD))
+        f.seek(max(0, path.stat().st_size - FINGERPRINT_TAIL))
+        sha.update(f.read())
+    return sha.hexdigest()
+
+
+def model_key(model_path, n_ctx, version=None):
+    """A KV snapshot is only valid for the same weights, context size and llama.cpp state format"""
+    if version is None:
+        import llama_cpp
+        version = llama_cpp.__version__
+    return hashlib.sha256(f"{model_fingerprint(model_path)}|{n_ctx}|{version}".encode()).hexdigest()[:16]
+
+
+def prefix_key(text):
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+
+def load_prefixes(path=PREFIX_FILE):
+    """[{"name", "text"}] registered in kv_prefixes.json. text is the prompt start exactly as the server renders it."""
+    try:
+        with open(path) as f:
+            prefixes = json.load(f).get("prefixes", [])
+    except (OSError, ValueError):
+        return []
+    loaded = []
+    for entry in prefixes:
+        text = entry.get("text")
+        if not text and entry.get("file"):
+            text = (Path(path).parent / entry["file"]).read_text()
+        if text:
+            loaded.append({"name": entry.get("name") or prefix_key(text), "text": text})
+    return loaded
+# FINISH ### KEYS ###
+
+# START ### SNAPSHOT STORE ###
+def token_prefix_length(a, b):
+    length = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        length += 1
+    return length
+
+
+class SnapshotStore:
+    """<dir>/<model key>/<prefix key>.state (pickled LlamaState) + index.json with sizes and timings."""
+
+    def __init__(self, directory=SNAPSHOT_DIR, key=None):
+        self.directory = Path(directory) / key
+        self.index_path = self.directory / "index.json"
+
+    def index(self):
+        try:
+            with open(self.index_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_index(self, index):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.index_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+    def path(self, pkey):
+        return self.directory / f"{pkey}.state"
+
+    def save(self, pkey, name, state, tokens, prefill_seconds):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path(pkey).with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path(pkey))
+        index = self.index()
+        index[pkey] = {
+            "name": name, "tokens": len(tokens), "bytes": self.path(pkey).stat().st_size,
+            "prefill_seconds": round(prefill_seconds, 3), "created": time.time(),
+        }
+        self._write_index(index)
+
+    def load(self, pkey):
+        with open(self.path(pkey), "rb") as f:
+            return pickle.load(f)
+
+
+def _cache_base():
+    try:
+        from llama_cpp.llama_cache import BaseLlamaCache # 0.2.4x and later
+    except ImportError:
+        from llama_cpp.llama import BaseLlamaCache
+    return BaseLlamaCache
+
+
+def make_cache(states, min_match=MIN_MATCH_TOKENS):
+    """
+    A llama_cpp cache over restored prefix snapshots. Llama asks it for the
+    state sharing the longest token prefix with each prompt and loads it when
+    that beats what's already in the context. It's lookup-only: states Llama
+    hands back after a request are dropped (the live context already covers
+    back-to-back reuse), and skip_cache_saves() keeps Llama from building
+    them in the first place. save_pending is how it tells: Llama looks the
+    prompt up before generating and saves state after, nothing in between.
+    """
+    base = _cache_base()
+
+    class PrefixSnapshotCache(base):
+        def __init__(self):
+            super().__init__(capacity_bytes=sum(s.llama_state_size for s in states.values()) or 1)
+            self.states = states # prefix key -> LlamaState
+            self.hits = 0
+            self.misses = 0
+            self.save_pending = False # A lookup opened a completion; its closing save_state is ours to skip
+
+        @property
+        def cache_size(self):
+            return sum(s.llama_state_size for s in self.states.values())
+
+        def _find_longest_prefix_key(self, key):
+            best, best_length = None, 0
+            for pkey, state in self.states.items():
+                length = token_prefix_length(state.input_ids.tolist(), key)
+                if length > best_length:
+                    best, best_length = pkey, length
+            return best if best_length >= min_match else None
+
+        def __getitem__(self, key):
+            self.save_pending = True
+            pkey = self._find_longest_prefix_key(list(key))
+            if pkey is None:
+                self.misses += 1
+                raise KeyError("No registered prefix matches")
+            self.hits += 1
+            return self.states[pkey]
+
+        def __contains__(self, key):
+            return self._find_longest_prefix_key(list(key)) is not None
+
+        def __setitem__(self, key, value):
+            self.save_pending = False
+
+    return PrefixSnapshotCache()
+
+
+def skip_cache_saves(llama):
+    """
+    With any cache set, llama_cpp runs `self.cache[tokens] = self.save_state()`
+    after every completion: a full copy of the KV context (hundreds of MB)
+    just for our cache to throw away. Skip the save our cache flagged as
+    pending from the completion's lookup; any other save (build_snapshots,
+    other caches) still gets the real thing. Returns the original save_state.
+    """
+    original = llama.save_state
+
+    def save_state():
+        cache = llama.cache
+        if getattr(cache, "save_pending", False):
+            cache.save_pending = False
+            return None
+        return original()
+
+    llama.save_state = save_state
+    return original
+
+
+def tokenize(llama, text):
+    try:
+        return llama.tokenize(text.encode("utf-8"), add_bos=True, special=True)
+    except TypeError: # Older llama_cpp without the special flag
+        return llama.tokenize(text.encode("utf-8"), add_bos=True)
+
+
+def build_snapshots(llama, prefixes, store, force=False):
+    """Prefill each registered prefix that has no snapshot yet and persist its state."""
+    index = store.index()
+    for prefix in prefixes:
+        pkey = prefix_key(prefix["text"])
+        if pkey in index and store.path(pkey).exists() and not force:
+            continue
+        tokens = tokenize(llama, prefix["text"])
+        if len(tokens) >= llama.n_ctx():
+            console.print(f"[yellow][KV] Prefix '{prefix['name']}' is {len(tokens)} tokens, doesn't fit n_ctx {llama.n_ctx()}. Skipped.[/yellow]")
+            continue
+        console.print(f"[cyan][KV] Prefilling '{prefix['name']}' ({len(tokens)} tokens)...[/cyan]")
+        llama.reset()
+        started = time.monotonic()
+        llama.eval(tokens)
+        elapsed = time.monotonic() - started
+        store.save(pkey, prefix["name"], llama.save_state(), tokens, elapsed)
+        console.print(f"[green][KV] Snapshot '{prefix['name']}' saved ({elapsed:.1f}s prefill, {format_size(store.path(pkey).stat().st_size)})[/green]")
+    llama.reset()
+
+
+def restore_snapshots(prefixes, store):
+    """Load the snapshots for the currently registered prefixes into memory"""
+    index = store.index()
+    states = {}
+    for prefix in prefixes:
+        pkey = prefix_key(prefix["text"])
+        if pkey in index and store.path(pkey).exists():
+            try:
+                states[pkey] = store.load(pkey)
+            except (OSError, pickle.UnpicklingError, EOFError, AttributeError) as e:
+                console.print(f"[yellow][KV] Snapshot '{prefix['name']}' unreadable ({e}), will rebuild.[/yellow]")
+    return states
+
+
+def install(llama, prefix_file=PREFIX_FILE, snapshot_dir=SNAPSHOT_DIR):
+    """Build missing snapshots, restore all of them and hang the cache on llama. Returns the cache (or None)."""
+    prefixes = load_prefixes(prefix_file)
+    if not prefixes:
+        return None
+    store = SnapshotStore(snapshot_dir, model_key(llama.model_path, llama.n_ctx()))
+    states = restore_snapshots(prefixes, store)
+    if len(states) < len(prefixes):
+        build_snapshots(llama, prefixes, store)
+        states = restore_snapshots(prefixes, store)
+    if not states:
+        return None
+    cache = make_cache(states)
+    llama.set_cache(cache)
+    skip_cache_saves(llama)
+    console.print(f"[green][KV] Restored {len(states)} prefix snapshot(s) from {store.directory}[/green]")
+    return cache
+
+
+def format_size(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}" if unit != "B" else f"{size} B"
+        size /= 1024
+    return f"{size:.1f} TB"
+# FINISH ### SNAPSHOT STORE ###
+
+# START ### BENCHMARK ###
+def benchmark(llama, prefixes, store, suffix=" Hello", runs=3):
+    """
+    Time-to-first-token for prompt = prefix + suffix, cold (empty context, no
+    cache) vs restored (snapshot loaded through the cache). Reset between runs
+    so the live context can't help either side. save_skipped is what one
+    after-completion state copy costs, which skip_cache_saves() avoids on
+    every request.
+    """
+    states = restore_snapshots(prefixes, store)
+    save_state = skip_cache_saves(llama)
+    rows = []
+    for prefix in prefixes:
+        pkey = prefix_key(prefix["text"])
+        if pkey not in states:
+            continue
+        prompt = prefix["text"] + suffix
+        timings = {}
+        for label, cache in (("cold", None), ("restored", make_cache({pkey: states[pkey]}))):
+            samples = []
+            for _ in range(runs):
+                llama.reset()
+                llama.set_cache(cache)
+                started = time.monotonic()
+                for _ in llama.create_completion(prompt, max_tokens=1, temperature=0, stream=True):
+                    break
+                samples.append(time.monotonic() - started)
+            timings[label] = sorted(samples)[len(samples) // 2]
+        started = time.monotonic()
+        save_state() # Context now holds the whole prompt, like after a real request
+        timings["save_skipped"] = time.monotonic() - started
+        rows.append({"name": prefix["name"], "tokens": store.index()[pkey]["tokens"], **timings,
+                     "speedup": round(timings["cold"] / timings["restored"], 1) if timings["restored"] else None})
+    llama.set_cache(None)
+    llama.save_state = save_state
+    return rows
+# FINISH ### BENCHMARK ###
+
+# START ### CLI ###
+def load_model(args):
+    import llama_cpp
+    return llama_cpp.Llama(model_path=args.model, n_ctx=args.n_ctx, n_gpu_layers=args.n_gpu_layers,
+                           n_batch=args.n_batch, verbose=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Persisted KV snapshots of common prompt prefixes")
+    parser.add_argument("--prefixes", default=str(PREFIX_FILE))
+    parser.add_argument("--dir", default=str(SNAPSHOT_DIR))
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (("build", "Prefill and save snapshots for registered prefixes (server must be down: needs the VRAM)"),
+                            ("bench", "Time-to-first-token, cold vs restored")):
+        cmd = sub.add_parser(name, help=help_text)
+        cmd.add_argument("--model", required=True)
+        cmd.add_argument("--n-ctx", type=int, default=2048)
+        cmd.add_argument("--n-gpu-layers", type=int, default=8)
+        cmd.add_argument("--n-batch", type=int, default=64)
+        if name == "build":
+            cmd.add_argument("--force", action="store_true", help="Rebuild snapshots that already exist")
+        else:
+            cmd.add_argument("--runs", type=int, default=3)
+    listing = sub.add_parser("list", help="Show snapshots for a model")
+    listing.add_argument("--model", required=True)
+    listing.add_argument("--n-ctx", type=int, default=2048)
+    args = parser.parse_args(argv)
+
+    prefixes = load_prefixes(args.prefixes)
+    if not prefixes:
+        console.print(f"[yellow]No prefixes registered in {args.prefixes}.[/yellow]")
+        return 1
+    store = SnapshotStore(args.dir, model_key(args.model, args.n_ctx))
+
+    if args.command == "list":
+        index = store.index()
+        table = Table(title=f"KV snapshots in {store.directory}", border_style="cyan")
+        for column in ("Prefix", "Tokens", "Size", "Prefill", "Registered"):
+            table.add_column(column)
+        registered = {prefix_key(p["text"]) for p in prefixes}
+        for pkey, meta in index.items():
+            table.add_row(meta["name"], str(meta["tokens"]), format_size(meta["bytes"]),
+                          f"{meta['prefill_seconds']}s", "yes" if pkey in registered else "no")
+        console.print(table)
+        return 0
+
+    llama = load_model(args)
+    if args.command == "build":
+        build_snapshots(llama, prefixes, store, force=args.force)
+        return 0
+
+    build_snapshots(llama, prefixes, store)
+    rows = benchmark(llama, prefixes, store, runs=args.runs)
+    table = Table(title="Time to first token (median)", border_style="cyan")
+    for column in ("Prefix", "Tokens", "Cold", "Restored", "Speedup", "State copy skipped/request"):
+        table.add_column(column)
+    for row in rows:
+        table.add_row(row["name"], str(row["tokens"]), f"{row['cold']:.2f}s", f"{row['restored']:.2f}s", f"{row['speedup']}x",
+                      f"{row['save_skipped']:.3f}s")
+    console.print(table)
+    return 0
+# FINISH ### CLI ###
+
+# START ### SCRIPT RUNNER ###
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        sys.exit(130)
+    except Exception as e:
+        console.print(f"[red][KV] Error: {str(e)}[/red]")
+        sys.exit(1)
+# FINISH ### SCRIPT RUNNER ###
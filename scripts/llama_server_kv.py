@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+
+# START ### IMPORTS ###
+import os
+import sys
+import runpy
+import llama_cpp
+import kv_snapshots
+from kv_snapshots import console
+# FINISH ### IMPORTS ###
+
+# START ### CACHE HOOK ###
+def hook_llama_init():
+    """
+    Wrap Llama.__init__ so whatever model llama_cpp.server builds (the
+    module-level global in older releases, LlamaProxy in newer ones) gets the
+    prefix snapshots hung on it before the port opens. Patching the class
+    covers both without caring which one is installed.
+    """
+    original = llama_cpp.Llama.__init__
+
+    def __init__(self, *args, **kwargs):
+        original(self, *args, **kwargs)
+        try:
+            kv_snapshots.install(self)
+        except Exception as e: # Never take the server down over a cache
+            console.print(f"[yellow][KV] Prefix snapshots unavailable: {e}[/yellow]")
+
+    llama_cpp.Llama.__init__ = __init__
+# FINISH ### CACHE HOOK ###
+
+# START ### SCRIPT RUNNER ###
+if __name__ == "__main__":
+    # Same arguments as `python3 -m llama_cpp.server`; run_server.sh just swaps the entry point
+    if os.environ.get("KV_SNAPSHOTS", "yes").lower() not in ("no", "false", "0"):
+        hook_llama_init()
+    sys.argv[0] = "llama_cpp.server"
+    runpy.run_module("llama_cpp.server", run_name="__main__", alter_sys=True)
+# FINISH ### SCRIPT RUNNER ###
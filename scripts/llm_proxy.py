@@ -0,0 +1,649 @@
+#!/usr/bin/env python3
+
+# START ### IMPORTS ###
+import os
+import sys
+import gzip
+import json
+import time
+import signal
+import asyncio
+import argparse
+from collections import defaultdict
+from rich.console import Console
+from admission import AdmissionController, Shed, estimate_cost, estimate_prompt_tokens, SOURCE_PRIORITIES
+from telemetry import TokenTelemetry, ResponseMeter
+from context_guard import ContextGuard, CONTEXT_POLICY
+from traffic_recorder import TrafficRecorder, TRACE_DIR, TRACE_REDACT
+
+try:
+    import brotli # Optional, gzip covers everyone who doesn't send br
+except ImportError:
+    brotli = None
+# FINISH ### IMPORTS ###
+
+# START ### CONSOLE SETUP ###
+console = Console()
+# FINISH ### CONSOLE SETUP ###
+
+# START ### CONFIGURATION ###
+LISTEN_HOST = os.environ.get("PROXY_HOST", "0.0.0.0")
+LISTEN_PORT = int(os.environ.get("PROXY_PORT", "8081"))
+BACKEND_HOST = os.environ.get("PROXY_BACKEND_HOST", "127.0.0.1")
+BACKEND_PORT = int(os.environ.get("PROXY_BACKEND_PORT", "8080"))
+MAX_IDLE_BACKEND = 8          # Keep-alive connections parked per backend
+PER_CLIENT_LIMIT = int(os.environ.get("PROXY_PER_CLIENT_LIMIT", "4"))
+COMPRESS_MIN_BYTES = 512      # Not worth the CPU below this
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript")
+MAX_HEADER_BYTES = 64 * 1024
+MAX_BODY_BYTES = 32 * 1024 * 1024
+STATS_PATH = "/proxy/stats"
+METRICS_PATH = "/proxy/metrics"
+USAGE_PATH = "/proxy/usage"
+BACKEND_PATH = "/proxy/backend"  # GET: where traffic goes. PUT from loopback: move it (hot_swap.py)
+ROUTE_FILE = os.environ.get("PROXY_ROUTE_FILE", "/app/config/route.json") # Survives proxy restarts
+# Requests that make the model do work go through admission control
+ADMITTED_PATHS = ("/v1/chat/completions", "/v1/completions", "/v1/embeddings")
+SOURCE_HEADER = "x-llm-source"
+
+HOP_BY_HOP = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+    "te", "trailer", "trailers", "transfer-encoding", "upgrade",
+}
+REASONS = {200: "OK", 400: "Bad Request", 413: "Payload Too Large", 429: "Too Many Requests",
+           502: "Bad Gateway", 503: "Service Unavailable", 504: "Gateway Timeout"}
+# FINISH ### CONFIGURATION ###
+
+# START ### HTTP HELPERS ###
+class HTTPError(Exception):
+    def __init__(self, status, message=""):
+        super().__init__(message or REASONS.get(status, ""))
+        self.status = status
+
+
+class Headers:
+    """Ordered header list with case-insensitive lookup, dupes kept."""
+
+    def __init__(self, items=None):
+        self.items = list(items or [])
+
+    def get(self, name, default=None):
+        name = name.lower()
+        for key, value in self.items:
+            if key.lower() == name:
+                return value
+        return default
+
+    def set(self, name, value):
+        self.remove(name)
+        self.items.append((name, str(value)))
+
+    def remove(self, name):
+        name = name.lower()
+        self.items = [(k, v) for k, v in self.items if k.lower() != name]
+
+    def without_hop_by_hop(self):
+        listed = {t.strip().lower() for t in (self.get("connection") or "").split(",") if t.strip()}
+        return Headers([(k, v) for k, v in self.items if k.lower() not in HOP_BY_HOP | listed])
+
+    def encode(self):
+        return "".join(f"{k}: {v}\r\n" for k, v in self.items).encode("latin-1")
+
+
+async def read_head(reader):
+    """Start line + headers. None on a clean EOF before anything arrived."""
+    try:
+        raw = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as e:
+        if not e.partial:
+            return None
+        raise HTTPError(400, "Truncated header")
+    except asyncio.LimitOverrunError:
+        raise HTTPError(400, "Header too large")
+    lines = raw.decode("latin-1").split("\r\n")
+    headers = Headers()
+    for line in lines[1:]:
+        if not line:
+            continue
+        key, sep, value = line.partition(":")
+        if not sep:
+            raise HTTPError(400, "Malformed header")
+        headers.items.append((key.strip(), value.strip()))
+    return lines[0], headers
+
+
+async def iter_chunked(reader):
+    """Yield decoded chunks of a chunked body, trailers swallowed."""
+    while True:
+        size_line = await reader.readuntil(b"\r\n")
+        size = int(size_line.split(b";", 1)[0].strip(), 16)
+        if size == 0:
+            while (await reader.readuntil(b"\r\n")) != b"\r\n":
+                pass
+            return
+        data = await reader.readexactly(size)
+        await reader.readexactly(2)
+        yield data
+
+
+async def read_body(reader, headers, limit=MAX_BODY_BYTES):
+    if "chunked" in (headers.get("transfer-encoding") or "").lower():
+        parts, total = [], 0
+        async for chunk in iter_chunked(reader):
+            total += len(chunk)
+            if total > limit:
+                raise HTTPError(413)
+            parts.append(chunk)
+        return b"".join(parts)
+    length = int(headers.get("content-length") or 0)
+    if length > limit:
+        raise HTTPError(413)
+    return await reader.readexactly(length) if length else b""
+
+
+def response_head(status, headers, reason=None):
+    reason = reason or REASONS.get(status, "")
+    return f"HTTP/1.1 {status} {reason}\r\n".encode("latin-1") + headers.encode() + b"\r\n"
+
+
+async def send_simple(writer, status, payload, extra=None):
+    body = json.dumps(payload).encode()
+    headers = Headers([("Content-Type", "application/json"), ("Content-Length", len(body))] + list(extra or []))
+    writer.write(response_head(status, headers) + body)
+    await writer.drain()
+
+
+def pick_encoding(accept_encoding):
+    """br if the client takes it and brotli is installed, else gzip, else None."""
+    offered = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            offered[name.lower()] = q
+    if brotli and offered.get("br", 0) > 0:
+        return "br"
+    if offered.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=5)
+# FINISH ### HTTP HELPERS ###
+
+# START ### BACKEND POOL ###
+class BackendPool:
+    """Keep-alive connections to the model server, reused across client requests."""
+
+    def __init__(self, host=BACKEND_HOST, port=BACKEND_PORT, max_idle=MAX_IDLE_BACKEND):
+        self.host = host
+        self.port = port
+        self.max_idle = max_idle
+        self.idle = []
+        self.opened = 0
+        self.reused = 0
+        self.active = 0 # Requests currently holding a connection; draining waits for 0
+
+    async def acquire(self):
+        """(conn, reused). reused tells the caller a failure may just be a stale socket."""
+        while self.idle:
+            reader, writer = self.idle.pop()
+            if reader.at_eof() or writer.is_closing():
+                writer.close()
+                continue
+            self.reused += 1
+            self.active += 1
+            return (reader, writer), True
+        reader, writer = await asyncio.open_connection(self.host, self.port, limit=MAX_HEADER_BYTES)
+        self.opened += 1
+        self.active += 1
+        return (reader, writer), False
+
+    def release(self, conn, reusable):
+        reader, writer = conn
+        self.active -= 1
+        if reusable and len(self.idle) < self.max_idle and not reader.at_eof():
+            self.idle.append(conn)
+        else:
+            writer.close()
+
+    def close(self):
+        for _, writer in self.idle:
+            writer.close()
+        self.idle.clear()
+
+    def describe(self):
+        return {"host": self.host, "port": self.port, "active": self.active, "idle": len(self.idle)}
+
+
+def load_route(path=ROUTE_FILE):
+    """(host, port) saved by the last backend switch, or None"""
+    try:
+        with open(path) as f:
+            route = json.load(f)
+        return route["host"], int(route["port"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def save_route(host, port, path=ROUTE_FILE):
+    try:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"host": host, "port": port, "switched_at": time.time()}, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        console.print(f"[yellow]Couldn't save route to {path}: {e}[/yellow]")
+# FINISH ### BACKEND POOL ###
+
+# START ### PROXY SERVER ###
+class LLMProxy:
+    """
+    Sits between ngrok and llama_cpp.server. Reuses backend connections,
+    compresses buffered responses, passes SSE through chunk by chunk and caps
+    how many requests one client can have in flight.
+    """
+
+    def __init__(self, backend=None, per_client_limit=PER_CLIENT_LIMIT, admission=None, telemetry=None, context=None,
+                 recorder=None):
+        self.backend = backend or BackendPool()
+        self.per_client_limit = per_client_limit
+        self.admission = admission or AdmissionController()
+        self.telemetry = telemetry or TokenTelemetry()
+        self.context = context or ContextGuard()
+        self.recorder = recorder # TrafficRecorder, or None to record nothing
+        self.in_flight = defaultdict(int)
+        self.started = time.time()
+        self.counters = defaultdict(int)
+        self.draining = [] # Old pools still finishing requests after a switch
+        self.route_file = ROUTE_FILE
+
+    def switch_backend(self, host, port):
+        """
+        Point new requests at another backend. Requests already running hold
+        on to the pool they started with and finish there; the old pool is
+        closed once they're done.
+        """
+        old = self.backend
+        if (old.host, old.port) == (host, port):
+            return old
+        self.backend = BackendPool(host, port, old.max_idle)
+        old.close() # Idle sockets only; in-flight ones get closed on release
+        old.max_idle = 0
+        if old.active:
+            self.draining.append(old)
+        self.counters["backend_switches"] += 1
+        if self.route_file:
+            save_route(host, port, self.route_file)
+        console.print(f"[cyan]Backend switched {old.host}:{old.port} -> {host}:{port} "
+                      f"({old.active} request(s) draining on the old one)[/cyan]")
+        return old
+
+    def backend_status(self):
+        self.draining = [pool for pool in self.draining if pool.active]
+        return {"backend": self.backend.describe(), "draining": [pool.describe() for pool in self.draining]}
+
+    async def handle_backend(self, method, body, peer, writer):
+        if method == "GET":
+            await send_simple(writer, 200, self.backend_status())
+            return
+        if method not in ("PUT", "POST"):
+            await send_simple(writer, 400, {"error": "GET or PUT"})
+            return
+        if not peer or peer[0] not in ("127.0.0.1", "::1"):
+            await send_simple(writer, 400, {"error": "Backend switching is loopback-only"})
+            return
+        try:
+            route = json.loads(body or b"{}")
+            host, port = route.get("host", self.backend.host), int(route["port"])
+        except (ValueError, KeyError, TypeError, AttributeError):
+            await send_simple(writer, 400, {"error": "Body must be {\"port\": N, \"host\": optional}"})
+            return
+        old = self.switch_backend(host, port)
+        await send_simple(writer, 200, {"previous": old.describe(), **self.backend_status()})
+
+    def client_id(self, headers, peer):
+        """
+        ngrok appends the real caller to X-Forwarded-For; everything else is
+        the socket peer. Rightmost hop only: whatever's left of it the client
+        wrote itself, and could rotate to dodge the per-client limit.
+        """
+        forwarded = headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[-1].strip()
+        return peer[0] if peer else "unknown"
+
+    def is_local(self, headers, peer):
+        """Loopback and not via ngrok (which connects from loopback too, but adds X-Forwarded-For)"""
+        return not headers.get("x-forwarded-for") and bool(peer) and peer[0] in ("127.0.0.1", "::1")
+
+    def classify_source(self, headers, peer):
+        """
+        Priority class for admission. An explicit X-LLM-Source wins (bolt.diy
+        and the validators send one), anything that came through ngrok is
+        remote, other loopback traffic is local.
+        """
+        declared = (headers.get(SOURCE_HEADER) or "").strip().lower()
+        if declared in SOURCE_PRIORITIES and declared != "remote":
+            if not headers.get("x-forwarded-for"): # Tunnel users don't get to pick
+                return declared
+        if headers.get("x-forwarded-for"):
+            return "remote"
+        if peer and peer[0] in ("127.0.0.1", "::1"):
+            return "local"
+        return "remote"
+
+    def stats(self):
+        return {
+            "uptime": round(time.time() - self.started, 1),
+            "backend_connections_opened": self.backend.opened,
+            "backend_connections_reused": self.backend.reused,
+            "backend_idle": len(self.backend.idle),
+            "backend": f"{self.backend.host}:{self.backend.port}",
+            "in_flight": dict(self.in_flight),
+            "admission": self.admission.stats(),
+            "trace": self.recorder.stats() if self.recorder else None,
+            **self.counters,
+        }
+
+    async def handle_client(self, reader, writer):
+        peer = writer.get_extra_info("peername")
+        try:
+            while True:
+                try:
+                    head = await read_head(reader)
+                    if head is None:
+                        break
+                    request_line, headers = head
+                    method, target, version = request_line.split(" ", 2)
+                    body = await read_body(reader, headers)
+                except HTTPError as e:
+                    await send_simple(writer, e.status, {"error": str(e)}, [("Connection", "close")])
+                    break
+                except ValueError:
+                    await send_simple(writer, 400, {"error": "Malformed request"}, [("Connection", "close")])
+                    break
+
+                keep_alive = (headers.get("connection") or "").lower() != "close" and version == "HTTP/1.1"
+                if target in (STATS_PATH, USAGE_PATH, METRICS_PATH) and not self.is_local(headers, peer):
+                    # They list client addresses; not something to hand out through the tunnel
+                    await send_simple(writer, 403, {"error": "Proxy stats are loopback-only"})
+                elif target == STATS_PATH:
+                    await send_simple(writer, 200, self.stats())
+                elif target == USAGE_PATH:
+                    await send_simple(writer, 200, self.telemetry.snapshot())
+                elif target == BACKEND_PATH:
+                    # The route is readable through the tunnel; switching isn't
+                    if headers.get("x-forwarded-for") and method != "GET":
+                        await send_simple(writer, 400, {"error": "Backend switching is loopback-only"})
+                    else:
+                        await self.handle_backend(method, body, peer, writer)
+                elif target == METRICS_PATH:
+                    body = self.telemetry.prometheus().encode()
+                    headers = Headers([("Content-Type", "text/plain; version=0.0.4"), ("Content-Length", len(body))])
+                    writer.write(response_head(200, headers) + body)
+                    await writer.drain()
+                else:
+                    client = self.client_id(headers, peer)
+                    source = self.classify_source(headers, peer)
+                    keep_alive &= await self.forward(method, target, headers, body, client, writer, source)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e: # A proxy bug shouldn't leave the client hanging with no answer
+            self.counters["proxy_errors"] += 1
+            console.print(f"[red][Proxy] Error handling {peer}: {e}[/red]")
+            try:
+                await send_simple(writer, 502, {"error": "Proxy error"}, [("Connection", "close")])
+            except (ConnectionError, RuntimeError):
+                pass
+        finally:
+            writer.close()
+
+    async def forward(self, method, target, headers, body, client, writer, source=None):
+        """Proxy one request. Returns False if the client connection can't be reused."""
+        if self.in_flight[client] >= self.per_client_limit:
+            self.counters["rejected_client_limit"] += 1
+            await send_simple(writer, 429, {"error": "Too many concurrent requests from this client"},
+                              [("Retry-After", "1")])
+            return True
+
+        self.in_flight[client] += 1
+        self.counters["requests"] += 1
+        ticket = meter = trace = None
+        try:
+            path = target.split("?", 1)[0]
+            if method == "POST" and path in ADMITTED_PATHS:
+                try:
+                    payload = json.loads(body or b"{}")
+                except ValueError:
+                    payload = None
+                if self.recorder: # What the client sent, before any trimming
+                    trace = self.recorder.begin(method, path, source or "remote", payload, body)
+                # Real token count from the model's vocab; off the event loop, counting is CPU work
+                checked = await asyncio.to_thread(self.context.check, path, payload)
+                if checked.error:
+                    self.counters["context_rejected"] += 1
+                    if trace:
+                        trace["status"] = 400
+                    await send_simple(writer, 400, {"error": {"message": checked.error, "type": "invalid_request_error",
+                                                              "code": "context_length_exceeded"}})
+                    return True
+                if checked.payload is not payload:
+                    self.counters["context_trimmed_messages"] += checked.trimmed_messages
+                    self.counters["context_clamped"] += checked.clamped
+                    payload = checked.payload
+                    body = json.dumps(payload).encode()
+                try:
+                    ticket = await self.admission.acquire(source or "remote", estimate_cost(payload, checked.prompt_tokens))
+                except Shed as e:
+                    if trace:
+                        trace["status"] = 429
+                    await send_simple(writer, 429, {"error": f"Server busy: {e.reason}", "retry_after": e.retry_after},
+                                      [("Retry-After", str(e.retry_after))])
+                    return True
+                meter = ResponseMeter(checked.prompt_tokens if checked.prompt_tokens is not None else estimate_prompt_tokens(payload))
+            reusable = await self._forward(method, target, headers, body, client, writer, meter, trace)
+            if meter and meter.observed:
+                self.telemetry.record(source or "remote", client, meter)
+            return reusable
+        finally:
+            if trace:
+                self.recorder.finish(trace, meter)
+            if ticket:
+                self.admission.release(ticket)
+            self.in_flight[client] -= 1
+            if not self.in_flight[client]:
+                del self.in_flight[client]
+
+    async def _forward(self, method, target, headers, body, client, writer, meter=None, trace=None):
+        backend = self.backend # Pinned for this request even if a switch happens mid-stream
+        upstream_headers = headers.without_hop_by_hop()
+        upstream_headers.remove("accept-encoding") # We do the compressing, backend sends identity
+        upstream_headers.set("Host", f"{backend.host}:{backend.port}")
+        upstream_headers.set("Content-Length", len(body))
+        upstream_headers.set("X-Forwarded-For", client)
+        upstream_headers.set("Connection", "keep-alive")
+        request = f"{method} {target} HTTP/1.1\r\n".encode("latin-1") + upstream_headers.encode() + b"\r\n" + body
+
+        conn, reused = None, False
+        for attempt in range(2):
+            try:
+                conn, reused = await backend.acquire()
+                conn[1].write(request)
+                await conn[1].drain()
+                head = await read_head(conn[0])
+                if head is None:
+                    raise ConnectionError("Backend closed the connection")
+                break
+            except (OSError, ConnectionError, asyncio.IncompleteReadError, HTTPError) as e:
+                if conn:
+                    backend.release(conn, False)
+                    conn = None
+                # A parked connection can die under us; retry once on a fresh one
+                if attempt == 1 or not reused:
+                    self.counters["backend_errors"] += 1
+                    if trace:
+                        trace["status"] = 502
+                    await send_simple(writer, 502, {"error": f"Backend unavailable: {e}"})
+                    return True
+        # From here the connection goes back to the pool whatever happens, or draining never finishes
+        reusable = responded = False
+        try:
+            status_line, resp_headers = head
+            status = int(status_line.split(" ", 2)[1])
+            if trace:
+                trace["status"] = status
+            reason = status_line.split(" ", 2)[2] if status_line.count(" ") >= 2 else None
+
+            no_body = method == "HEAD" or status in (204, 304) or 100 <= status < 200
+            chunked = "chunked" in (resp_headers.get("transfer-encoding") or "").lower()
+            length = resp_headers.get("content-length")
+            backend_reusable = (resp_headers.get("connection") or "").lower() != "close"
+            content_type = (resp_headers.get("content-type") or "").lower()
+            out_headers = resp_headers.without_hop_by_hop()
+
+            if no_body:
+                responded = True
+                writer.write(response_head(status, out_headers, reason))
+                await writer.drain()
+            elif content_type.startswith("text/event-stream") or (chunked and length is None and not self._compressible(content_type)):
+                responded = True
+                await self._stream(conn, chunked, status, reason, out_headers, writer, meter)
+                backend_reusable &= chunked
+            else:
+                if chunked:
+                    data = b"".join([c async for c in iter_chunked(conn[0])])
+                elif length is not None:
+                    data = await conn[0].readexactly(int(length))
+                else:
+                    data = await conn[0].read() # Close-delimited
+                    backend_reusable = False
+                if meter and status == 200:
+                    meter.feed_body(data)
+                responded = True
+                await self._send_buffered(status, reason, out_headers, data, headers, writer)
+            reusable = backend_reusable
+        except Exception as e: # Dropped connections, oversized chunk lines, a garbled status line...
+            if not responded:
+                self.counters["backend_errors"] += 1
+                if trace:
+                    trace["status"] = 502
+                await send_simple(writer, 502, {"error": f"Bad response from backend: {e}"}, [("Connection", "close")])
+            return False
+        finally:
+            backend.release(conn, reusable)
+        return True
+
+    def _compressible(self, content_type):
+        return any(content_type.startswith(t) for t in COMPRESSIBLE_TYPES)
+
+    async def _send_buffered(self, status, reason, out_headers, data, request_headers, writer):
+        encoding = pick_encoding(request_headers.get("accept-encoding"))
+        content_type = (out_headers.get("content-type") or "").lower()
+        if (encoding and len(data) >= COMPRESS_MIN_BYTES and self._compressible(content_type)
+                and not out_headers.get("content-encoding")):
+            compressed = compress(data, encoding)
+            if len(compressed) < len(data):
+                self.counters["compressed_responses"] += 1
+                self.counters["bytes_saved"] += len(data) - len(compressed)
+                data = compressed
+                out_headers.set("Content-Encoding", encoding)
+                out_headers.set("Vary", "Accept-Encoding")
+        out_headers.set("Content-Length", len(data))
+        writer.write(response_head(status, out_headers, reason) + data)
+        await writer.drain()
+
+    async def _stream(self, conn, chunked, status, reason, out_headers, writer, meter=None):
+        """SSE and friends: every backend chunk goes out the moment it lands."""
+        self.counters["streamed_responses"] += 1
+        out_headers.remove("content-length")
+        out_headers.set("Transfer-Encoding", "chunked")
+        out_headers.set("X-Accel-Buffering", "no")
+        writer.write(response_head(status, out_headers, reason))
+        await writer.drain()
+
+        async def chunks():
+            if chunked:
+                async for chunk in iter_chunked(conn[0]):
+                    yield chunk
+            else:
+                while True:
+                    chunk = await conn[0].read(16 * 1024)
+                    if not chunk:
+                        return
+                    yield chunk
+
+        async for chunk in chunks():
+            if meter:
+                meter.feed_stream(chunk)
+            writer.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            await writer.drain()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+# FINISH ### PROXY SERVER ###
+
+# START ### MAIN FUNCTION ###
+async def serve(host, port, proxy):
+    server = await asyncio.start_server(proxy.handle_client, host, port, limit=MAX_HEADER_BYTES)
+    console.print(f"[green]LLM proxy on {host}:{port} -> {proxy.backend.host}:{proxy.backend.port} "
+                  f"(compression: {'br+gzip' if brotli else 'gzip'}, per-client limit {proxy.per_client_limit})[/green]")
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    rollups = asyncio.create_task(proxy.telemetry.run_rollups())
+    flushes = asyncio.create_task(proxy.recorder.run_flushes()) if proxy.recorder else None
+    async with server:
+        await stop.wait()
+    rollups.cancel()
+    proxy.telemetry.rollup()
+    if flushes:
+        flushes.cancel()
+        proxy.recorder.flush()
+    proxy.backend.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pooling, compressing reverse proxy in front of llama_cpp.server")
+    parser.add_argument("--host", default=LISTEN_HOST)
+    parser.add_argument("--port", type=int, default=LISTEN_PORT)
+    parser.add_argument("--backend-host", default=BACKEND_HOST)
+    parser.add_argument("--backend-port", type=int, default=BACKEND_PORT)
+    parser.add_argument("--per-client-limit", type=int, default=PER_CLIENT_LIMIT)
+    parser.add_argument("--route-file", default=ROUTE_FILE, help="Where backend switches are saved ('' to not persist)")
+    parser.add_argument("--trace-dir", default=TRACE_DIR, help="Record model requests to rotating traces here (traffic_replay.py)")
+    parser.add_argument("--trace-redact", choices=("none", "content"), default=TRACE_REDACT,
+                        help="content: store prompts/messages as same-length filler")
+    parser.add_argument("--context-policy", choices=("trim", "reject", "off"), default=CONTEXT_POLICY,
+                        help="What to do with requests that don't fit n_ctx")
+    args = parser.parse_args(argv)
+
+    # A proxy restart after a hot swap has to keep pointing at the live backend
+    route = load_route(args.route_file) if args.route_file else None
+    host, port = route or (args.backend_host, args.backend_port)
+    recorder = TrafficRecorder(args.trace_dir, args.trace_redact) if args.trace_dir else None
+    proxy = LLMProxy(BackendPool(host, port), args.per_client_limit, context=ContextGuard(policy=args.context_policy),
+                     recorder=recorder)
+    proxy.route_file = args.route_file or None
+    asyncio.run(serve(args.host, args.port, proxy))
+    return 0
+# FINISH ### MAIN FUNCTION ###
+
+# START ### SCRIPT RUNNER ###
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except Exception as e:
+        console.print(f"\n[red]Critical error: {str(e)}[/red]")
+        sys.exit(1)
+# FINISH ### SCRIPT RUNNER ###
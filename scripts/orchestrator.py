@@ -0,0 +1,466 @@
+#!/usr/bin/env python3
+
+# START ### IMPORTS ###
+import os
+import sys
+import json
+import time
+import signal
+import asyncio
+import argparse
+import urllib.request
+import urllib.error
+from pathlib import Path
+from rich.console import Console
+# FINISH ### IMPORTS ###
+
+# START ### CONSOLE SETUP ###
+console = Console()
+# FINISH ### CONSOLE SETUP ###
+
+# START ### CONFIGURATION ###
+DEFAULT_CONFIG = Path(__file__).resolve().parent.parent / "config" / "services.json"
+DEFAULT_STATE_FILE = Path("/app/logs/orchestrator_state.json")
+DEFAULT_CONTROL_SOCKET = Path("/app/logs/orchestrator.sock")
+DEFAULT_CPU_PLAN = Path("/app/config/cpu_plan.json") # Written by cpu_topology.py plan
+
+SERVICE_DEFAULTS = {
+    "directory": "/app",
+    "environment": {},
+    "depends_on": [],
+    "probe": {"type": "process", "grace": 5},
+    "autostart": True,            # false: only runs when started over the control socket
+    "autorestart": True,
+    "backoff_base": 1.0,        # First restart delay, doubles per consecutive failure
+    "backoff_max": 60.0,
+    "backoff_reset_after": 60.0, # Running healthy this long clears the failure count
+    "stop_timeout": 10.0,
+    "stdout_logfile": None,
+    "stderr_logfile": None,
+}
+PROBE_DEFAULTS = {"interval": 0.5, "timeout": 120.0}
+# FINISH ### CONFIGURATION ###
+
+# START ### CONFIG LOADER ###
+def load_cpu_plan(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def load_services(path, cpu_plan=None):
+    """
+    Read services.json and fill in defaults. Commands of services the CPU
+    plan covers get its taskset/numactl prefix. Raises ValueError on bad
+    deps or cycles.
+    """
+    with open(path) as f:
+        raw = json.load(f)
+    plan_services = (cpu_plan or {}).get("services", {})
+    services = {}
+    for name, spec in raw.get("services", {}).items():
+        merged = {**SERVICE_DEFAULTS, **spec}
+        merged["probe"] = {**PROBE_DEFAULTS, **merged["probe"]}
+        if isinstance(merged["command"], str):
+            merged["command"] = ["/bin/bash", "-c", merged["command"]]
+        if name in plan_services:
+            merged["command"] = [*plan_services[name]["prefix"], *merged["command"]]
+        services[name] = merged
+    for name, spec in services.items():
+        for dep in spec["depends_on"]:
+            for alternative in dep.split("|"):
+                if alternative not in services:
+                    raise ValueError(f"Service '{name}' depends on unknown service '{alternative}'")
+    startup_order(services) # Blows up on cycles before anything starts
+    return raw, services
+
+
+def startup_order(services):
+    """Topological order (dependencies first). ValueError on a cycle."""
+    order, state = [], {}
+
+    def visit(name, path):
+        if state.get(name) == "done":
+            return
+        if state.get(name) == "visiting":
+            raise ValueError(f"Dependency cycle: {' -> '.join(path + [name])}")
+        state[name] = "visiting"
+        for dep in services[name]["depends_on"]:
+            for alternative in dep.split("|"): # "a|b": either one being healthy will do
+                visit(alternative, path + [name])
+        state[name] = "done"
+        order.append(name)
+
+    for name in services:
+        visit(name, [])
+    return order
+# FINISH ### CONFIG LOADER ###
+
+# START ### READINESS PROBES ###
+def _http_ok(url, timeout):
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            return response.status < 500
+    except urllib.error.HTTPError as e:
+        return e.code < 500 # 4xx still means somebody's answering
+    except Exception:
+        return False
+
+
+async def probe_once(probe, process):
+    """One readiness check. The process has to be alive for any probe to pass."""
+    if process.returncode is not None:
+        return False
+    kind = probe["type"]
+    if kind == "http":
+        return await asyncio.to_thread(_http_ok, probe["url"], min(5.0, probe["timeout"]))
+    if kind == "tcp":
+        try:
+            _, writer = await asyncio.wait_for(
+                asyncio.open_connection(probe.get("host", "127.0.0.1"), probe["port"]), timeout=2
+            )
+            writer.close()
+            return True
+        except (OSError, asyncio.TimeoutError):
+            return False
+    if kind == "process":
+        return True # Grace period already waited out by the caller
+    raise ValueError(f"Unknown probe type: {kind}")
+# FINISH ### READINESS PROBES ###
+
+# START ### SERVICE SUPERVISOR ###
+class Service:
+    """One supervised program: spawn, probe, restart with backoff, stop."""
+
+    def __init__(self, name, spec, orchestrator):
+        self.name = name
+        self.tag = f"\\[{name}]" # Escaped so rich doesn't eat it as markup
+        self.spec = spec
+        self.orchestrator = orchestrator
+        self.process = None
+        self.state = "pending"
+        self.healthy = asyncio.Event()
+        self.stopped = asyncio.Event() # Set by stop(); wakes our own waits, never our dependents'
+        self.failures = 0
+        self.restarts = 0
+        self.last_start = None
+        self.startup_latencies = [] # Seconds from spawn to ready, one per successful start
+        self.first_ready_at = None  # Seconds since orchestrator start, first time ready
+        self._stopping = False
+
+    def status(self):
+        return {
+            "state": self.state,
+            "pid": self.process.pid if self.process and self.process.returncode is None else None,
+            "restarts": self.restarts,
+            "failures": self.failures,
+            "startup_latency": self.startup_latencies[-1] if self.startup_latencies else None,
+            "startup_latencies": self.startup_latencies[-10:],
+            "first_ready_at": self.first_ready_at,
+            "depends_on": self.spec["depends_on"],
+        }
+
+    def _set_state(self, state):
+        self.state = state
+        self.orchestrator.write_state()
+
+    async def _spawn(self):
+        env = {**os.environ, **{k: str(v) for k, v in self.spec["environment"].items()}}
+        stdout = open(self.spec["stdout_logfile"], "ab") if self.spec["stdout_logfile"] else None
+        stderr = open(self.spec["stderr_logfile"], "ab") if self.spec["stderr_logfile"] else None
+        try:
+            self.process = await asyncio.create_subprocess_exec(
+                *self.spec["command"], cwd=self.spec["directory"], env=env,
+                stdout=stdout, stderr=stderr, start_new_session=True
+            )
+        finally:
+            for handle in (stdout, stderr):
+                if handle:
+                    handle.close() # Child has its own copy of the fd
+        self.last_start = time.monotonic()
+
+    async def _wait_ready(self):
+        """Poll the probe until it passes, the process dies or the probe times out."""
+        probe = self.spec["probe"]
+        if probe["type"] == "process":
+            try:
+                await asyncio.wait_for(self.process.wait(), timeout=probe.get("grace", 5))
+                return False # Exited inside the grace window
+            except asyncio.TimeoutError:
+                return True
+        deadline = time.monotonic() + probe["timeout"]
+        while time.monotonic() < deadline:
+            if await probe_once(probe, self.process):
+                return True
+            if self.process.returncode is not None:
+                return False
+            try:
+                await asyncio.wait_for(self.process.wait(), timeout=probe["interval"])
+                return False
+            except asyncio.TimeoutError:
+                pass
+        console.print(f"[red]{self.tag} Readiness probe timed out after {probe['timeout']:.0f}s[/red]")
+        return False
+
+    async def _wait_any(self, group):
+        """Block until one service of a dependency group is healthy, or we're told to stop"""
+        waiters = [asyncio.create_task(d.healthy.wait()) for d in group] + [asyncio.create_task(self.stopped.wait())]
+        try:
+            await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+
+    async def run(self):
+        """Supervision loop: wait on deps, start, gate on readiness, restart with backoff."""
+        services = self.orchestrator.services
+        deps = [[services[a] for a in d.split("|")] for d in self.spec["depends_on"]]
+        while not self._stopping:
+            pending = [group for group in deps if not any(d.healthy.is_set() for d in group)]
+            if pending:
+                self._set_state("waiting")
+                waiting_on = ["|".join(d.name for d in group) for group in pending]
+                console.print(f"[dim]{self.tag} Waiting on {', '.join(waiting_on)}...[/dim]")
+                await asyncio.gather(*(self._wait_any(group) for group in pending))
+                if self._stopping:
+                    break
+
+            self._set_state("starting")
+            console.print(f"[cyan]{self.tag} Starting: {' '.join(self.spec['command'])}[/cyan]")
+            try:
+                await self._spawn()
+            except OSError as e:
+                console.print(f"[red]{self.tag} Failed to spawn: {e}[/red]")
+                ready = False
+            else:
+                ready = await self._wait_ready()
+
+            if ready and not self._stopping:
+                latency = time.monotonic() - self.last_start
+                self.startup_latencies.append(round(latency, 3))
+                if self.first_ready_at is None:
+                    self.first_ready_at = round(time.monotonic() - self.orchestrator.started, 3)
+                self.healthy.set()
+                self._set_state("healthy")
+                console.print(f"[green]{self.tag} Ready in {latency:.1f}s[/green]")
+                await self.process.wait()
+
+            ran_for = time.monotonic() - (self.last_start or time.monotonic())
+            self.healthy.clear()
+            if self.process and self.process.returncode is None:
+                await self.stop_process() # Probe timed out on a live process
+            if self._stopping:
+                break
+
+            code = self.process.returncode if self.process else None
+            if ready and ran_for >= self.spec["backoff_reset_after"]:
+                self.failures = 0
+            self.failures += 1
+            if not self.spec["autorestart"]:
+                self._set_state("exited")
+                console.print(f"[yellow]{self.tag} Exited with {code}, autorestart off.[/yellow]")
+                return
+            delay = min(self.spec["backoff_max"], self.spec["backoff_base"] * 2 ** (self.failures - 1))
+            self._set_state("backoff")
+            console.print(f"[yellow]{self.tag} Exited with {code} after {ran_for:.1f}s. Restarting in {delay:.1f}s.[/yellow]")
+            await self._backoff(delay)
+            if self._stopping or self.orchestrator.shutdown.is_set():
+                break
+            self.restarts += 1
+        self._set_state("stopped")
+
+    async def _backoff(self, delay):
+        """Sleep before a restart, cut short by a stop of this service or of everything"""
+        waiters = [asyncio.create_task(self.stopped.wait()), asyncio.create_task(self.orchestrator.shutdown.wait())]
+        try:
+            await asyncio.wait(waiters, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+
+    async def stop_process(self):
+        """SIGTERM the process group, SIGKILL it if it outstays stop_timeout."""
+        if not self.process or self.process.returncode is not None:
+            return
+        try:
+            os.killpg(self.process.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            return
+        try:
+            await asyncio.wait_for(self.process.wait(), timeout=self.spec["stop_timeout"])
+        except asyncio.TimeoutError:
+            console.print(f"[red]{self.tag} Didn't stop in {self.spec['stop_timeout']:.0f}s, killing.[/red]")
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            await self.process.wait()
+
+    async def stop(self):
+        self._stopping = True
+        self.healthy.clear()
+        self.stopped.set()
+        await self.stop_process()
+# FINISH ### SERVICE SUPERVISOR ###
+
+# START ### ORCHESTRATOR ###
+class Orchestrator:
+    """Starts services in dependency order, gated on readiness, and keeps them up."""
+
+    def __init__(self, raw_config, services, state_file=DEFAULT_STATE_FILE):
+        self.raw_config = raw_config
+        self.state_file = Path(state_file) if state_file else None
+        self.started = time.monotonic()
+        self.shutdown = asyncio.Event()
+        self.order = startup_order(services)
+        self.services = {}
+        for name in self.order:
+            self.services[name] = Service(name, services[name], self)
+        self.tasks = {}
+        self.control_socket = None
+
+    def start_service(self, name):
+        """(Re)launch a service's supervision loop. False if it's already running."""
+        task = self.tasks.get(name)
+        if task and not task.done():
+            return False
+        service = self.services[name]
+        service.healthy.clear()
+        service.failures = 0
+        # Reset here, not in run(): a stop that lands before the task gets going must still count
+        service._stopping = False
+        service.stopped.clear()
+        self.tasks[name] = asyncio.create_task(service.run(), name=f"svc-{name}")
+        return True
+
+    async def stop_service(self, name):
+        """Stop one service and its supervision loop; dependents keep running."""
+        await self.services[name].stop()
+        task = self.tasks.get(name)
+        if task:
+            await asyncio.gather(task, return_exceptions=True)
+        self.services[name].healthy.clear()
+
+    async def handle_control(self, reader, writer):
+        """
+        One JSON line in, one JSON line out. Actions: status, start, stop,
+        restart. hot_swap.py uses this to bring up the standby model server.
+        """
+        try:
+            request = json.loads(await reader.readline() or b"{}")
+            action, name = request.get("action"), request.get("service")
+            if action == "status":
+                reply = {"ok": True, **self.status()}
+            elif name not in self.services:
+                reply = {"ok": False, "error": f"Unknown service: {name}"}
+            elif action == "start":
+                started = self.start_service(name)
+                reply = {"ok": True, "started": started}
+            elif action == "stop":
+                await self.stop_service(name)
+                reply = {"ok": True}
+            elif action == "restart":
+                await self.stop_service(name)
+                reply = {"ok": True, "started": self.start_service(name)}
+            else:
+                reply = {"ok": False, "error": f"Unknown action: {action}"}
+            if action in ("start", "stop", "restart") and reply.get("ok"):
+                console.print(f"[cyan]Control: {action} {name}[/cyan]")
+        except (ValueError, AttributeError) as e:
+            reply = {"ok": False, "error": f"Bad request: {e}"}
+        try:
+            writer.write(json.dumps(reply).encode() + b"\n")
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def status(self):
+        return {
+            "uptime": round(time.monotonic() - self.started, 3),
+            "services": {name: svc.status() for name, svc in self.services.items()},
+        }
+
+    def write_state(self):
+        """Dump per-service state and startup latency for the monitor / humans."""
+        if not self.state_file:
+            return
+        try:
+            self.state_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.state_file.with_suffix(".tmp")
+            tmp.write_text(json.dumps(self.status(), indent=2))
+            os.replace(tmp, self.state_file)
+        except OSError as e:
+            console.print(f"[dim]Couldn't write state file {self.state_file}: {e}[/dim]")
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self.shutdown.set)
+
+        control = None
+        if self.control_socket:
+            self.control_socket.unlink(missing_ok=True)
+            control = await asyncio.start_unix_server(self.handle_control, path=str(self.control_socket))
+
+        console.print(f"[cyan]Startup order: {' -> '.join(self.order)}[/cyan]")
+        for name, service in self.services.items():
+            if service.spec["autostart"]:
+                self.start_service(name)
+            else:
+                service.state = "idle"
+        self.write_state()
+
+        await self.shutdown.wait()
+        if control:
+            control.close()
+            self.control_socket.unlink(missing_ok=True)
+        await self.stop_all()
+
+    async def stop_all(self):
+        """Stop dependents before the things they depend on."""
+        console.print("[yellow]Shutting down services...[/yellow]")
+        for name in reversed(self.order):
+            await self.services[name].stop()
+        for task in self.tasks.values():
+            task.cancel()
+        await asyncio.gather(*self.tasks.values(), return_exceptions=True)
+        self.write_state()
+        console.print("[green]All services stopped.[/green]")
+# FINISH ### ORCHESTRATOR ###
+
+# START ### MAIN FUNCTION ###
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Health-gated process orchestrator for the bolt stack")
+    parser.add_argument("--config", default=str(DEFAULT_CONFIG))
+    parser.add_argument("--state-file", default=str(DEFAULT_STATE_FILE))
+    parser.add_argument("--control-socket", default=str(DEFAULT_CONTROL_SOCKET), help="Unix socket for start/stop/status ('' to disable)")
+    parser.add_argument("--cpu-plan", default=str(DEFAULT_CPU_PLAN), help="Per-service CPU affinity plan ('' to run unpinned)")
+    parser.add_argument("--check", action="store_true", help="Validate the config and print the start order")
+    args = parser.parse_args(argv)
+
+    raw, services = load_services(args.config, load_cpu_plan(args.cpu_plan) if args.cpu_plan else None)
+    if args.check:
+        console.print(f"[green]Config OK. Startup order: {' -> '.join(startup_order(services))}[/green]")
+        return 0
+
+    async def _run():
+        orchestrator = Orchestrator(raw, services, args.state_file)
+        orchestrator.control_socket = Path(args.control_socket) if args.control_socket else None
+        await orchestrator.run()
+
+    asyncio.run(_run())
+    return 0
+# FINISH ### MAIN FUNCTION ###
+
+# START ### SCRIPT RUNNER ###
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except Exception as e:
+        console.print(f"\n[red]Critical error: {str(e)}[/red]")
+        sys.exit(1)
+# FINISH ### SCRIPT RUNNER ###
@@ -2,21 +2,31 @@
 
 # START ### IMPORTS ###
 import os
+import re
 import sys
 import json
 import time
-import requests
+import shlex
+import signal
+import asyncio
 import subprocess
+from collections import deque
 from pathlib import Path
 from rich.console import Console
 from rich.panel import Panel
-from rich.progress import Progress, SpinnerColumn, TextColumn
 # FINISH ### IMPORTS ###
 
 # START ### CONSOLE SETUP ###
 console = Console()
 # FINISH ### CONSOLE SETUP ###
 
+# START ### CONFIGURATION ###
+NGROK_BIN = os.environ.get("NGROK_BIN", "ngrok")
+TUNNEL_PORT = int(os.environ.get("NGROK_TUNNEL_PORT", "8080"))
+STATS_FILE = Path(os.environ.get("NGROK_STATS_FILE", "/app/logs/ngrok_stats.json"))
+STATS_INTERVAL = float(os.environ.get("NGROK_STATS_INTERVAL", "10")) # Seconds between heartbeat-only rewrites
+# FINISH ### CONFIGURATION ###
+
 # START ### TOKEN HANDLER ###
 def get_ngrok_token():
     """Get ngrok token from file"""
@@ -37,56 +47,233 @@ def setup_ngrok():
         return False
     
     try:
-        subprocess.run(["ngrok", "config", "add-authtoken", token], check=True)
+        subprocess.run([NGROK_BIN, "config", "add-authtoken", token], check=True)
         return True
     except subprocess.CalledProcessError as e:
         console.print(f"[red]Error configuring ngrok: {str(e)}[/red]")
         return False
 
-def start_ngrok_tunnel():
-    """Start ngrok tunnel"""
+def parse_log_line(line):
+    """
+    ngrok --log=stdout line -> dict. JSON with --log-format=json, logfmt
+    (t=... lvl=info msg="started tunnel" url=...) otherwise. None for junk.
+    """
+    line = line.strip()
+    if not line:
+        return None
+    if line.startswith("{"):
+        try:
+            return json.loads(line)
+        except json.JSONDecodeError:
+            return None
     try:
-        process = subprocess.Popen(
-            ["ngrok", "http", "8080", "--log=stdout"],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            universal_newlines=True
-        )
-        return process
-    except Exception as e:
-        console.print(f"[red]Error starting ngrok: {str(e)}[/red]")
+        fields = shlex.split(line)
+    except ValueError:
         return None
+    record = {}
+    for field in fields:
+        key, sep, value = field.partition("=")
+        if sep:
+            record[key] = value
+    return record or None
 
-def get_ngrok_url():
-    """Get public URL from ngrok API"""
-    try:
-        response = requests.get("http://localhost:4040/api/tunnels")
-        data = response.json()
-        return data["tunnels"][0]["public_url"]
-    except:
+
+def parse_duration_ms(value):
+    """'41.2ms' / '1.5s' / '850us' / 0.04 -> milliseconds, None if unparseable"""
+    if isinstance(value, (int, float)):
+        return float(value) / 1e6 # Raw Go durations are nanoseconds
+    match = re.fullmatch(r"([\d.]+)(ns|us|µs|ms|s|m)", str(value).strip())
+    if not match:
         return None
+    number, unit = float(match.group(1)), match.group(2)
+    scale = {"ns": 1e-6, "us": 1e-3, "µs": 1e-3, "ms": 1.0, "s": 1e3, "m": 6e4}[unit]
+    return number * scale
 # FINISH ### NGROK MANAGER ###
 
-# START ### URL MONITOR ###
-def monitor_tunnel():
-    """Monitor ngrok tunnel and display URL"""
-    with Progress(
-        SpinnerColumn(),
-        TextColumn("[progress.description]{task.description}"),
-        transient=True,
-    ) as progress:
-        task = progress.add_task("[cyan]Waiting for ngrok tunnel...", total=None)
-        
+# START ### TUNNEL SUPERVISOR ###
+class TunnelSupervisor:
+    """
+    Runs ngrok, reads its log stream as it comes (so the pipe never fills up),
+    picks up the public URL the moment the tunnel starts and brings ngrok
+    back with backoff when it dies. Stats go to a JSON file for the monitor.
+    """
+
+    def __init__(self, port=TUNNEL_PORT, binary=NGROK_BIN, stats_file=STATS_FILE,
+                 backoff_base=1.0, backoff_max=60.0, backoff_reset_after=60.0,
+                 stats_interval=STATS_INTERVAL):
+        self.port = port
+        self.binary = binary
+        self.stats_file = Path(stats_file) if stats_file else None
+        self.stats_interval = stats_interval
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.backoff_reset_after = backoff_reset_after
+        self.process = None
+        self.public_url = None
+        self.url_ready = asyncio.Event()
+        self.stopping = asyncio.Event()
+        self.starts = 0
+        self.restarts = 0
+        self.reconnects = 0
+        self.failures = 0
+        self.url_latencies = deque(maxlen=20)       # Seconds from spawn to published URL
+        self.heartbeat_latencies = deque(maxlen=50) # ms, from ngrok's session heartbeats
+        self.last_error = None
+        self._sessions_this_run = 0
+        self._spawned_at = None
+        self._stats_written = None # (state, monotonic time) of the last write
+
+    def command(self):
+        # Heartbeats (our tunnel latency numbers) are only logged at debug level
+        return [self.binary, "http", str(self.port), "--log=stdout", "--log-format=json", "--log-level=debug"]
+
+    def stats(self):
+        heartbeats = list(self.heartbeat_latencies)
+        return {
+            "public_url": self.public_url,
+            "pid": self.process.pid if self.process and self.process.returncode is None else None,
+            "starts": self.starts,
+            "restarts": self.restarts,
+            "reconnects": self.reconnects,
+            "url_latency": self.url_latencies[-1] if self.url_latencies else None,
+            "heartbeat_latency_ms": round(heartbeats[-1], 2) if heartbeats else None,
+            "heartbeat_latency_avg_ms": round(sum(heartbeats) / len(heartbeats), 2) if heartbeats else None,
+            "last_error": self.last_error,
+            "updated_at": time.time(),
+        }
+
+    def write_stats(self, force=False):
+        """
+        Atomic rewrite of the stats file. Heartbeats arrive every few seconds,
+        so unless something the monitor cares about changed (URL, pid, counters,
+        error) we only rewrite once per stats_interval.
+        """
+        if not self.stats_file:
+            return
+        stats = self.stats()
+        state = {k: v for k, v in stats.items() if not k.startswith("heartbeat") and k != "updated_at"}
+        now = time.monotonic()
+        if not force and self._stats_written:
+            last_state, last_at = self._stats_written
+            if state == last_state and now - last_at < self.stats_interval:
+                return
+        self._stats_written = (state, now)
+        try:
+            self.stats_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.stats_file.with_suffix(".tmp")
+            tmp.write_text(json.dumps(stats, indent=2))
+            os.replace(tmp, self.stats_file)
+        except OSError:
+            pass # Stats are nice to have, the tunnel is what matters
+
+    def handle_record(self, record):
+        """Update state from one parsed log record"""
+        msg = record.get("msg", "")
+        level = record.get("lvl", "")
+
+        if msg == "started tunnel" and record.get("url"):
+            url = record["url"]
+            if url.startswith("https://") or not self.public_url:
+                latency = round(time.monotonic() - self._spawned_at, 3)
+                self.url_latencies.append(latency)
+                if url != self.public_url:
+                    console.print(f"[green]Tunnel active: {url} ({latency:.1f}s)[/green]")
+                self.public_url = url
+                self.url_ready.set()
+        elif msg == "client session established":
+            self._sessions_this_run += 1
+            if self._sessions_this_run > 1:
+                self.reconnects += 1
+                console.print(f"[yellow]ngrok session re-established (reconnect #{self.reconnects})[/yellow]")
+        elif msg in ("session closing", "failed to reconnect session", "tunnel session failed"):
+            self.url_ready.clear()
+            self.last_error = record.get("err") or msg
+            console.print(f"[yellow]ngrok: {msg} {record.get('err', '')}[/yellow]")
+        elif level in ("eror", "crit", "error"):
+            self.last_error = record.get("err") or msg
+            console.print(f"[red]ngrok: {msg} {record.get('err', '')}[/red]")
+
+        if "latency" in record:
+            latency = parse_duration_ms(record["latency"])
+            if latency is not None:
+                self.heartbeat_latencies.append(latency)
+        self.write_stats()
+
+    async def _read_logs(self):
         while True:
-            url = get_ngrok_url()
-            if url:
-                progress.update(task, description=f"[green]Tunnel active: {url}")
-            else:
-                progress.update(task, description="[yellow]Waiting for tunnel...")
-            time.sleep(2)
-# FINISH ### URL MONITOR ###
+            try:
+                line = await self.process.stdout.readline()
+            except ValueError:
+                continue # Line over the 64 KiB stream limit, asyncio already dropped it
+            if not line:
+                break
+            record = parse_log_line(line.decode(errors="replace"))
+            if record:
+                self.handle_record(record)
+
+    async def run_once(self):
+        """Start ngrok and follow it until it exits. Returns its exit code."""
+        self._sessions_this_run = 0
+        self._spawned_at = time.monotonic()
+        self.starts += 1
+        self.process = await asyncio.create_subprocess_exec(
+            *self.command(), stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT
+        )
+        self.write_stats()
+        await self._read_logs()
+        code = await self.process.wait()
+        self.public_url = None
+        self.url_ready.clear()
+        return code
+
+    async def run(self):
+        """Keep a tunnel up until stop() is called"""
+        while not self.stopping.is_set():
+            started = time.monotonic()
+            try:
+                code = await self.run_once()
+            except OSError as e:
+                code = None
+                self.last_error = str(e)
+                console.print(f"[red]Error starting ngrok: {str(e)}[/red]")
+            if self.stopping.is_set():
+                break
+
+            ran_for = time.monotonic() - started
+            if ran_for >= self.backoff_reset_after:
+                self.failures = 0
+            self.failures += 1
+            delay = min(self.backoff_max, self.backoff_base * 2 ** (self.failures - 1))
+            console.print(f"[yellow]ngrok exited ({code}) after {ran_for:.1f}s, restarting in {delay:.1f}s[/yellow]")
+            self.write_stats()
+            try:
+                await asyncio.wait_for(self.stopping.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                self.restarts += 1
+        self.write_stats(force=True)
+
+    async def stop(self):
+        self.stopping.set()
+        if self.process and self.process.returncode is None:
+            self.process.terminate()
+            try:
+                await asyncio.wait_for(self.process.wait(), timeout=10)
+            except asyncio.TimeoutError:
+                self.process.kill()
+                await self.process.wait()
+# FINISH ### TUNNEL SUPERVISOR ###
 
 # START ### MAIN FUNCTION ###
+async def supervise():
+    supervisor = TunnelSupervisor()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, lambda: asyncio.ensure_future(supervisor.stop()))
+    console.print("[cyan]Waiting for ngrok tunnel...[/cyan]")
+    await supervisor.run()
+    console.print("\n[yellow]Ngrok tunnel terminated[/yellow]")
+
+
 def main():
     console.print(Panel.fit(
         "[cyan]NGROK TUNNEL MANAGER[/cyan]\n"
@@ -100,19 +287,9 @@ def main():
         console.print("[red]Failed to configure ngrok![/red]")
         sys.exit(1)
     
-    # Start tunnel
+    # Start and supervise the tunnel
     console.print("\n[cyan]Starting ngrok tunnel...[/cyan]")
-    process = start_ngrok_tunnel()
-    if not process:
-        console.print("[red]Failed to start ngrok tunnel![/red]")
-        sys.exit(1)
-    
-    # Monitor tunnel
-    try:
-        monitor_tunnel()
-    except KeyboardInterrupt:
-        process.terminate()
-        console.print("\n[yellow]Ngrok tunnel terminated by user[/yellow]")
+    asyncio.run(supervise())
 # FINISH ### MAIN FUNCTION ###
 
 # START ### SCRIPT RUNNER ###
@@ -9,7 +9,7 @@ echo ""
 
 export CUDA_VISIBLE_DEVICES=0,1
 
-python3 -m llama_cpp.server \
+python3 /app/scripts/llama_server_kv.py \
     --model /home/flintx/models/Mixtral-8x7B-v0.1-GGUF/Q4_K_M/mixtral-8x7b-v0.1.Q4_K_M.gguf \
     --host 0.0.0.0 \
     --port 8080 \
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+
+# START ### IMPORTS ###
+import os
+import json
+import time
+import asyncio
+from pathlib import Path
+from collections import OrderedDict
+# FINISH ### IMPORTS ###
+
+# START ### CONFIGURATION ###
+BUCKET_SECONDS = 10
+BUCKET_COUNT = 36              # 6 minutes of history per client
+MAX_CLIENTS = 256              # Past this the least recently seen client gets folded away
+ROLLUP_PATH = Path(os.environ.get("PROXY_USAGE_LOG", "/app/logs/token_usage.jsonl"))
+ROLLUP_INTERVAL = 60.0
+RATE_WINDOWS = (60, 300)       # Seconds, reported as tokens/s over each
+# FINISH ### CONFIGURATION ###
+
+# START ### RESPONSE METER ###
+class ResponseMeter:
+    """
+    Watches one OpenAI-compatible response go by. SSE gets parsed event by
+    event (one content delta = one token from llama_cpp.server), buffered JSON
+    gets its usage block read. Server-reported usage wins when it shows up.
+    """
+
+    def __init__(self, prompt_estimate=0, clock=time.monotonic):
+        self.clock = clock
+        self.started = clock()
+        self.first_token_at = None
+        self.last_token_at = None
+        self.prompt_tokens = None
+        self.completion_tokens = None
+        self.delta_tokens = 0
+        self.prompt_estimate = prompt_estimate
+        self._pending = b""
+
+    def feed_stream(self, chunk):
+        """Raw SSE bytes, split wherever the transport felt like it"""
+        self._pending += chunk
+        while b"\n\n" in self._pending:
+            event, self._pending = self._pending.split(b"\n\n", 1)
+            for line in event.split(b"\n"):
+                line = line.strip()
+                if line.startswith(b"data:"):
+                    self._on_event(line[5:].strip())
+
+    def _on_event(self, data):
+        if not data or data == b"[DONE]":
+            return
+        try:
+            event = json.loads(data)
+        except ValueError:
+            return
+        for choice in event.get("choices") or []:
+            delta = choice.get("delta") or {}
+            text = delta.get("content") if isinstance(delta, dict) else None
+            text = text if text is not None else choice.get("text") # /v1/completions streams text
+            if text:
+                now = self.clock()
+                self.first_token_at = self.first_token_at or now
+                self.last_token_at = now
+                self.delta_tokens += 1
+        self._take_usage(event.get("usage"))
+
+    def feed_body(self, body):
+        """A whole non-streaming response body"""
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return
+        if isinstance(payload, dict):
+            self.first_token_at = self.last_token_at = self.clock()
+            self._take_usage(payload.get("usage"))
+
+    def _take_usage(self, usage):
+        if isinstance(usage, dict):
+            if isinstance(usage.get("prompt_tokens"), int):
+                self.prompt_tokens = usage["prompt_tokens"]
+            if isinstance(usage.get("completion_tokens"), int):
+                self.completion_tokens = usage["completion_tokens"]
+
+    @property
+    def observed(self):
+        """False when nothing usable came back (backend error, empty reply)"""
+        return self.first_token_at is not None or self.completion_tokens is not None
+
+    def result(self):
+        """
+        (prompt_tokens, completion_tokens, generation_seconds, ttft or None).
+        generation_seconds runs from the first token to the last, so prefill
+        isn't counted as decoding; 0 for buffered responses, which only show
+        up whole.
+        """
+        completion = self.completion_tokens if self.completion_tokens is not None else self.delta_tokens
+        prompt = self.prompt_tokens if self.prompt_tokens is not None else self.prompt_estimate
+        generation = max(0.0, self.last_token_at - self.first_token_at) if self.first_token_at else 0.0
+        ttft = self.first_token_at - self.started if self.first_token_at else None
+        return prompt, completion, generation, ttft
+# FINISH ### RESPONSE METER ###
+
+# START ### ROLLING WINDOWS ###
+class RollingCounters:
+    """
+    Fixed ring of time buckets. Memory is BUCKET_COUNT slots per client no
+    matter how long it runs; stale slots get zeroed when reused.
+    """
+    FIELDS = ("requests", "prompt_tokens", "completion_tokens", "generation_tokens", "generation_seconds",
+              "ttft_sum", "ttft_count")
+
+    def __init__(self, bucket_seconds=BUCKET_SECONDS, bucket_count=BUCKET_COUNT):
+        self.bucket_seconds = bucket_seconds
+        self.bucket_count = bucket_count
+        self.slots = [-1] * bucket_count
+        self.values = [[0] * len(self.FIELDS) for _ in range(bucket_count)]
+
+    def add(self, now, **amounts):
+        slot = int(now // self.bucket_seconds)
+        index = slot % self.bucket_count
+        if self.slots[index] != slot:
+            self.slots[index] = slot
+            self.values[index] = [0] * len(self.FIELDS)
+        bucket = self.values[index]
+        for i, field in enumerate(self.FIELDS):
+            bucket[i] += amounts.get(field, 0)
+
+    def totals(self, now, seconds):
+        newest = int(now // self.bucket_seconds)
+        oldest = newest - max(1, int(seconds // self.bucket_seconds)) + 1
+        sums = [0] * len(self.FIELDS)
+        for slot, bucket in zip(self.slots, self.values):
+            if oldest <= slot <= newest:
+                for i, value in enumerate(bucket):
+                    sums[i] += value
+        return dict(zip(self.FIELDS, sums))
+# FINISH ### ROLLING WINDOWS ###
+
+# START ### TELEMETRY ###
+def label_value(value):
+    """Prometheus label value escaping (client comes from X-Forwarded-For, so anything goes)"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class TokenTelemetry:
+    """Per-client token accounting for everything going through the proxy."""
+
+    def __init__(self, rollup_path=ROLLUP_PATH, rollup_interval=ROLLUP_INTERVAL,
+                 max_clients=MAX_CLIENTS, clock=time.time):
+        self.rollup_path = Path(rollup_path) if rollup_path else None
+        self.rollup_interval = rollup_interval
+        self.max_clients = max_clients
+        self.clock = clock
+        self.clients = OrderedDict() # (source, client) -> RollingCounters
+        self.lifetime = OrderedDict() # (source, client) -> [requests, prompt, completion]
+        self.rolled = {}              # lifetime totals as of the last rollup
+        self.last_rollup = clock()
+
+    def record(self, source, client, meter):
+        prompt, completion, generation, ttft = meter.result()
+        key = (source, client)
+        if key not in self.clients:
+            if len(self.clients) >= self.max_clients:
+                evicted, _ = self.clients.popitem(last=False)
+                self.lifetime.pop(evicted)
+                self.rolled.pop(evicted, None)
+            self.clients[key] = RollingCounters()
+            self.lifetime[key] = [0, 0, 0]
+        self.clients.move_to_end(key)
+        self.lifetime.move_to_end(key)
+        self.clients[key].add(
+            self.clock(), requests=1, prompt_tokens=prompt, completion_tokens=completion,
+            # The tokens after the first are the ones generation_seconds covers
+            generation_tokens=max(0, completion - 1) if generation else 0, generation_seconds=generation,
+            ttft_sum=ttft or 0, ttft_count=1 if ttft is not None else 0
+        )
+        totals = self.lifetime[key]
+        totals[0] += 1
+        totals[1] += prompt
+        totals[2] += completion
+        return prompt, completion
+
+    def _window_stats(self, counters, now, seconds):
+        t = counters.totals(now, seconds)
+        return {
+            "requests": t["requests"],
+            "prompt_tokens": t["prompt_tokens"],
+            "completion_tokens": t["completion_tokens"],
+            "tokens_per_second": round(t["completion_tokens"] / seconds, 3),
+            # Decode speed while actually generating, not diluted by idle time
+            "generation_tokens_per_second": round(t["generation_tokens"] / t["generation_seconds"], 2) if t["generation_seconds"] else None,
+            "ttft_avg": round(t["ttft_sum"] / t["ttft_count"], 3) if t["ttft_count"] else None,
+        }
+
+    def snapshot(self):
+        now = self.clock()
+        clients = []
+        for (source, client), counters in self.clients.items():
+            requests, prompt, completion = self.lifetime[(source, client)]
+            clients.append({
+                "source": source, "client": client,
+                "total_requests": requests, "total_prompt_tokens": prompt, "total_completion_tokens": completion,
+                "windows": {f"{w}s": self._window_stats(counters, now, w) for w in RATE_WINDOWS},
+            })
+        return {"timestamp": now, "clients": clients}
+
+    def prometheus(self):
+        """Text exposition format for /proxy/metrics"""
+        now = self.clock()
+        lines = [
+            "# TYPE llm_requests_total counter",
+            "# TYPE llm_prompt_tokens_total counter",
+            "# TYPE llm_completion_tokens_total counter",
+            "# TYPE llm_completion_tokens_per_second gauge",
+        ]
+        for (source, client), counters in self.clients.items():
+            labels = f'source="{label_value(source)}",client="{label_value(client)}"'
+            requests, prompt, completion = self.lifetime[(source, client)]
+            lines.append(f"llm_requests_total{{{labels}}} {requests}")
+            lines.append(f"llm_prompt_tokens_total{{{labels}}} {prompt}")
+            lines.append(f"llm_completion_tokens_total{{{labels}}} {completion}")
+            for window in RATE_WINDOWS:
+                rate = counters.totals(now, window)["completion_tokens"] / window
+                lines.append(f'llm_completion_tokens_per_second{{{labels},window="{window}s"}} {rate:.4f}')
+        return "\n".join(lines) + "\n"
+
+    def rollup(self):
+        """Append one JSONL line per client with what it used since the last rollup"""
+        now = self.clock()
+        interval = max(now - self.last_rollup, 1.0)
+        self.last_rollup = now
+        rows = []
+        for key, totals in self.lifetime.items():
+            before = self.rolled.get(key, [0, 0, 0])
+            requests, prompt, completion = (t - b for t, b in zip(totals, before))
+            self.rolled[key] = list(totals)
+            if not requests:
+                continue
+            recent = self._window_stats(self.clients[key], now, RATE_WINDOWS[0])
+            rows.append({
+                "timestamp": round(now, 3), "interval": round(interval, 1),
+                "source": key[0], "client": key[1],
+                "requests": requests, "prompt_tokens": prompt, "completion_tokens": completion,
+                "tokens_per_second": round(completion / interval, 3),
+                "generation_tokens_per_second": recent["generation_tokens_per_second"],
+                "ttft_avg": recent["ttft_avg"],
+            })
+        if rows and self.rollup_path:
+            self.rollup_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.rollup_path, "a") as f:
+                for row in rows:
+                    f.write(json.dumps(row) + "\n")
+        return len(rows)
+
+    async def run_rollups(self):
+        while True:
+            await asyncio.sleep(self.rollup_interval)
+            try:
+                self.rollup()
+            except OSError:
+                pass # Full disk shouldn't take the proxy down
+# FINISH ### TELEMETRY ###
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+
+# START ### IMPORTS ###
+import os
+import gzip
+import json
+import time
+import asyncio
+import threading
+from pathlib import Path
+# FINISH ### IMPORTS ###
+
+# START ### CONFIGURATION ###
+TRACE_DIR = os.environ.get("PROXY_TRACE_DIR")        # Unset: nothing is recorded
+TRACE_REDACT = os.environ.get("PROXY_TRACE_REDACT", "none") # none | content
+SEGMENT_BYTES = 16 * 1024 * 1024                     # Compressed size before starting a new segment
+KEEP_SEGMENTS = 8                                     # Oldest segments beyond this get deleted
+FLUSH_INTERVAL = 2.0
+MAX_BUFFERED = 10000                                  # Past this, drop rather than grow (disk stuck)
+FILLER = "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+# FINISH ### CONFIGURATION ###
+
+# START ### REDACTION ###
+def filler_text(text):
+    """Same length, same rough token density, none of the words"""
+    if not text:
+        return text
+    return (FILLER * (len(text) // len(FILLER) + 1))[:len(text)]
+
+
+def redact(payload):
+    """Request body with every prompt/message text swapped for filler; params and shape kept for replay"""
+    if not isinstance(payload, dict):
+        return payload
+    payload = dict(payload)
+    if isinstance(payload.get("messages"), list):
+        messages = []
+        for message in payload["messages"]:
+            if isinstance(message, dict):
+                message = dict(message)
+                content = message.get("content")
+                if isinstance(content, str):
+                    message["content"] = filler_text(content)
+                elif isinstance(content, list):
+                    message["content"] = [{**p, "text": filler_text(p.get("text", ""))} if isinstance(p, dict) else p
+                                          for p in content]
+            messages.append(message)
+        payload["messages"] = messages
+    for key in ("prompt", "input"):
+        if isinstance(payload.get(key), str):
+            payload[key] = filler_text(payload[key])
+        elif isinstance(payload.get(key), list):
+            payload[key] = [filler_text(p) if isinstance(p, str) else p for p in payload[key]]
+    return payload
+# FINISH ### REDACTION ###
+
+# START ### RECORDER ###
+class TrafficRecorder:
+    """
+    One compact JSON line per model request: when it started, what was sent,
+    how it went (status, latency, time to first token, token counts). Lines
+    are buffered and appended every couple of seconds as a gzip member to the
+    current segment (trace-<start>.jsonl.gz). Segments rotate by size and
+    only the newest few are kept, so a busy week can't fill the disk.
+    """
+
+    def __init__(self, directory=TRACE_DIR, redaction=TRACE_REDACT, segment_bytes=SEGMENT_BYTES,
+                 keep_segments=KEEP_SEGMENTS, flush_interval=FLUSH_INTERVAL, clock=time.time):
+        self.directory = Path(directory)
+        self.redaction = redaction
+        self.segment_bytes = segment_bytes
+        self.keep_segments = keep_segments
+        self.flush_interval = flush_interval
+        self.clock = clock
+        self.buffer = []
+        self.segment = None
+        self.recorded = 0
+        self.dropped = 0
+        self._buffer_lock = threading.Lock() # finish() on the event loop, flush() in a worker thread
+        self._write_lock = threading.Lock()
+
+    def begin(self, method, path, source, payload, raw_body=b""):
+        """Start an entry; fill in status with the response and hand it to finish()"""
+        body = payload if isinstance(payload, dict) else None
+        if body is not None and self.redaction == "content":
+            body = redact(body)
+        return {
+            "t": round(self.clock(), 4), "method": method, "path": path, "source": source,
+            "stream": bool(body.get("stream")) if body else False,
+            "body": body, "body_bytes": len(raw_body or b""), "status": None,
+            "_started": time.monotonic(),
+        }
+
+    def finish(self, entry, meter=None):
+        entry["latency"] = round(time.monotonic() - entry.pop("_started"), 4)
+        if meter is not None and meter.observed:
+            prompt, completion, _, ttft = meter.result()
+            entry.update(prompt_tokens=prompt, completion_tokens=completion,
+                         ttft=round(ttft, 4) if ttft is not None else None)
+        with self._buffer_lock:
+            if len(self.buffer) >= MAX_BUFFERED:
+                self.dropped += 1
+                return
+            self.buffer.append(entry)
+
+    def _segment_path(self):
+        if self.segment is None or not self.segment.exists() or self.segment.stat().st_size >= self.segment_bytes:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self.segment = self.directory / f"trace-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.jsonl.gz"
+            segments = sorted(self.directory.glob("trace-*.jsonl.gz"), key=lambda p: p.stat().st_mtime)
+            for old in segments[:max(0, len(segments) + 1 - self.keep_segments)]:
+                old.unlink(missing_ok=True)
+        return self.segment
+
+    def flush(self):
+        with self._buffer_lock:
+            rows, self.buffer = self.buffer, []
+        if not rows:
+            return 0
+        data = "".join(json.dumps(row, separators=(",", ":")) + "\n" for row in rows).encode()
+        # Each flush is its own gzip member; readers see one continuous stream
+        with self._write_lock:
+            with open(self._segment_path(), "ab") as f:
+                f.write(gzip.compress(data, compresslevel=6))
+            self.recorded += len(rows)
+        return len(rows)
+
+    def stats(self):
+        return {"directory": str(self.directory), "recorded": self.recorded, "buffered": len(self.buffer),
+                "dropped": self.dropped, "redaction": self.redaction}
+
+    async def run_flushes(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await asyncio.to_thread(self.flush) # gzip + disk stay off the event loop
+            except OSError:
+                pass # Same as telemetry: a full disk doesn't take the proxy down
+# FINISH ### RECORDER ###
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+
+# START ### IMPORTS ###
+import os
+import json
+import time
+import shlex
+import hashlib
+import tempfile
+import subprocess
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from rich.console import Console
+from rich.table import Table
+# FINISH ### IMPORTS ###
+
+# START ### CONSOLE SETUP ###
+console = Console()
+# FINISH ### CONSOLE SETUP ###
+
+# START ### CONFIGURATION ###
+DEPLOY_DIR = Path.home() / "deploy.bolt"
+STEP_CACHE = Path.home() / ".local" / "share" / "deploy_bolt_steps.json"
+TERMINAL = "xfce4-terminal"
+# FINISH ### CONFIGURATION ###
+
+# START ### STEP DEFINITION ###
+class Step:
+    """
+    One unit of setup work. `command` is an argv list run in its own terminal
+    window (so prompts and sudo still work) unless window=False. `inputs` are
+    extra files whose contents feed the cache key on top of the command and
+    the script it runs. cache=False for steps that ask the user something and
+    have to run every time; steps downstream of one run every time too,
+    unless they declare the files it writes as inputs. detach=True is for long-running services: the
+    window gets opened and the step counts as done right away, never cached.
+    """
+
+    def __init__(self, name, title, command, deps=(), inputs=(), cache=True, window=True,
+                 detach=False, cwd=None):
+        self.name = name
+        self.title = title
+        self.command = list(command)
+        self.deps = list(deps)
+        self.inputs = [Path(p) for p in inputs]
+        self.cache = cache and not detach
+        self.window = window
+        self.detach = detach
+        self.cwd = str(cwd or DEPLOY_DIR)
+        self.key = None
+        self.status = "pending" # pending/running/done/cached/failed/skipped
+        self.started = None
+        self.finished = None
+
+    @property
+    def duration(self):
+        if self.started is None or self.finished is None:
+            return 0.0
+        return self.finished - self.started
+
+
+def script_step(name, title, script, deps=(), **kwargs):
+    """Step for a repo script, picking the interpreter off the extension."""
+    path = DEPLOY_DIR / script
+    interpreter = "python3" if path.suffix == ".py" else "bash"
+    return Step(name, title, [interpreter, str(path)], deps=deps, **kwargs)
+# FINISH ### STEP DEFINITION ###
+
+# START ### CACHE ###
+def _hash_file(path, digest):
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    except OSError:
+        digest.update(b"<missing>")
+
+
+def step_key(step, dep_keys):
+    """sha256 over the command, every file it names or declares, and the upstream keys."""
+    digest = hashlib.sha256()
+    digest.update(json.dumps(step.command).encode())
+    for arg in step.command:
+        if os.path.isfile(arg):
+            _hash_file(arg, digest)
+    for path in step.inputs:
+        digest.update(str(path).encode())
+        _hash_file(path, digest)
+    for dep_key in dep_keys:
+        digest.update(dep_key.encode())
+    return digest.hexdigest()
+
+
+def load_cache(path=STEP_CACHE):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def save_cache(cache, path=STEP_CACHE):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".steps.", suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(cache, f, indent=2)
+    os.replace(tmp, path)
+# FINISH ### CACHE ###
+
+# START ### RUNNERS ###
+def run_in_window(step):
+    """
+    Run the step in its own terminal window and block until it closes.
+    --disable-server keeps the terminal from handing the window to an existing
+    instance and returning right away. The exit code comes back via a file.
+    """
+    launch = f"cd {shlex.quote(step.cwd)}; {shlex.join(step.command)}"
+    if step.detach:
+        subprocess.Popen([TERMINAL, f"--title={step.title}", f"--command=bash -c {shlex.quote(launch)}"])
+        return 0
+    fd, status_path = tempfile.mkstemp(prefix=f"step-{step.name}-", suffix=".rc")
+    os.close(fd)
+    inner = (
+        f"{launch}; rc=$?; "
+        f"echo $rc > {shlex.quote(status_path)}; "
+        f"[ $rc -ne 0 ] && read -p 'Step failed ($rc). Press Enter to close...'; exit $rc"
+    )
+    try:
+        subprocess.run([TERMINAL, "--disable-server", f"--title={step.title}",
+                        f"--command=bash -c {shlex.quote(inner)}"])
+        with open(status_path) as f:
+            return int(f.read().strip() or 1)
+    except (OSError, ValueError):
+        return 1
+    finally:
+        os.unlink(status_path)
+
+
+def run_inline(step):
+    if step.detach:
+        subprocess.Popen(step.command, cwd=step.cwd)
+        return 0
+    return subprocess.run(step.command, cwd=step.cwd).returncode
+# FINISH ### RUNNERS ###
+
+# START ### STEP GRAPH ###
+class StepGraph:
+    """Runs steps as soon as their deps are done, independent ones side by side."""
+
+    def __init__(self, steps, cache_path=STEP_CACHE, max_workers=4):
+        self.steps = {s.name: s for s in steps}
+        self.cache_path = cache_path
+        self.max_workers = max_workers
+        self.order = self._topological_order()
+
+    def _topological_order(self):
+        order, state = [], {}
+
+        def visit(name, path):
+            if state.get(name) == "done":
+                return
+            if state.get(name) == "visiting":
+                raise ValueError(f"Step cycle: {' -> '.join(path + [name])}")
+            state[name] = "visiting"
+            for dep in self.steps[name].deps:
+                if dep not in self.steps:
+                    raise ValueError(f"Step '{name}' depends on unknown step '{dep}'")
+                visit(dep, path + [name])
+            state[name] = "done"
+            order.append(name)
+
+        for name in self.steps:
+            visit(name, [])
+        return order
+
+    def _execute(self, step):
+        step.started = time.monotonic()
+        console.print(f"[cyan]Launching {step.title}...[/cyan]")
+        rc = run_in_window(step) if step.window else run_inline(step)
+        step.finished = time.monotonic()
+        return rc
+
+    def _key(self, step):
+        """
+        Cache key for a step whose deps just finished, or None if it can't be
+        cached this run. Computed late on purpose: declared inputs are often
+        written by the steps upstream. An uncached upstream step has no key
+        saying what it produced, so only a step that hashes those outputs
+        itself (declared inputs) stays cacheable below it.
+        """
+        if not step.cache:
+            return None
+        dep_keys = []
+        for dep in step.deps:
+            if self.steps[dep].key is None:
+                if not step.inputs:
+                    return None
+                continue
+            dep_keys.append(self.steps[dep].key)
+        return step_key(step, dep_keys)
+
+    def run(self, force=False):
+        """Run the graph. Returns True if every step finished or was cached."""
+        cache = load_cache(self.cache_path)
+        for step in self.steps.values():
+            step.key = None
+
+        self.started = time.monotonic()
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while True:
+                for name in self.order:
+                    step = self.steps[name]
+                    if step.status != "pending":
+                        continue
+                    dep_states = [self.steps[d].status for d in step.deps]
+                    if any(s in ("failed", "skipped") for s in dep_states):
+                        step.status = "skipped"
+                        console.print(f"[yellow]Skipping {step.title}, an upstream step failed.[/yellow]")
+                        continue
+                    if not all(s in ("done", "cached") for s in dep_states):
+                        continue
+                    step.key = self._key(step)
+                    if step.key and not force and cache.get(name) == step.key:
+                        step.status = "cached"
+                        step.started = step.finished = time.monotonic()
+                        console.print(f"[dim]{step.title}: inputs unchanged, skipping.[/dim]")
+                        continue
+                    step.status = "running"
+                    running[pool.submit(self._execute, step)] = step
+
+                if not running:
+                    break # One pass in topological order settles everything runnable
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    step = running.pop(future)
+                    try:
+                        rc = future.result()
+                    except Exception as e:
+                        console.print(f"[red]{step.title} blew up: {e}[/red]")
+                        rc = 1
+                    if rc == 0:
+                        step.status = "done"
+                        if step.key:
+                            cache[step.name] = step.key
+                            save_cache(cache, self.cache_path)
+                        console.print(f"[green]✓ {step.title} ({step.duration:.1f}s)[/green]")
+                    else:
+                        step.status = "failed"
+                        cache.pop(step.name, None)
+                        save_cache(cache, self.cache_path)
+                        console.print(f"[red]✗ {step.title} exited with {rc}[/red]")
+
+        self.finished = time.monotonic()
+        self.report()
+        return all(s.status in ("done", "cached") for s in self.steps.values())
+
+    def critical_path(self):
+        """Chain of steps that set the finish time, walked back from the last to finish."""
+        ran = [s for s in self.steps.values() if s.finished is not None]
+        if not ran:
+            return []
+        step = max(ran, key=lambda s: s.finished)
+        path = [step]
+        while step.deps:
+            deps = [self.steps[d] for d in step.deps if self.steps[d].finished is not None]
+            if not deps:
+                break
+            step = max(deps, key=lambda s: s.finished)
+            path.append(step)
+        return list(reversed(path))
+
+    def report(self):
+        critical = {s.name for s in self.critical_path()}
+        table = Table(title="Setup steps", border_style="cyan")
+        for column in ("Step", "Status", "Start", "Duration", "Critical"):
+            table.add_column(column)
+        for name in self.order:
+            step = self.steps[name]
+            start = f"+{step.started - self.started:.1f}s" if step.started is not None else "-"
+            table.add_row(step.title, step.status, start, f"{step.duration:.1f}s",
+                          "*" if name in critical else "")
+        console.print(table)
+        wall = self.finished - self.started
+        serial = sum(s.duration for s in self.steps.values())
+        path_time = sum(self.steps[n].duration for n in critical)
+        console.print(f"[cyan]Wall time {wall:.1f}s, critical path {path_time:.1f}s, "
+                      f"serial would've been {serial:.1f}s.[/cyan]")
+# FINISH ### STEP GRAPH ###
@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Top-level tools import as modules; the services in scripts/ import their siblings directly
+sys.path[:0] = [str(ROOT), str(ROOT / "scripts")]
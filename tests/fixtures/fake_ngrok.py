@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Stand-in for the ngrok binary (point NGROK_BIN at it). Ignores its arguments,
+prints --log-format=json style lines to stdout and exits. Behaviour comes from
+the environment:
+
+  FAKE_NGROK_RUNS        file to append "<spawn timestamp> <argv as JSON>" per run to
+  FAKE_NGROK_URL_DELAY   seconds before "started tunnel" (unset: never starts one)
+  FAKE_NGROK_RECONNECTS  extra "client session established" lines after the first
+  FAKE_NGROK_HEARTBEATS  heartbeat lines with a latency field
+  FAKE_NGROK_LIFETIME    seconds to stay up after logging
+  FAKE_NGROK_EXIT        exit code
+"""
+import os
+import sys
+import json
+import time
+
+
+def log(msg, lvl="info", **fields):
+    print(json.dumps({"t": time.strftime("%Y-%m-%dT%H:%M:%S"), "lvl": lvl, "msg": msg, **fields}), flush=True)
+
+
+def main():
+    env = os.environ.get
+    if env("FAKE_NGROK_RUNS"):
+        with open(env("FAKE_NGROK_RUNS"), "a") as f:
+            f.write(f"{time.time()} {json.dumps(sys.argv[1:])}\n")
+
+    level = next((a.split("=", 1)[1] for a in sys.argv if a.startswith("--log-level=")), "info")
+    log("starting web service", addr="127.0.0.1:4040")
+    log("client session established", obj="tunnels.session")
+    if env("FAKE_NGROK_URL_DELAY") is not None:
+        time.sleep(float(env("FAKE_NGROK_URL_DELAY")))
+        log("started tunnel", obj="tunnels", name="command_line", addr="http://localhost:8080",
+            url="https://fake-tunnel.ngrok-free.app")
+    for _ in range(int(env("FAKE_NGROK_RECONNECTS", "0"))):
+        log("session closing", lvl="warn", obj="tunnels.session", err="connection reset by peer")
+        log("client session established", obj="tunnels.session")
+    # Like ngrok: heartbeats are debug lines, missing at the default info level
+    for i in range(int(env("FAKE_NGROK_HEARTBEATS", "0")) if level == "debug" else 0):
+        log("heartbeat received", lvl="dbug", obj="tunnels.session", latency=f"{40 + i}.5ms")
+    time.sleep(float(env("FAKE_NGROK_LIFETIME", "0")))
+    sys.exit(int(env("FAKE_NGROK_EXIT", "1")))
+
+
+if __name__ == "__main__":
+    main()
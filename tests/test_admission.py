@@ -0,0 +1,147 @@
+import asyncio
+
+import pytest
+
+from admission import AdmissionController, Shed
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def controller(clock, **kwargs):
+    kwargs.setdefault("max_concurrent", 1)
+    return AdmissionController(clock=clock, **kwargs)
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_queue_admits_by_priority_then_arrival(clock):
+    async def scenario():
+        admission = controller(clock)
+        admitted = [await admission.acquire("batch", 10)]
+        order = []
+
+        async def request(name, source):
+            admitted.append(await admission.acquire(source, 10))
+            order.append(name)
+
+        for name, source in [("batch-1", "batch"), ("remote-1", "remote"), ("bolt-1", "bolt"),
+                             ("remote-2", "remote"), ("local-1", "local")]:
+            asyncio.create_task(request(name, source))
+            await settle() # Pin the arrival order
+        assert admission.stats()["queue_depth"] == 5
+
+        while admission.active: # One slot: each release lets exactly the next one in
+            admission.release(admitted[-1])
+            await settle()
+        return order, admission.stats()
+
+    order, stats = asyncio.run(scenario())
+    assert order == ["bolt-1", "local-1", "remote-1", "remote-2", "batch-1"]
+    assert stats["active"] == 0 and stats["queue_depth"] == 0
+    assert stats["admitted"] == 6 and stats["admitted_remote"] == 2
+
+
+def test_token_budget_holds_back_the_head(clock):
+    async def scenario():
+        admission = controller(clock, max_concurrent=4, token_budget=100)
+        big = await admission.acquire("bolt", 80)
+        waiting = asyncio.create_task(admission.acquire("bolt", 50))
+        small = asyncio.create_task(admission.acquire("batch", 10)) # Fits, but must not jump the queue
+        await settle()
+        assert not waiting.done() and not small.done()
+        admission.release(big)
+        await settle()
+        assert waiting.done() and small.done()
+        return admission.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["active"] == 2 and stats["active_tokens"] == 60
+
+
+def test_predicted_wait_sheds_up_front(clock):
+    async def scenario():
+        admission = controller(clock)
+        running = await admission.acquire("bolt", 1000)
+        # 1000 cost units ahead at the initial 20/s: 50s, past remote's 30s but inside bolt's 120s
+        with pytest.raises(Shed) as shed:
+            await admission.acquire("remote", 10)
+        assert shed.value.reason == "Predicted wait exceeds deadline"
+        assert shed.value.retry_after == 50
+        bolt = asyncio.create_task(admission.acquire("bolt", 10))
+        await settle()
+        assert not bolt.done()
+
+        # Finishing the 1000 units in 2s teaches a faster rate, so remote fits next time
+        clock.now += 2
+        admission.release(running)
+        await settle()
+        assert admission.cost_per_second == pytest.approx(0.8 * 20 + 0.2 * 500)
+        queued = asyncio.create_task(admission.acquire("remote", 10))
+        await settle()
+        assert not queued.done() # Queued behind bolt, not shed
+        admission.release(bolt.result())
+        await settle()
+        assert queued.done()
+        return admission.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["shed_predicted"] == 1
+    assert stats["cost_per_second_estimate"] == 116.0
+
+
+def test_deadline_sheds_queued_requests_by_the_clock(clock):
+    async def scenario():
+        admission = controller(clock)
+        running = await admission.acquire("bolt", 10)
+        remote = asyncio.create_task(admission.acquire("remote", 10))
+        bolt = asyncio.create_task(admission.acquire("bolt", 10))
+        await settle()
+
+        clock.now += 31 # Past remote's 30s deadline, inside bolt's 120s
+        admission.release(running)
+        await settle()
+        with pytest.raises(Shed) as shed:
+            remote.result()
+        assert shed.value.reason == "Deadline passed while queued"
+        assert bolt.done() and bolt.result().admitted == clock.now
+        assert admission.waits[-1] == 31
+        return admission.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["shed_deadline"] == 1
+    assert stats["queue_depth"] == 0 and stats["active"] == 1
+
+
+def test_expired_requests_do_not_count_toward_predicted_wait(clock):
+    async def scenario():
+        admission = controller(clock)
+        await admission.acquire("bolt", 10)
+        stale = asyncio.create_task(admission.acquire("remote", 700))
+        await settle()
+        clock.now += 31
+        # With the stale 700 units still counted this would predict 36s; once shed, a new remote request queues fine
+        fresh = asyncio.create_task(admission.acquire("remote", 10))
+        await settle()
+        assert stale.done() and isinstance(stale.exception(), Shed)
+        assert not fresh.done()
+        fresh.cancel()
+        await settle()
+        return admission.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["shed_deadline"] == 1 and stats.get("shed_predicted", 0) == 0
+    assert stats["queue_depth"] == 0
@@ -0,0 +1,90 @@
+import json
+import threading
+
+import pytest
+
+from batch_infer import BatchRunner
+
+
+class Crash(BaseException):
+    """Gets past the runner's error handling, like the process dying mid-run"""
+
+
+class FakePoster:
+    def __init__(self, crash_after=None):
+        self.crash_after = crash_after
+        self.prompts = []
+        self.lock = threading.Lock()
+
+    def __call__(self, endpoint, path, body):
+        with self.lock:
+            if self.crash_after is not None and len(self.prompts) >= self.crash_after:
+                raise Crash()
+            self.prompts.append(body["prompt"])
+        return {"choices": [{"text": body["prompt"].upper()}], "usage": {"prompt_tokens": 1, "completion_tokens": 1}}
+
+
+@pytest.fixture
+def batch(tmp_path):
+    lines = [json.dumps({"id": i, "prompt": f"prompt {i}"}) for i in range(40)]
+    lines[5] = "" # Blank lines are kept track of but not answered
+    lines[17] = lines[3] # Same request twice: answered once
+    source = tmp_path / "input.jsonl"
+    source.write_text("\n".join(lines) + "\n")
+    return source, tmp_path / "output.jsonl"
+
+
+def answered(output):
+    raw = output.read_bytes()
+    assert b"\0" not in raw
+    return [json.loads(line) for line in raw.splitlines()]
+
+
+def expected_lines():
+    return [line for line in range(40) if line != 5]
+
+
+def crash_then_resume(source, output, between=None):
+    with pytest.raises(Crash):
+        BatchRunner(source, output, concurrency=2, poster=FakePoster(crash_after=12)).run()
+    if between:
+        between()
+    poster = FakePoster()
+    report = BatchRunner(source, output, concurrency=2, poster=poster).run()
+    return poster, report
+
+
+def test_resume_after_a_crash_writes_each_line_once(batch):
+    source, output = batch
+    poster, report = crash_then_resume(*batch)
+    results = answered(output)
+    assert sorted(r["line"] for r in results) == expected_lines()
+    assert all(r["response"]["choices"][0]["text"] == f"PROMPT {r['id']}" for r in results)
+    assert report["lines"] == 39 and report["errors"] == 0
+    # 38 distinct prompts, 12 answered before the crash: only the rest (plus the pair in flight) go out again
+    assert len(poster.prompts) <= 38 - 12 + 2
+
+
+@pytest.mark.parametrize("damage", ["delete", "shorten"])
+def test_missing_or_short_output_starts_over(batch, damage):
+    source, output = batch
+
+    def between():
+        if damage == "delete":
+            output.unlink()
+        else:
+            output.write_bytes(output.read_bytes()[:10])
+
+    poster, report = crash_then_resume(source, output, between)
+    assert sorted(r["line"] for r in answered(output)) == expected_lines()
+    assert report["lines"] == 39
+    assert len(poster.prompts) < 38 # Answers from before the crash came out of the result cache
+
+
+def test_finished_run_resumes_to_nothing(batch):
+    source, output = batch
+    BatchRunner(source, output, concurrency=2, poster=FakePoster()).run()
+    poster = FakePoster()
+    BatchRunner(source, output, concurrency=2, poster=poster).run()
+    assert poster.prompts == []
+    assert sorted(r["line"] for r in answered(output)) == expected_lines()
@@ -0,0 +1,96 @@
+import string
+
+from context_guard import CHAT_PATH, COMPLETIONS_PATH, EMBEDDINGS_PATH, ContextGuard
+from gguf_tokenizer import SPACE, TOKEN_CONTROL, TOKEN_NORMAL, Tokenizer
+
+# One token per character (plus BOS), so counts track text length
+CHARS = [SPACE] + [c for c in string.printable if not c.isspace()] + ["\n"]
+TOKENIZER = Tokenizer({
+    "tokenizer.ggml.model": "llama",
+    "tokenizer.ggml.tokens": ["<unk>", "<s>", "</s>"] + CHARS,
+    "tokenizer.ggml.token_type": [2, TOKEN_CONTROL, TOKEN_CONTROL] + [TOKEN_NORMAL] * len(CHARS),
+    "tokenizer.ggml.unknown_token_id": 0,
+    "tokenizer.ggml.bos_token_id": 1,
+})
+
+def guard(n_ctx, policy="trim", min_completion=10):
+    guard = ContextGuard(config_path="/nonexistent/server.json", policy=policy, min_completion=min_completion)
+    guard.load = lambda: (TOKENIZER, n_ctx)
+    return guard
+
+def chat(*turns, **extra):
+    messages = [{"role": role, "content": content} for role, content in turns]
+    return {"messages": messages, **extra}
+
+CONVERSATION = chat(
+    ("system", "Be brief."),
+    ("user", "first question " * 10),
+    ("assistant", "first answer " * 10),
+    ("user", "second question"),
+    ("assistant", "second answer"),
+    ("user", "third question"),
+)
+
+def tokens(payload):
+    return guard(10**6).count(CHAT_PATH, payload)
+
+def test_fits_passes_through_untouched():
+    payload = chat(("user", "hi"), max_tokens=5)
+    checked = guard(1000).check(CHAT_PATH, payload)
+    assert checked.payload is payload
+    assert checked.prompt_tokens == tokens(payload) == len("[INST] hi [/INST]") + 2 # BOS, space prefix
+    assert (checked.trimmed_messages, checked.clamped, checked.error) == (0, False, None)
+
+def test_trim_drops_whole_oldest_turns():
+    full = tokens(CONVERSATION)
+    checked = guard(full - 20).check(CHAT_PATH, CONVERSATION) # 10 reserved, so the first turn has to go
+    assert checked.error is None
+    assert checked.trimmed_messages == 2
+    roles = [m["role"] for m in checked.payload["messages"]]
+    assert roles == ["system", "user", "assistant", "user"] # System kept, still alternating
+    assert checked.payload["messages"][1]["content"] == "second question"
+    assert checked.prompt_tokens == tokens(checked.payload) < full
+    assert CONVERSATION["messages"][1]["role"] == "user" # Original left alone
+
+def test_trim_always_keeps_the_last_turn():
+    last_only = chat(("system", "Be brief."), ("user", "third question"))
+    n_ctx = tokens(last_only) + 10
+    checked = guard(n_ctx).check(CHAT_PATH, CONVERSATION)
+    assert checked.error is None and checked.trimmed_messages == 4
+    assert [m["content"] for m in checked.payload["messages"]] == ["Be brief.", "third question"]
+
+    checked = guard(n_ctx - 1).check(CHAT_PATH, CONVERSATION) # Not even the last turn fits
+    assert "maximum context length" in checked.error
+    assert checked.payload is CONVERSATION
+
+def test_reject_policy_refuses_instead_of_trimming():
+    checked = guard(tokens(CONVERSATION), policy="reject").check(CHAT_PATH, CONVERSATION)
+    assert checked.error.startswith(f"This model's maximum context length is {tokens(CONVERSATION)} tokens")
+    assert checked.trimmed_messages == 0
+
+def test_clamps_max_tokens_to_what_is_left():
+    payload = chat(("user", "hi"), max_tokens=500)
+    prompt = tokens(payload)
+    checked = guard(prompt + 100).check(CHAT_PATH, payload)
+    assert checked.clamped and checked.error is None
+    assert checked.payload["max_tokens"] == 100
+    assert payload["max_tokens"] == 500
+
+    rejected = guard(prompt + 100, policy="reject").check(CHAT_PATH, payload)
+    assert f"{prompt + 500} tokens" in rejected.error and not rejected.clamped
+
+def test_only_chat_requests_get_trimmed():
+    payload = {"prompt": "x" * 50, "max_tokens": 5}
+    assert "maximum context length" in guard(40).check(COMPLETIONS_PATH, payload).error
+    assert "maximum context length" in guard(40).check(EMBEDDINGS_PATH, {"input": "x" * 50}).error
+    assert guard(60).check(EMBEDDINGS_PATH, {"input": "x" * 50}).error is None
+
+def test_policy_off_and_uncountable_requests_pass():
+    assert guard(10, policy="off").check(CHAT_PATH, CONVERSATION).error is None
+    checked = guard(10).check("/v1/models", {})
+    assert checked.prompt_tokens is None and checked.error is None
+
+def test_odd_system_content_is_still_counted():
+    payload = chat(("system", [{"type": "text", "text": "Be brief."}]), ("user", "hi"))
+    assert tokens(payload) == tokens(chat(("system", "Be brief."), ("user", "hi")))
+    assert tokens(chat(("system", None), ("user", "hi"))) == tokens(chat(("user", "hi")))
@@ -0,0 +1,247 @@
+import random
+import sys
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("pyperclip")
+
+import core
+
+
+class FakeXclip:
+    """Stands in for ClipboardManager._read_target, recording every target asked for"""
+
+    def __init__(self, stamp=None, targets=b"TARGETS UTF8_STRING STRING"):
+        self.stamp = stamp
+        self.targets = targets
+        self.reads = []
+
+    def __call__(self, target):
+        self.reads.append(target)
+        return {"TIMESTAMP": self.stamp, "TARGETS": self.targets}.get(target)
+
+
+@pytest.fixture
+def clipboard(monkeypatch):
+    text = {"value": ""}
+    monkeypatch.setattr(core.pyperclip, "paste", lambda: text["value"])
+    monkeypatch.setattr(core.pyperclip, "copy", lambda value: text.update(value=value))
+    return text
+
+
+@pytest.fixture
+def manager(clipboard):
+    return core.ClipboardManager()
+
+
+@pytest.fixture
+def xclip(manager, monkeypatch):
+    fake = FakeXclip()
+    manager._xclip = "xclip"
+    monkeypatch.setattr(manager, "_read_target", fake)
+    return fake
+
+
+def test_pin_slots_are_never_handed_out_twice(manager):
+    # Replacing and explicit hotkeys release slots that never left the free heap
+    for content in "abc":
+        manager.pin_clip(content, hotkey="3")
+    manager.pin_clip("d")
+    manager.pin_clip("d", hotkey="5") # Moves off slot 1
+    manager.unpin_clip("5")
+    manager.unpin_clip("3")
+    assert sorted(manager._free_pin_slots) == list(range(1, manager.PIN_SLOTS + 1))
+
+    slots = [manager.pin_clip(f"clip {i}") for i in range(manager.PIN_SLOTS + 1)]
+    assert slots == [str(i) for i in range(1, manager.PIN_SLOTS + 1)] + [None]
+
+
+def test_no_timestamp_falls_back_to_text_only_reads(manager, xclip, clipboard):
+    clipboard["value"] = "hello"
+    manager.last_copied_content = manager._get_current_clipboard() # What the monitor does on a capture
+    assert manager.last_copied_content == "hello"
+    for _ in range(5):
+        assert manager._get_current_clipboard() == "hello"
+    assert xclip.reads == ["TIMESTAMP", "TARGETS"] # One full read, then no xclip forks at all
+
+    manager._rich_retry_at = 0.0 # Retry interval passed
+    manager._get_current_clipboard()
+    assert xclip.reads.count("TARGETS") == 2
+
+
+def test_new_text_reprobes_timestamp(manager, xclip, clipboard):
+    clipboard["value"] = "from a stampless app"
+    manager.last_copied_content = manager._get_current_clipboard()
+    manager._get_current_clipboard()
+    assert xclip.reads == ["TIMESTAMP", "TARGETS"]
+
+    # Copy in another app that does answer TIMESTAMP: asked right away, not after the retry interval
+    clipboard["value"] = "from a normal app"
+    xclip.stamp = b"777"
+    assert manager._get_current_clipboard() == "from a normal app"
+    manager.last_copied_content = "from a normal app"
+    assert manager._stampless_text is None
+    manager._get_current_clipboard()
+    assert xclip.reads == ["TIMESTAMP", "TARGETS", "TIMESTAMP", "TARGETS", "TIMESTAMP"]
+
+
+def test_unchanged_timestamp_with_nothing_recorded_is_not_an_error(manager, xclip, clipboard):
+    xclip.stamp = b"12345"
+    manager.last_copied_content = None # Clipboard was unreadable at startup
+    for _ in range(3):
+        assert manager._get_current_clipboard() == ""
+    assert xclip.reads.count("TARGETS") == 1
+
+    clipboard["value"] = "copied"
+    xclip.stamp = b"12346"
+    assert manager._get_current_clipboard() == "copied"
+
+
+def test_text_only_reads_keep_the_html_clip(manager, xclip, clipboard, monkeypatch):
+    xclip.targets = b"TARGETS text/html UTF8_STRING"
+    monkeypatch.setattr(manager, "_read_target", lambda target: xclip(target) or (b"<b>hi</b>" if target == "text/html" else None))
+    clipboard["value"] = "hi"
+    payload = manager._get_current_clipboard()
+    assert payload.mime == "text/html" and payload.alt_text == "hi"
+    manager.last_copied_content = payload
+    assert manager._get_current_clipboard() is payload # Text-only poll, same clip
+    assert xclip.reads.count("TARGETS") == 1
+
+
+def test_pinned_payload_outlives_history(clipboard):
+    manager = core.ClipboardManager(max_history=2)
+    image = manager.payloads.intern("image/png", b"\x89PNG pinned")
+    manager._add_to_history(image)
+    manager.pin_clip(1, hotkey="4")
+    manager.pin_clip(image) # Already pinned: no second reference
+    manager._add_to_history("a")
+    manager._add_to_history("b") # Image scrolls out of history, the pin still holds it
+    assert manager.payloads.stats() == (1, image.size)
+    assert manager.payloads.intern("image/png", b"\x89PNG pinned") is image # Same buffer, still deduped
+
+    manager.pin_clip(image, hotkey="7") # Moving it keeps exactly one reference
+    manager.unpin_clip("7")
+    assert manager.payloads.stats() == (0, 0)
+
+
+def test_same_bytes_as_two_types_keep_separate_references(manager):
+    html = manager.payloads.intern("text/html", b"<b>x</b>")
+    manager.payloads.retain(html)
+    as_text = manager.payloads.intern("text/uri-list", b"<b>x</b>")
+    assert as_text is not html and manager.payloads.stats()[0] == 2
+    manager.payloads.retain(as_text)
+    manager.payloads.release(html) # The uri-list clip still has its own reference
+    assert manager.payloads.intern("text/uri-list", b"<b>x</b>") is as_text
+    manager.payloads.release(as_text)
+    assert manager.payloads.stats() == (0, 0)
+
+
+def test_history_container_stress():
+    history = core.ClipHistory(maxlen=25)
+    problems = []
+    done = threading.Event()
+
+    def writer():
+        for i in range(20000):
+            history.append((i, f"clip-{i}"))
+        done.set()
+
+    def clearer():
+        while not done.is_set():
+            history.clear()
+            time.sleep(0.001)
+
+    def reader():
+        last_version = -1
+        while not done.is_set():
+            version, entries = history.snapshot()
+            if version < last_version:
+                problems.append(f"version went backwards: {last_version} -> {version}")
+            if len(entries) > 25:
+                problems.append(f"snapshot over maxlen: {len(entries)}")
+            seqs = [seq for seq, _ in entries]
+            if seqs != sorted(seqs, reverse=True):
+                problems.append(f"snapshot out of order at v{version}")
+            last_version = version
+            for _ in core.HistoryView(version, entries): # Iterating must never blow up mid-write
+                pass
+
+    run_threads([reader] * 8 + [clearer, writer])
+    assert problems == []
+
+
+def test_manager_stress_keeps_versions_and_refcounts_consistent(clipboard):
+    manager = core.ClipboardManager(max_history=10)
+    images = [b"\x89PNG %d" % i for i in range(6)] # Few distinct images: lots of dedupe hits
+    problems = []
+    done = threading.Event()
+
+    def adder(seed):
+        rng = random.Random(seed)
+        for i in range(3000):
+            if rng.random() < 0.5:
+                manager._add_to_history(manager.payloads.intern("image/png", rng.choice(images)))
+            else:
+                manager._add_to_history(f"text {seed}-{i}")
+
+    def clearer():
+        while not done.is_set():
+            manager.clear_history()
+            time.sleep(0.002)
+
+    def pinner(seed):
+        rng = random.Random(seed)
+        while not done.is_set():
+            if rng.random() < 0.6:
+                manager.pin_clip(rng.randint(1, 10), hotkey=str(rng.randint(1, 4)) if rng.random() < 0.3 else None)
+            else:
+                manager.unpin_clip(str(rng.randint(1, 9)))
+
+    def reader(use_view):
+        last_version = -1
+        while not done.is_set():
+            if use_view:
+                view = manager.history_view()
+                version, entries = view.version, list(view)
+            else:
+                version, entries = manager.history.snapshot()[0], manager.get_history()
+            if version < last_version:
+                problems.append(f"version went backwards: {last_version} -> {version}")
+            if len(entries) > 10:
+                problems.append(f"history over maxlen: {len(entries)}")
+            last_version = version
+
+    def adders():
+        run_threads([lambda s=s: adder(s) for s in range(3)])
+        done.set()
+
+    run_threads([adders, clearer, lambda: pinner(1), lambda: pinner(2), lambda: reader(True), lambda: reader(False)])
+    assert problems == []
+
+    # Every payload reference is a history entry or a pin, and nothing else is left in the store
+    held = [content for _, content in manager.get_history()]
+    held += [content for _, content in manager.get_pinned_clips().values()]
+    expected = {}
+    for content in held:
+        if isinstance(content, core.ClipPayload):
+            expected[(content.digest, content.mime)] = expected.get((content.digest, content.mime), 0) + 1
+    assert {key: slot[1] for key, slot in manager.payloads._payloads.items()} == expected
+    payloads = {content for content in held if isinstance(content, core.ClipPayload)}
+    assert manager.payloads.stats() == (len(payloads), sum(payload.size for payload in payloads))
+    assert len(manager._free_pin_slots) == len(set(manager._free_pin_slots)) # No slot handed out twice
+    assert set(manager.get_pinned_clips()) | set(map(str, manager._free_pin_slots)) >= {str(i) for i in range(1, 10)}
+
+
+def run_threads(targets):
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6) # Switch threads as often as possible: races show up in a second, not a week
+    try:
+        threads = [threading.Thread(target=target) for target in targets]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(switch_interval)
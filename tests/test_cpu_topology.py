@@ -0,0 +1,134 @@
+import pytest
+
+from cpu_topology import format_cpu_list, parse_cpu_list, plan_affinity, read_topology, wrap_command
+
+SERVICES = ["llama_server", "llama_server_green", "bolt", "ngrok"]
+
+
+def fake_sysfs(root, cpus, nodes=None):
+    """cpus: {cpu id: (package, core_id)}; nodes: {node: [cpu ids]} (no node dir when None)"""
+    (root / "cpu").mkdir(parents=True)
+    (root / "cpu" / "online").write_text(format_cpu_list(cpus) + "\n")
+    for cpu, (package, core_id) in cpus.items():
+        topology = root / "cpu" / f"cpu{cpu}" / "topology"
+        topology.mkdir(parents=True)
+        (topology / "physical_package_id").write_text(f"{package}\n")
+        (topology / "core_id").write_text(f"{core_id}\n")
+    for node, ids in (nodes or {}).items():
+        (root / "node" / f"node{node}").mkdir(parents=True)
+        (root / "node" / f"node{node}" / "cpulist").write_text(format_cpu_list(ids) + "\n")
+    return root
+
+
+@pytest.fixture
+def smt_box(tmp_path):
+    # 8 cores x 2 threads, Linux numbering: cpu N and N+8 are siblings
+    return fake_sysfs(tmp_path, {cpu: (0, cpu % 8) for cpu in range(16)})
+
+
+@pytest.fixture
+def two_node_box(tmp_path):
+    # 2 sockets x 4 cores x 2 threads; node 0 = cpus 0-3,8-11, node 1 = 4-7,12-15
+    cpus = {cpu: (cpu % 8 // 4, cpu % 4) for cpu in range(16)}
+    return fake_sysfs(tmp_path, cpus, {0: [0, 1, 2, 3, 8, 9, 10, 11], 1: [4, 5, 6, 7, 12, 13, 14, 15]})
+
+
+@pytest.mark.parametrize("text, cpus", [
+    ("0", [0]),
+    ("0-3", [0, 1, 2, 3]),
+    ("0-3,8,10-11", [0, 1, 2, 3, 8, 10, 11]),
+    ("1,3,5", [1, 3, 5]),
+    ("0-1,4-5", [0, 1, 4, 5]),
+])
+def test_cpu_list_round_trip(text, cpus):
+    assert parse_cpu_list(text + "\n") == cpus
+    assert format_cpu_list(cpus) == text
+    assert format_cpu_list(reversed(cpus)) == text
+
+
+def test_cpu_list_edge_cases():
+    assert parse_cpu_list("") == []
+    assert format_cpu_list([]) == ""
+
+
+def test_read_topology_groups_smt_siblings(smt_box):
+    topology = read_topology(smt_box, allowed=set(range(16)))
+    assert topology.nodes() == [0]
+    cores = topology.cores()
+    assert len(cores) == 8
+    assert list(cores.values()) == [[cpu, cpu + 8] for cpu in range(8)]
+
+
+def test_read_topology_respects_allowed_mask(smt_box):
+    topology = read_topology(smt_box, allowed={0, 1, 8, 9})
+    assert sorted(cpu.id for cpu in topology.cpus) == [0, 1, 8, 9]
+    assert list(topology.cores().values()) == [[0, 8], [1, 9]]
+
+
+def test_read_topology_without_core_ids_treats_each_cpu_as_a_core(tmp_path):
+    (tmp_path / "cpu").mkdir()
+    (tmp_path / "cpu" / "online").write_text("0-3\n")
+    topology = read_topology(tmp_path, allowed={0, 1, 2, 3})
+    assert list(topology.cores().values()) == [[0], [1], [2], [3]]
+
+
+def test_single_node_plan_takes_one_sibling_per_core_and_reserves_helpers(smt_box):
+    plan = plan_affinity(read_topology(smt_box, allowed=set(range(16))), SERVICES, numactl="")
+    # Default reserve: ~1 core in 8, all of its threads go to the helpers
+    assert plan["n_threads"] == 7
+    assert plan["inference_cpus"] == "0-6"
+    assert plan["helper_cpus"] == "7,15"
+    assert plan["services"]["llama_server"]["prefix"] == ["taskset", "-c", "0-6"]
+    assert plan["services"]["llama_server_green"]["cpus"] == "0-6"
+    assert plan["services"]["bolt"]["prefix"] == ["taskset", "-c", "7,15"]
+
+
+def test_single_node_plan_honours_helper_cores_and_keeps_a_server_core(smt_box):
+    topology = read_topology(smt_box, allowed=set(range(16)))
+    plan = plan_affinity(topology, SERVICES, helper_cores=3, numactl="")
+    assert plan["inference_cpus"] == "0-4"
+    assert plan["helper_cpus"] == "5-7,13-15"
+    plan = plan_affinity(topology, SERVICES, helper_cores=99, numactl="")
+    assert plan["inference_cpus"] == "0"
+    assert plan["n_threads"] == 1
+
+
+def test_single_core_box_shares_everything(tmp_path):
+    root = fake_sysfs(tmp_path, {0: (0, 0)})
+    plan = plan_affinity(read_topology(root, allowed={0}), SERVICES, numactl="")
+    assert plan["inference_cpus"] == plan["helper_cpus"] == "0"
+
+
+def test_two_node_plan_pins_server_with_numactl_and_helpers_elsewhere(two_node_box):
+    topology = read_topology(two_node_box, allowed=set(range(16)))
+    assert topology.nodes() == [0, 1]
+    plan = plan_affinity(topology, SERVICES, numactl="/usr/bin/numactl")
+    assert plan["node"] == 0
+    assert plan["n_threads"] == 4
+    assert plan["inference_cpus"] == "0-3"
+    assert plan["helper_cpus"] == "4-7,12-15"
+    assert plan["services"]["llama_server"]["prefix"] == [
+        "/usr/bin/numactl", "--physcpubind=0-3", "--cpunodebind=0", "--preferred=0"]
+    assert plan["services"]["ngrok"]["prefix"] == ["taskset", "-c", "4-7,12-15"]
+    assert wrap_command(["llama"], plan, "llama_server")[0] == "/usr/bin/numactl"
+
+
+def test_two_node_plan_picks_the_bigger_node(two_node_box):
+    # cpuset leaves only one core of node 0: the server moves to node 1
+    topology = read_topology(two_node_box, allowed={0, 8, 4, 5, 6, 12, 13, 14})
+    plan = plan_affinity(topology, SERVICES, numactl="/usr/bin/numactl")
+    assert plan["node"] == 1
+    assert plan["inference_cpus"] == "4-6"
+    assert plan["helper_cpus"] == "0,8"
+
+
+def test_two_node_plan_without_numactl_falls_back_to_taskset(two_node_box):
+    plan = plan_affinity(read_topology(two_node_box, allowed=set(range(16))), SERVICES, numactl="")
+    assert plan["services"]["llama_server"]["prefix"] == ["taskset", "-c", "0-3"]
+
+
+def test_wrap_command_leaves_unplanned_services_alone(smt_box):
+    plan = plan_affinity(read_topology(smt_box, allowed=set(range(16))), SERVICES, numactl="")
+    assert wrap_command(["redis-server"], plan, "redis") == ["redis-server"]
+    assert wrap_command(["redis-server"], None, "redis") == ["redis-server"]
+    assert wrap_command(["bolt"], plan, "bolt") == ["taskset", "-c", "7,15", "bolt"]
@@ -0,0 +1,91 @@
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+
+import cuda_tags
+from cuda_tags import TagIndex, ingest, ingest_dumps
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+FIRST = FIXTURES / "cuda_tags_dump_1.json"  # jq-built JSON array, like cuda_tags_database.json
+SECOND = FIXTURES / "cuda_tags_dump_2.txt"  # Plain text dump, one page line per line
+SCRAPED_AT = datetime(2025, 3, 31, tzinfo=timezone.utc)
+
+DEVEL = "12.2.2-devel-ubuntu22.04"
+RUNTIME = "12.2.2-runtime-ubuntu22.04"
+
+
+@pytest.fixture
+def index():
+    index = TagIndex(())
+    ingest_dumps(index, [FIRST], scraped_at=SCRAPED_AT)
+    return index
+
+
+def test_first_dump_adds_every_image(index):
+    assert len(index) == 5
+    assert index.newest("devel", "ubuntu22.04", cuda_prefix="12").tag == DEVEL
+    assert index.newest("devel", "ubuntu22.04", cuda_prefix="12.1").tag == "12.1.1-devel-ubuntu22.04"
+    assert index.newest("devel", "ubuntu22.04", "arm64").digest == "bbbbbbbbbbb1"
+    assert index.newest("devel", "ubuntu22.04", cudnn="cudnn8").cuda_version == "11.8.0"
+    assert all(r.tag != "latest" for r in index.records) # Tags we don't model are skipped
+    assert index.history[cuda_tags.history_key(DEVEL, "amd64")] == [
+        ["aaaaaaaaaaa1", "2025-03-01", "2025-03-31T00:00:00+00:00"]
+    ]
+
+
+def test_second_dump_adds_and_records_repush(index):
+    report = ingest_dumps(index, [SECOND], scraped_at=SCRAPED_AT)
+    assert report.added == [("12.4.1-devel-ubuntu22.04", "amd64")]
+    assert report.repushed == [(DEVEL, "amd64")]
+    # arm64 kept its digest; only the tag's "Last pushed" text moved. runtime grew.
+    assert report.updated == [(DEVEL, "arm64"), (RUNTIME, "amd64")]
+    assert report.removed == []
+    assert report.unchanged == 1
+    assert index.newest("devel", "ubuntu22.04").tag == "12.4.1-devel-ubuntu22.04"
+    assert index.newest("devel", "ubuntu22.04", cuda_prefix="12.1") is not None # Not a full listing: kept
+    history = index.history[cuda_tags.history_key(DEVEL, "amd64")]
+    assert [entry[0] for entry in history] == ["aaaaaaaaaaa1", "aaaaaaaaaaa2"]
+    assert history[-1][1] == "2025-03-29"
+    assert len(index.history[cuda_tags.history_key(DEVEL, "arm64")]) == 1 # Same digest, no new entry
+    assert index.last_ingest["added"] == 1 and index.last_ingest["sources"] == [str(SECOND)]
+
+
+def test_prune_drops_images_missing_from_a_full_listing(index):
+    report = ingest_dumps(index, [SECOND], prune=True, scraped_at=SCRAPED_AT)
+    assert report.removed == [("12.1.1-devel-ubuntu22.04", "amd64")]
+    assert index.newest("devel", "ubuntu22.04", cuda_prefix="12.1") is None
+    assert len(index) == 5
+
+
+def test_reingesting_the_same_dump_changes_nothing(index):
+    ingest_dumps(index, [SECOND], prune=True, scraped_at=SCRAPED_AT)
+    records, history = list(index.records), {k: list(v) for k, v in index.history.items()}
+    report = ingest_dumps(index, [SECOND], prune=True, scraped_at=SCRAPED_AT)
+    assert report.summary() == {"added": 0, "repushed": 0, "updated": 0, "removed": 0, "unchanged": 5}
+    assert index.records == records
+    assert index.history == history
+
+
+def test_ingest_round_trips_through_the_index_file(tmp_path):
+    path = tmp_path / "cuda_tags_index.json"
+    assert ingest([FIRST], path).summary()["added"] == 5
+    report = ingest([SECOND], path, prune=True)
+    assert report.summary()["removed"] == 1
+    loaded = TagIndex.load(path)
+    assert len(loaded) == 5
+    assert loaded.newest("devel", "ubuntu22.04").digest == "99999999999a"
+    assert [e[0] for e in loaded.history[cuda_tags.history_key(DEVEL, "amd64")]] == ["aaaaaaaaaaa1", "aaaaaaaaaaa2"]
+    assert list(tmp_path.iterdir()) == [path] # Atomic save leaves no temp files behind
+
+
+@pytest.mark.parametrize("prefix, expected", [
+    ("12.x", DEVEL),
+    ("12.*", DEVEL),
+    ("12.1.x", "12.1.1-devel-ubuntu22.04"),
+    ("x", DEVEL), # Nothing before the wildcard: any version
+    ("11", None), # 11.8.0 is a cudnn8 image, not plain devel
+])
+def test_wildcard_cuda_prefixes(index, prefix, expected):
+    newest = index.newest("devel", "ubuntu22.04", "amd64", prefix)
+    assert (newest.tag if newest else None) == expected
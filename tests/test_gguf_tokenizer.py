@@ -0,0 +1,127 @@
+import pytest
+
+from gguf_tokenizer import BPE_SPLIT, SPACE, TOKEN_BYTE, TOKEN_CONTROL, TOKEN_NORMAL, Tokenizer, bytes_to_unicode
+
+TEMPLATE = ("{{ bos_token }}{% for m in messages %}<|{{ m['role'] }}|>{{ m['content'] }}{% endfor %}"
+            "{% if add_generation_prompt %}<|assistant|>{% endif %}")
+
+
+def spm(pieces, **metadata):
+    """SentencePiece vocab: <unk> <s> </s>, the byte tokens for €, then (piece, score) pairs"""
+    control = ["<unk>", "<s>", "</s>"]
+    byte_tokens = ["<0xE2>", "<0x82>", "<0xAC>"]
+    tokens = control + byte_tokens + [p for p, _ in pieces]
+    types = [2, TOKEN_CONTROL, TOKEN_CONTROL] + [TOKEN_BYTE] * 3 + [TOKEN_NORMAL] * len(pieces)
+    return Tokenizer({
+        "tokenizer.ggml.model": "llama",
+        "tokenizer.ggml.tokens": tokens,
+        "tokenizer.ggml.scores": [0.0] * 6 + [s for _, s in pieces],
+        "tokenizer.ggml.token_type": types,
+        "tokenizer.ggml.unknown_token_id": 0,
+        "tokenizer.ggml.bos_token_id": 1,
+        "tokenizer.ggml.eos_token_id": 2,
+        **metadata,
+    })
+
+
+def pieces_of(tokenizer, text):
+    return [tokenizer.tokens[i] for i in tokenizer.encode(text, add_bos=False)]
+
+
+LETTERS = [(SPACE, -10.0), ("h", -10.0), ("e", -10.0), ("l", -10.0), ("o", -10.0)]
+
+
+def test_spm_merges_best_scoring_pair_first():
+    # "ll" outscores "el": e + ll has nowhere to go, so the word ends up ▁h e ll
+    ll_first = spm(LETTERS + [(SPACE + "h", -1.0), ("el", -2.0), ("ll", -0.5), ("hel", -1.5), (SPACE + "hel", -1.0)])
+    assert pieces_of(ll_first, "hell") == [SPACE + "h", "e", "ll"]
+    # Same vocab with "el" on top: h el, then ▁h el -> ▁hel, leaving the last l
+    el_first = spm(LETTERS + [(SPACE + "h", -1.0), ("el", -0.5), ("ll", -2.0), ("hel", -1.5), (SPACE + "hel", -1.0)])
+    assert pieces_of(el_first, "hell") == [SPACE + "hel", "l"]
+
+
+def test_spm_space_prefix_bos_and_words():
+    tokenizer = spm(LETTERS + [(SPACE + "h", -1.0), ("lo", -1.0)])
+    assert tokenizer.encode("hello")[0] == tokenizer.bos_id
+    assert pieces_of(tokenizer, "hello hello") == [SPACE + "h", "e", "l", "lo"] * 2
+    no_prefix = spm(LETTERS + [(SPACE + "h", -1.0)], **{"tokenizer.ggml.add_space_prefix": False})
+    assert pieces_of(no_prefix, "he") == ["h", "e"]
+
+
+def test_spm_byte_fallback_and_unknown():
+    tokenizer = spm(LETTERS)
+    assert pieces_of(tokenizer, "€") == [SPACE, "<0xE2>", "<0x82>", "<0xAC>"]
+    assert pieces_of(tokenizer, "ü") == [SPACE, "<unk>", "<unk>"] # No byte tokens for c3 bc
+
+
+def test_spm_matches_special_tokens_in_text():
+    tokenizer = spm(LETTERS)
+    assert pieces_of(tokenizer, "<s>he</s>") == ["<s>", SPACE, "h", "e", "</s>"]
+    spelled = tokenizer.encode("<s>", add_bos=False, special=False)
+    assert tokenizer.bos_id not in spelled and len(spelled) == 4 # ▁ plus three unknowns
+
+
+def bpe(merges):
+    encoder = bytes_to_unicode()
+    alphabet = [encoder[b] for b in range(256)]
+    merged = ["".join(m.split(" ")) for m in merges]
+    tokens = ["<|begin|>"] + alphabet + merged
+    return Tokenizer({
+        "tokenizer.ggml.model": "gpt2",
+        "tokenizer.ggml.tokens": tokens,
+        "tokenizer.ggml.token_type": [TOKEN_CONTROL] + [TOKEN_NORMAL] * (len(tokens) - 1),
+        "tokenizer.ggml.merges": merges,
+        "tokenizer.ggml.bos_token_id": 0,
+    })
+
+
+def test_bpe_pre_tokenizer_splits():
+    assert BPE_SPLIT.findall("Hello world's 123  go!") == ["Hello", " world", "'s", " 123", " ", " go", "!"]
+
+
+def test_bpe_merges_by_rank_within_pre_tokens():
+    tokenizer = bpe(["l l", "h e", "he ll", "o Ġ", "Ġ w"])
+    assert not tokenizer.add_bos
+    assert pieces_of(tokenizer, "hello") == ["hell", "o"]
+    # "o Ġ" would merge across the " world" boundary; the pre-tokenizer keeps them apart
+    assert pieces_of(tokenizer, "hello world") == ["hell", "o", "Ġw", "o", "r", "l", "d"]
+    assert pieces_of(tokenizer, "é") == ["Ã", "©"] # Byte-level: two bytes, two symbols
+
+
+def test_render_chat_uses_the_gguf_template():
+    pytest.importorskip("jinja2")
+    tokenizer = spm(LETTERS, **{"tokenizer.chat_template": TEMPLATE})
+    messages = [{"role": "system", "content": "sys"}, {"role": "user", "content": "hi"}]
+    prompt = tokenizer.render_chat(messages)
+    assert prompt == "<s><|system|>sys<|user|>hi<|assistant|>"
+    # The template wrote <s> itself, so no second BOS gets counted
+    assert tokenizer.count_chat_tokens(messages) == tokenizer.count_tokens(prompt, add_bos=False)
+
+
+def test_render_chat_llama2_fallback():
+    tokenizer = spm(LETTERS)
+    messages = [
+        {"role": "system", "content": "Be brief."},
+        {"role": "user", "content": "hi"},
+        {"role": "assistant", "content": "hello"},
+        {"role": "user", "content": "again"},
+    ]
+    assert tokenizer.render_chat(messages) == (
+        "[INST] <<SYS>>\nBe brief.\n<</SYS>>\n\nhi [/INST] hello [INST] again [/INST]")
+
+
+@pytest.mark.parametrize("content, expected", [
+    ([{"type": "text", "text": "Be "}, {"type": "text", "text": "brief."}], "<<SYS>>\nBe brief.\n<</SYS>>\n\n"),
+    (None, ""),
+])
+def test_render_chat_fallback_coerces_system_content(content, expected):
+    tokenizer = spm(LETTERS)
+    messages = [{"role": "system", "content": content}, {"role": "user", "content": [{"type": "text", "text": "hi"}]}]
+    assert tokenizer.render_chat(messages) == f"[INST] {expected}hi [/INST]"
+
+
+def test_rejects_unknown_models():
+    with pytest.raises(ValueError):
+        Tokenizer({"tokenizer.ggml.model": "bert", "tokenizer.ggml.tokens": ["a"]})
+    with pytest.raises(ValueError):
+        Tokenizer({"tokenizer.ggml.model": "llama"})
@@ -0,0 +1,102 @@
+import pytest
+
+import kv_snapshots
+
+
+class StubBase:
+    """Stands in for llama_cpp's BaseLlamaCache"""
+
+    def __init__(self, capacity_bytes):
+        self.capacity_bytes = capacity_bytes
+
+
+class StubState:
+    def __init__(self, tokens):
+        self.input_ids = StubIds(tokens)
+        self.llama_state_size = 100 * len(tokens)
+
+
+class StubIds(list):
+    def tolist(self):
+        return list(self)
+
+
+class StubLlama:
+    """
+    The cache protocol of llama_cpp.Llama: look the prompt up, maybe load the
+    state, generate, then `cache[tokens] = save_state()`. Method names are
+    deliberately not llama_cpp's: skipping must not depend on them.
+    """
+
+    def __init__(self):
+        self.cache = None
+        self.saves = 0
+        self.loaded = []
+
+    def set_cache(self, cache):
+        self.cache = cache
+
+    def save_state(self):
+        self.saves += 1 # The expensive full KV copy
+        return StubState([0])
+
+    def load_state(self, state):
+        self.loaded.append(state)
+
+    def generate(self, tokens):
+        if self.cache:
+            try:
+                self.load_state(self.cache[tokens])
+            except KeyError:
+                pass
+        yield "token"
+        if self.cache:
+            self.cache[tokens + [99]] = self.save_state()
+
+
+@pytest.fixture
+def llama(monkeypatch):
+    monkeypatch.setattr(kv_snapshots, "_cache_base", lambda: StubBase)
+    llama = StubLlama()
+    prefix = list(range(1, 41))
+    llama.set_cache(kv_snapshots.make_cache({"prefix": StubState(prefix)}, min_match=32))
+    llama.prefix = prefix
+    return llama
+
+
+def test_completions_skip_the_state_copy(llama):
+    original = kv_snapshots.skip_cache_saves(llama)
+    list(llama.generate(llama.prefix + [7, 8])) # Hit
+    list(llama.generate([5, 6, 7])) # Miss
+    assert llama.saves == 0
+    assert len(llama.loaded) == 1 and llama.cache.hits == 1 and llama.cache.misses == 1
+    assert not llama.cache.save_pending
+
+    assert llama.save_state() is not None # Explicit saves are real
+    assert original() is not None
+    assert llama.saves == 2
+
+
+def test_other_caches_still_get_real_states(llama):
+    kv_snapshots.skip_cache_saves(llama)
+    saved = {}
+
+    class PlainCache:
+        def __bool__(self):
+            return True
+
+        def __getitem__(self, key):
+            raise KeyError(key)
+
+        def __setitem__(self, key, value):
+            saved[tuple(key)] = value
+
+    llama.set_cache(PlainCache())
+    list(llama.generate([1, 2, 3]))
+    assert llama.saves == 1 and saved[(1, 2, 3, 99)] is not None
+
+
+def test_without_the_skip_every_completion_copies(llama):
+    list(llama.generate(llama.prefix + [7]))
+    list(llama.generate(llama.prefix + [8]))
+    assert llama.saves == 2 # What the skip is there to avoid
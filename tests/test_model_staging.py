@@ -0,0 +1,61 @@
+import json
+
+import pytest
+
+from model_staging import StagingCache
+
+
+def model(tmp_path, name, size):
+    path = tmp_path / "models" / name
+    path.parent.mkdir(exist_ok=True)
+    path.write_bytes(b"\1" * size)
+    return path
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return StagingCache(tmp_path / "staging", quota_bytes=1500) # Room for one 1000-byte model
+
+
+def test_quota_evicts_least_recently_used(tmp_path, cache):
+    old, new = model(tmp_path, "old.gguf", 1000), model(tmp_path, "new.gguf", 1000)
+    old_staged = cache.stage(old)
+    assert cache.stage(new)
+    assert [e["source"] for e in cache.entries()] == [str(new)]
+    assert not (tmp_path / old_staged).exists()
+
+
+@pytest.mark.parametrize("by", ["source", "staged path"])
+def test_protected_live_model_survives_a_tight_quota(tmp_path, cache, by):
+    live, incoming = model(tmp_path, "live.gguf", 1000), model(tmp_path, "incoming.gguf", 1000)
+    live_staged = cache.stage(live)
+    protect = [live] if by == "source" else [live_staged]
+    assert cache.stage(incoming, protect=protect) is None # Serves from the volume instead
+    assert cache.lookup(live) == live_staged
+    assert (tmp_path / live_staged).read_bytes() == live.read_bytes()
+    assert cache.lookup(incoming) is None
+
+
+def test_swap_keeps_the_live_slots_staged_copy(tmp_path, monkeypatch):
+    pytest.importorskip("huggingface_hub")
+    pytest.importorskip("tqdm")
+    import hot_swap
+    import huggingface
+
+    live, incoming = model(tmp_path, "live.gguf", 1000), model(tmp_path, "incoming.gguf", 1000)
+    cache = StagingCache(tmp_path / "staging", quota_bytes=1500)
+    live_staged = cache.stage(live)
+    server_config = tmp_path / "server.json"
+    server_config.write_text(json.dumps({"model_path": live_staged, "source_model_path": str(live), "port": 8080}))
+
+    monkeypatch.setattr(hot_swap, "SERVER_CONFIG", server_config)
+    monkeypatch.setattr(huggingface, "StagingCache", lambda: cache)
+    monkeypatch.setattr(huggingface, "model_companions", lambda path: [])
+    monkeypatch.setattr(huggingface, "check_system_specs", lambda: {})
+    monkeypatch.setattr(huggingface, "generate_server_config", lambda path, specs: {
+        "model_path": cache.lookup(path) or str(path), "source_model_path": str(path)})
+
+    config = hot_swap.build_config(str(incoming), {}, 8082)
+    assert config["model_path"] == str(incoming) and config["port"] == 8082
+    assert cache.lookup(live) == live_staged
+    assert (tmp_path / live_staged).exists()
@@ -0,0 +1,113 @@
+import asyncio
+import importlib
+import json
+from pathlib import Path
+
+import pytest
+
+import run_ngrok
+
+FAKE_NGROK = Path(__file__).resolve().parent / "fixtures" / "fake_ngrok.py"
+
+
+@pytest.fixture
+def ngrok(monkeypatch, tmp_path):
+    """run_ngrok re-imported with NGROK_BIN pointing at the fake binary"""
+    monkeypatch.setenv("NGROK_BIN", str(FAKE_NGROK))
+    monkeypatch.setenv("NGROK_STATS_FILE", str(tmp_path / "ngrok_stats.json"))
+    monkeypatch.setenv("FAKE_NGROK_RUNS", str(tmp_path / "runs"))
+    yield importlib.reload(run_ngrok)
+    importlib.reload(run_ngrok)
+
+
+def spawns(tmp_path):
+    """(timestamp, argv) per fake ngrok run"""
+    runs = tmp_path / "runs"
+    lines = runs.read_text().splitlines() if runs.exists() else []
+    return [(float(stamp), json.loads(argv)) for stamp, argv in (line.split(" ", 1) for line in lines)]
+
+
+def spawn_times(tmp_path):
+    return [stamp for stamp, _ in spawns(tmp_path)]
+
+
+async def supervise_until(supervisor, done, timeout=10):
+    """Run the supervisor until done() is true, then stop it"""
+    task = asyncio.create_task(supervisor.run())
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not done():
+        assert asyncio.get_running_loop().time() < deadline, "supervisor never got there"
+        await asyncio.sleep(0.02)
+    await supervisor.stop()
+    await asyncio.wait_for(task, timeout=5)
+
+
+def test_url_latency_and_reconnects(ngrok, monkeypatch, tmp_path):
+    monkeypatch.setenv("FAKE_NGROK_URL_DELAY", "0.3")
+    monkeypatch.setenv("FAKE_NGROK_RECONNECTS", "2")
+    monkeypatch.setenv("FAKE_NGROK_HEARTBEATS", "3")
+    monkeypatch.setenv("FAKE_NGROK_LIFETIME", "30")
+    supervisor = ngrok.TunnelSupervisor(port=8080)
+    assert supervisor.binary == str(FAKE_NGROK)
+
+    async def run():
+        task = asyncio.create_task(supervisor.run())
+        await asyncio.wait_for(supervisor.url_ready.wait(), timeout=10)
+        url, latency = supervisor.public_url, supervisor.url_latencies[-1]
+        deadline = asyncio.get_running_loop().time() + 10
+        while len(supervisor.heartbeat_latencies) < 3 and asyncio.get_running_loop().time() < deadline:
+            await asyncio.sleep(0.02)
+        await supervisor.stop()
+        await asyncio.wait_for(task, timeout=5)
+        return url, latency
+
+    url, latency = asyncio.run(run())
+    assert url == "https://fake-tunnel.ngrok-free.app"
+    assert 0.3 <= latency < 5
+    assert supervisor.reconnects == 2
+    assert list(supervisor.heartbeat_latencies) == [40.5, 41.5, 42.5]
+    assert supervisor.starts == 1 and supervisor.restarts == 0
+    [(_, argv)] = spawns(tmp_path)
+    assert argv == ["http", "8080", "--log=stdout", "--log-format=json", "--log-level=debug"]
+    assert supervisor.last_error == "connection reset by peer"
+    stats = json.loads((tmp_path / "ngrok_stats.json").read_text())
+    assert stats["reconnects"] == 2 and stats["url_latency"] == latency
+    assert stats["public_url"] is None and stats["pid"] is None # Final write after ngrok is gone
+
+
+def test_restart_backoff_doubles(ngrok, tmp_path):
+    supervisor = ngrok.TunnelSupervisor(backoff_base=0.1, backoff_max=0.4)
+    asyncio.run(supervise_until(supervisor, lambda: len(spawn_times(tmp_path)) >= 5))
+    spawns = spawn_times(tmp_path)
+    gaps = [b - a for a, b in zip(spawns, spawns[1:])]
+    # Immediate exits: 0.1, 0.2, 0.4, then capped at backoff_max
+    for gap, delay in zip(gaps, [0.1, 0.2, 0.4, 0.4]):
+        assert delay <= gap < delay + 1.0
+    assert gaps[1] > gaps[0] and gaps[2] > gaps[1]
+    assert supervisor.restarts == len(spawns) - 1
+    assert supervisor.starts == len(spawns)
+    assert supervisor.reconnects == 0 and not supervisor.url_latencies
+
+
+def test_backoff_resets_after_a_long_run(ngrok, tmp_path):
+    supervisor = ngrok.TunnelSupervisor(backoff_base=0.1, backoff_reset_after=0)
+    asyncio.run(supervise_until(supervisor, lambda: len(spawn_times(tmp_path)) >= 4))
+    assert supervisor.failures == 1 # Every run counts as long enough, so no doubling
+
+
+def test_heartbeats_alone_do_not_rewrite_stats(ngrok, tmp_path):
+    stats_file = tmp_path / "ngrok_stats.json"
+    supervisor = ngrok.TunnelSupervisor(stats_file=stats_file, stats_interval=3600)
+    supervisor._spawned_at = 0.0
+    supervisor.write_stats()
+    for i in range(100):
+        supervisor.handle_record({"lvl": "dbug", "msg": "heartbeat received", "latency": f"{i}ms"})
+    assert json.loads(stats_file.read_text())["heartbeat_latency_ms"] is None
+    supervisor.handle_record({"lvl": "info", "msg": "started tunnel", "url": "https://x.ngrok-free.app"})
+    stats = json.loads(stats_file.read_text())
+    assert stats["public_url"] == "https://x.ngrok-free.app"
+    assert stats["heartbeat_latency_ms"] == 99.0
+
+    supervisor.stats_interval = 0 # Interval elapsed: the next heartbeat goes out
+    supervisor.handle_record({"lvl": "dbug", "msg": "heartbeat received", "latency": "7ms"})
+    assert json.loads(stats_file.read_text())["heartbeat_latency_ms"] == 7.0
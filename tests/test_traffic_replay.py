@@ -0,0 +1,170 @@
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import threading
+import subprocess
+from pathlib import Path
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+import requests
+
+import traffic_replay
+from traffic_recorder import filler_text
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+class StubBackend(BaseHTTPRequestHandler):
+    """OpenAI-ish backend: SSE when asked to stream, one JSON body otherwise. Remembers every body it got."""
+    protocol_version = "HTTP/1.1"
+    received = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        self.received.append(body)
+        tokens = min(body.get("max_tokens") or 4, 4)
+        usage = {"prompt_tokens": 5, "completion_tokens": tokens, "total_tokens": 5 + tokens}
+        if body.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            events = [{"choices": [{"delta": {"content": f"tok{i} "}}]} for i in range(tokens)]
+            events.append({"choices": [{"delta": {}, "finish_reason": "stop"}], "usage": usage})
+            for event in events:
+                time.sleep(0.01)
+                data = f"data: {json.dumps(event)}\n\n".encode()
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.wfile.flush()
+            data = b"data: [DONE]\n\n"
+            self.wfile.write(b"%x\r\n%s\r\n0\r\n\r\n" % (len(data), data))
+        else:
+            time.sleep(0.02)
+            data = json.dumps({"choices": [{"message": {"content": "hi " * tokens}}], "usage": usage}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise TimeoutError(f"Nothing listening on {port}")
+
+
+@pytest.fixture
+def backend():
+    StubBackend.received = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubBackend)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+
+def record_traffic(tmp_path, backend_port):
+    """Run the proxy with --trace-dir, push a burst of mixed traffic through it, stop it so it flushes"""
+    port = free_port()
+    env = {**os.environ, "PROXY_SERVER_CONFIG": str(tmp_path / "no_server.json"),
+           "PROXY_USAGE_LOG": str(tmp_path / "usage.jsonl")}
+    proxy = subprocess.Popen(
+        [sys.executable, str(ROOT / "scripts" / "llm_proxy.py"), "--host", "127.0.0.1", "--port", str(port),
+         "--backend-port", str(backend_port), "--route-file", "", "--trace-dir", str(tmp_path / "traces"),
+         "--trace-redact", "content"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        wait_for_port(port)
+
+        def client(i):
+            body = {"messages": [{"role": "user", "content": f"secret prompt {i}"}], "max_tokens": 3 + i % 2,
+                    "stream": i % 2 == 0}
+            with requests.post(f"http://127.0.0.1:{port}/v1/chat/completions", json=body, stream=True,
+                               headers={"X-LLM-Source": "bolt"}, timeout=10) as response:
+                assert response.status_code == 200
+                for _ in response.iter_lines():
+                    pass
+
+        threads = []
+        for i in range(6):
+            threads.append(threading.Thread(target=client, args=(i,)))
+            threads[-1].start()
+            time.sleep(0.03)
+        for thread in threads:
+            thread.join()
+    finally:
+        proxy.send_signal(signal.SIGTERM)
+        _, stderr = proxy.communicate(timeout=10)
+    assert proxy.returncode == 0, stderr.decode()
+    return tmp_path / "traces"
+
+
+def test_record_replay_and_diff(tmp_path, backend, capsys):
+    traces = record_traffic(tmp_path, backend)
+
+    entries = traffic_replay.read_entries([traces])
+    assert len(entries) == 6
+    assert all(e["status"] == 200 and e["source"] == "bolt" for e in entries)
+    assert all(e["ttft"] is not None and e["completion_tokens"] == e["body"]["max_tokens"] for e in entries)
+    assert sum(e["stream"] for e in entries) == 3
+    # Redacted: same length, none of the words
+    contents = [e["body"]["messages"][0]["content"] for e in entries]
+    assert all(len(c) == len("secret prompt 0") and "secret" not in c for c in contents)
+
+    StubBackend.received = []
+    output = tmp_path / "replay.jsonl"
+    results = traffic_replay.replay(entries, f"http://127.0.0.1:{backend}", speed=4, output=str(output),
+                                    deterministic=True)
+    assert [r["status"] for r in results] == [200] * 6
+    assert [r["completion_tokens"] for r in results] == [e["completion_tokens"] for e in entries]
+    assert sorted(b["max_tokens"] for b in StubBackend.received) == sorted(e["completion_tokens"] for e in entries)
+    assert all(b["temperature"] == 0 and b["seed"] == traffic_replay.REPLAY_SEED for b in StubBackend.received)
+
+    capsys.readouterr()
+    assert traffic_replay.main(["diff", str(traces), str(output), "--json"]) == 0
+    report = json.loads(capsys.readouterr().out)
+    assert report["status"] == {"baseline": {"200": 6}, "candidate": {"200": 6}}
+    assert report["metrics"]["latency"]["count"] == [6, 6]
+    assert report["metrics"]["ttft"]["count"] == [6, 6]
+    for row in report["metrics"]["latency"]["rows"].values():
+        assert row["baseline"] > 0 and row["candidate"] > 0 and row["delta_percent"] is not None
+    assert 0 <= report["metrics"]["latency"]["ks"] <= 1
+    assert report["peak_concurrency"]["baseline"] >= 1
+
+
+def test_replay_keeps_recorded_spacing(backend):
+    """Open loop: 1s of recorded gaps at 4x takes about 0.25s, regardless of how long answers take"""
+    entries = [{"t": 100.0 + 0.5 * i, "path": "/v1/chat/completions", "source": "local", "stream": False,
+                "body": {"messages": [{"role": "user", "content": "x"}], "max_tokens": 2}} for i in range(3)]
+    started = time.monotonic()
+    results = traffic_replay.replay(entries, f"http://127.0.0.1:{backend}", speed=4)
+    assert [r["status"] for r in results] == [200] * 3
+    assert 0.25 <= time.monotonic() - started < 2.0
+    assert all(r["lag"] < 0.2 for r in results)
+
+
+def test_filler_text_is_linear():
+    text = "w" * 200_000
+    started = time.monotonic()
+    filler = filler_text(text)
+    assert len(filler) == len(text) and "w" not in filler
+    assert time.monotonic() - started < 0.5
@@ -44,19 +44,20 @@ def list_tokens(token_dir, token_type):
     rprint(f"[bright_yellow]#{len(tokens) + 1}[/] Enter new token")
     return tokens
 
+def save_current_tokens(tokens):
+    """Save the selected tokens where huggingface.py picks them up"""
+    token_dir = Path.home() / "deploy.bolt" / "tokens"
+    with open(token_dir / "current_ngrok_token", 'w') as f:
+        f.write(tokens["ngrok"])
+    with open(token_dir / "current_hf_token", 'w') as f:
+        f.write(tokens["hf"])
+
 def launch_huggingface(tokens):
     """Launch huggingface.py in a new Terminator window and close current window"""
     try:
-        # Save current tokens to temporary files for huggingface.py
-        token_dir = Path.home() / "deploy.bolt" / "tokens"
+        save_current_tokens(tokens)
         deploy_bolt_dir = str(Path.home() / "deploy.bolt")
 
-        # Save selected tokens to their respective files
-        with open(token_dir / "current_ngrok_token", 'w') as f:
-            f.write(tokens["ngrok"])
-        with open(token_dir / "current_hf_token", 'w') as f:
-            f.write(tokens["hf"])
-
         # Create a shell script to launch huggingface.py
         script_path = deploy_bolt_dir + "/launch_hf.sh"
         with open(script_path, 'w') as f:
@@ -144,6 +145,11 @@ def main():
     if tokens:
         rprint("\n[bright_green]✓ Tokens collected successfully![/bright_green]")
 
+        # Step graph in launch.py runs huggingface.py itself once this exits
+        if "--no-launch" in sys.argv:
+            save_current_tokens(tokens)
+            sys.exit(0)
+
         # Launch huggingface.py in new terminal and close this one
         if launch_huggingface(tokens):
             rprint("[bright_green]✓ Launching HuggingFace interface in new terminal...[/bright_green]")
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+
+# START ### IMPORTS ###
+import sys
+import gzip
+import json
+import time
+import argparse
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from rich.console import Console
+from rich.table import Table
+# FINISH ### IMPORTS ###
+
+# START ### CONSOLE SETUP ###
+console = Console()
+# FINISH ### CONSOLE SETUP ###
+
+# START ### CONFIGURATION ###
+TRACE_DIR = Path("/app/logs/traces") # Where llm_proxy.py --trace-dir is pointed in the container
+ENDPOINT = "http://127.0.0.1:8081"
+MAX_WORKERS = 64          # Upper bound on replayed requests in flight
+REQUEST_TIMEOUT = 600.0
+PERCENTILES = (50, 90, 95, 99)
+REPLAY_SEED = 1234        # --deterministic: same sampling every run
+# FINISH ### CONFIGURATION ###
+
+# START ### TRACE FILES ###
+def trace_files(paths):
+    files = []
+    for path in map(Path, paths):
+        files.extend(sorted(path.glob("trace-*.jsonl.gz")) if path.is_dir() else [path])
+    return files
+
+
+def read_entries(paths):
+    """Entries from traces (.jsonl.gz, multi-member) or replay results (.jsonl), oldest first"""
+    entries = []
+    for path in trace_files(paths):
+        opener = gzip.open if path.suffix == ".gz" else open
+        try:
+            with opener(path, "rt") as f:
+                for line in f:
+                    if line.strip():
+                        entries.append(json.loads(line))
+        except (EOFError, gzip.BadGzipFile): # Segment still being written when we read it
+            pass
+    entries.sort(key=lambda e: e["t"])
+    return entries
+
+
+def peak_concurrency(entries):
+    """Most requests overlapping at once, from start times and latencies"""
+    events = sorted([(e["t"], 1) for e in entries] + [(e["t"] + (e.get("latency") or 0), -1) for e in entries],
+                    key=lambda event: (event[0], event[1]))
+    peak = current = 0
+    for _, change in events:
+        current += change
+        peak = max(peak, current)
+    return peak
+# FINISH ### TRACE FILES ###
+
+# START ### REPLAY ###
+def prepare_body(entry, match_tokens=True, deterministic=False):
+    """The recorded body, made comparable: same completion length as the original, optionally fixed sampling"""
+    body = dict(entry["body"])
+    recorded = entry.get("completion_tokens")
+    if match_tokens and isinstance(recorded, int) and recorded > 0:
+        limit = body.get("max_tokens")
+        body["max_tokens"] = min(recorded, limit) if isinstance(limit, int) and limit > 0 else recorded
+    if deterministic:
+        body["temperature"] = 0
+        body["seed"] = REPLAY_SEED
+    return body
+
+
+def send(session, endpoint, entry, body, timeout=REQUEST_TIMEOUT):
+    """Issue one request like the original client did. Returns (status, ttft, completion tokens)."""
+    started = time.monotonic()
+    headers = {"X-LLM-Source": entry.get("source") or "local"}
+    with session.post(endpoint + entry["path"], json=body, stream=True, timeout=timeout, headers=headers) as response:
+        ttft, tokens, usage = None, 0, None
+        if entry.get("stream"):
+            for line in response.iter_lines():
+                if not line.startswith(b"data:") or line[5:].strip() == b"[DONE]":
+                    continue
+                try:
+                    event = json.loads(line[5:])
+                except ValueError:
+                    continue
+                for choice in event.get("choices") or []:
+                    delta = choice.get("delta") or {}
+                    if delta.get("content") or choice.get("text"):
+                        ttft = ttft if ttft is not None else time.monotonic() - started
+                        tokens += 1
+                usage = event.get("usage") or usage
+        else:
+            data = response.content
+            ttft = time.monotonic() - started
+            try:
+                usage = json.loads(data).get("usage")
+            except (ValueError, AttributeError):
+                usage = None
+        if isinstance(usage, dict) and isinstance(usage.get("completion_tokens"), int):
+            tokens = usage["completion_tokens"]
+        return response.status_code, ttft, tokens
+
+
+def replay(entries, endpoint=ENDPOINT, speed=1.0, max_workers=MAX_WORKERS, match_tokens=True, deterministic=False,
+           output=None):
+    """
+    Open-loop replay: request i goes out (t_i - t_0) / speed after the start,
+    whether or not earlier ones have answered, so the overlap the trace had
+    is the overlap the target gets. Start lag (how late we actually sent it)
+    is recorded so a saturated replayer can't pass for a slow server.
+    """
+    entries = [e for e in entries if isinstance(e.get("body"), dict)]
+    if not entries:
+        return []
+    local = threading.local()
+    results = []
+    lock = threading.Lock()
+    out = open(output, "w") if output else None
+    t0 = entries[0]["t"]
+    started = time.monotonic()
+
+    def run(entry, due):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        sent = time.monotonic()
+        result = {"t": round(time.time(), 4), "path": entry["path"], "source": entry.get("source"),
+                  "stream": entry.get("stream"), "original_t": entry["t"], "lag": round(sent - due, 4)}
+        try:
+            status, ttft, tokens = send(session, endpoint, entry, prepare_body(entry, match_tokens, deterministic))
+            result.update(status=status, ttft=round(ttft, 4) if ttft is not None else None, completion_tokens=tokens)
+        except requests.RequestException as e:
+            result.update(status=None, error=str(e))
+        result["latency"] = round(time.monotonic() - sent, 4)
+        with lock:
+            results.append(result)
+            if out:
+                out.write(json.dumps(result) + "\n")
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for entry in entries:
+            due = started + (entry["t"] - t0) / speed
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(run, entry, due)
+    if out:
+        out.close()
+    results.sort(key=lambda r: r["original_t"])
+    return results
+# FINISH ### REPLAY ###
+
+# START ### DISTRIBUTIONS ###
+def percentile(values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, int(round(pct / 100.0 * len(values) + 0.5)) - 1))]
+
+
+def ks_distance(a, b):
+    """Largest gap between the two empirical CDFs (0 = same distribution, 1 = disjoint)"""
+    if not a or not b:
+        return None
+    i = j = 0
+    gap = 0.0
+    while i < len(a) and j < len(b):
+        value = min(a[i], b[j])
+        while i < len(a) and a[i] <= value:
+            i += 1
+        while j < len(b) and b[j] <= value:
+            j += 1
+        gap = max(gap, abs(i / len(a) - j / len(b)))
+    return round(gap, 3)
+
+
+def summarize(entries, metric):
+    values = sorted(e[metric] for e in entries if e.get(metric) is not None and e.get("status") == 200)
+    summary = {f"p{p}": percentile(values, p) for p in PERCENTILES}
+    summary.update(count=len(values), mean=round(sum(values) / len(values), 4) if values else None,
+                   max=values[-1] if values else None)
+    return summary, values
+
+
+def compare(baseline, candidate):
+    """Per-metric percentile diff (candidate vs baseline) and KS distance, plus status counts"""
+    report = {"metrics": {}, "status": {}}
+    for metric in ("latency", "ttft"):
+        base, base_values = summarize(baseline, metric)
+        cand, cand_values = summarize(candidate, metric)
+        rows = {}
+        for key in [f"p{p}" for p in PERCENTILES] + ["mean", "max"]:
+            delta = None
+            if base[key] and cand[key] is not None:
+                delta = round(100.0 * (cand[key] - base[key]) / base[key], 1)
+            rows[key] = {"baseline": base[key], "candidate": cand[key], "delta_percent": delta}
+        report["metrics"][metric] = {"rows": rows, "ks": ks_distance(base_values, cand_values),
+                                     "count": (base["count"], cand["count"])}
+    for name, entries in (("baseline", baseline), ("candidate", candidate)):
+        counts = {}
+        for entry in entries:
+            counts[str(entry.get("status"))] = counts.get(str(entry.get("status")), 0) + 1
+        report["status"][name] = counts
+    report["peak_concurrency"] = {"baseline": peak_concurrency(baseline), "candidate": peak_concurrency(candidate)}
+    lags = sorted(e["lag"] for e in candidate if e.get("lag") is not None)
+    report["replay_lag_p99"] = percentile(lags, 99)
+    return report
+
+
+def print_report(report, title):
+    table = Table(title=title, border_style="cyan")
+    for column in ("Metric", "Stat", "Baseline", "Candidate", "Change"):
+        table.add_column(column)
+    for metric, data in report["metrics"].items():
+        for key, row in data["rows"].items():
+            fmt = lambda v: f"{v * 1000:.1f} ms" if v is not None else "-"
+            delta = row["delta_percent"]
+            change = f"{delta:+.1f}%" if delta is not None else "-"
+            style = "red" if delta is not None and delta > 10 else "green" if delta is not None and delta < -10 else ""
+            table.add_row(metric, key, fmt(row["baseline"]), fmt(row["candidate"]), f"[{style}]{change}[/{style}]" if style else change)
+        table.add_row(metric, "KS distance", "", "", str(data["ks"]), end_section=True)
+    console.print(table)
+    console.print(f"Status: baseline {report['status']['baseline']}, candidate {report['status']['candidate']}")
+    console.print(f"Peak concurrency: baseline {report['peak_concurrency']['baseline']}, "
+                  f"candidate {report['peak_concurrency']['candidate']}")
+    if report["replay_lag_p99"] is not None:
+        console.print(f"Replay start lag p99: {report['replay_lag_p99'] * 1000:.1f} ms")
+# FINISH ### DISTRIBUTIONS ###
+
+# START ### MAIN FUNCTION ###
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded proxy traffic and diff latency distributions")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("replay", help="Re-issue a trace against an endpoint")
+    run.add_argument("trace", nargs="*", default=[str(TRACE_DIR)], help="Trace files or directories")
+    run.add_argument("--endpoint", default=ENDPOINT)
+    run.add_argument("--speed", type=float, default=1.0, help="2 = twice as fast (arrival gaps halved)")
+    run.add_argument("--limit", type=int, help="Only the first N requests")
+    run.add_argument("--path", help="Only requests to this path, e.g. /v1/chat/completions")
+    run.add_argument("--max-workers", type=int, default=MAX_WORKERS)
+    run.add_argument("--keep-max-tokens", action="store_true", help="Don't cap max_tokens at the recorded completion length")
+    run.add_argument("--deterministic", action="store_true", help="temperature 0 and a fixed seed")
+    run.add_argument("--out", help="Write per-request results (JSONL) for later diffs")
+    run.add_argument("--json", action="store_true")
+    diff = sub.add_parser("diff", help="Compare two runs (trace dirs/files or replay --out files)")
+    diff.add_argument("baseline")
+    diff.add_argument("candidate")
+    diff.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.command == "diff":
+        report = compare(read_entries([args.baseline]), read_entries([args.candidate]))
+        if args.json:
+            print(json.dumps(report))
+        else:
+            print_report(report, f"{args.baseline} -> {args.candidate}")
+        return 0
+
+    entries = read_entries(args.trace)
+    if args.path:
+        entries = [e for e in entries if e["path"] == args.path]
+    entries = entries[:args.limit] if args.limit else entries
+    replayable = [e for e in entries if isinstance(e.get("body"), dict)]
+    if not replayable:
+        console.print("[yellow][Replay] Nothing replayable in the trace.[/yellow]")
+        return 1
+    span = (replayable[-1]["t"] - replayable[0]["t"]) / args.speed
+    console.print(f"[cyan][Replay] {len(replayable)} requests over {span:.1f}s at {args.speed}x "
+                  f"(recorded peak concurrency {peak_concurrency(replayable)}) -> {args.endpoint}[/cyan]")
+    results = replay(replayable, args.endpoint, args.speed, args.max_workers,
+                     not args.keep_max_tokens, args.deterministic, args.out)
+    report = compare(replayable, results)
+    if args.json:
+        print(json.dumps(report))
+    else:
+        print_report(report, "Recorded vs replayed")
+    return 0
+# FINISH ### MAIN FUNCTION ###
+
+# START ### SCRIPT RUNNER ###
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        sys.exit(130)
+    except Exception as e:
+        console.print(f"[red][Replay] Error: {str(e)}[/red]")
+        sys.exit(1)
+# FINISH ### SCRIPT RUNNER ###